@@ -1,16 +1,11 @@
 import traceback
 
-from django.conf import settings
 from django.db import models
 from django.urls import reverse
-from jinja2 import Environment, TemplateSyntaxError
+from jinja2 import TemplateSyntaxError
 
 from peering.models import Template
-from peering_manager.jinja2 import (
-    FILTER_DICT,
-    IncludeTemplateExtension,
-    PeeringManagerLoader,
-)
+from peering_manager.jinja2 import get_template
 from utils.models import ChangeLoggedMixin
 
 from .crypto import *
@@ -27,23 +22,10 @@ class Configuration(Template):
         """
         Render the template using Jinja2.
         """
-        environment = Environment(
-            loader=PeeringManagerLoader(),
-            trim_blocks=self.jinja2_trim,
-            lstrip_blocks=self.jinja2_lstrip,
-        )
-        environment.add_extension(IncludeTemplateExtension)
-        for extension in settings.JINJA2_TEMPLATE_EXTENSIONS:
-            environment.add_extension(extension)
-
-        # Add custom filters to our environment
-        environment.filters.update(FILTER_DICT)
-
         # Try rendering the template, return a message about syntax issues if there
         # are any
         try:
-            jinja2_template = environment.from_string(self.template)
-            return jinja2_template.render(variables)
+            return get_template(self).render(variables)
         except TemplateSyntaxError as e:
             return f"Syntax error in template at line {e.lineno}: {e.message}"
         except Exception:
@@ -4,7 +4,6 @@ import traceback
 import uuid
 from collections import OrderedDict
 
-from django.conf import settings
 from django.contrib.auth.models import User
 from django.contrib.contenttypes.models import ContentType
 from django.core.exceptions import ValidationError
@@ -12,7 +11,7 @@ from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
 from django.urls import reverse
 from django.utils import timezone
-from jinja2 import Environment, TemplateSyntaxError
+from jinja2 import TemplateSyntaxError
 from rest_framework.utils.encoders import JSONEncoder
 
 from extras.enums import (
@@ -22,11 +21,7 @@ from extras.enums import (
     LogLevel,
 )
 from extras.utils import FeatureQuery
-from peering_manager.jinja2 import (
-    FILTER_DICT,
-    IncludeTemplateExtension,
-    PeeringManagerLoader,
-)
+from peering_manager.jinja2 import get_template
 from utils.models import ChangeLoggedMixin
 
 
@@ -80,23 +75,10 @@ class ExportTemplate(ChangeLoggedMixin):
         """
         Renders the content of the export template.
         """
-        environment = Environment(
-            loader=PeeringManagerLoader(),
-            trim_blocks=self.jinja2_trim,
-            lstrip_blocks=self.jinja2_lstrip,
-        )
-        environment.add_extension(IncludeTemplateExtension)
-        for extension in settings.JINJA2_TEMPLATE_EXTENSIONS:
-            environment.add_extension(extension)
-
-        # Add custom filters to our environment
-        environment.filters.update(FILTER_DICT)
-
         # Try rendering the template, return a message about syntax issues if there
         # are any
         try:
-            jinja2_template = environment.from_string(self.template)
-            return jinja2_template.render(
+            return get_template(self).render(
                 dataset=self.content_type.model_class().objects.all()
             )
         except TemplateSyntaxError as e:
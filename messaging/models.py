@@ -1,18 +1,13 @@
 import traceback
 
-from django.conf import settings
 from django.contrib.contenttypes.fields import GenericForeignKey
 from django.contrib.contenttypes.models import ContentType
 from django.db import models
 from django.urls import reverse
-from jinja2 import Environment, TemplateSyntaxError
+from jinja2 import TemplateSyntaxError
 
 from peering.models import Template
-from peering_manager.jinja2 import (
-    FILTER_DICT,
-    IncludeTemplateExtension,
-    PeeringManagerLoader,
-)
+from peering_manager.jinja2 import get_template
 from utils.models import ChangeLoggedMixin, TagsMixin
 
 __all__ = ("ContactRole", "Contact", "ContactAssignment", "Email")
@@ -93,21 +88,9 @@ class Email(Template):
         Render the template using Jinja2.
         """
         subject, body = "", ""
-        environment = Environment(
-            loader=PeeringManagerLoader(),
-            trim_blocks=self.jinja2_trim,
-            lstrip_blocks=self.jinja2_lstrip,
-        )
-        environment.add_extension(IncludeTemplateExtension)
-        for extension in settings.JINJA2_TEMPLATE_EXTENSIONS:
-            environment.add_extension(extension)
-
-        # Add custom filters to our environment
-        environment.filters.update(FILTER_DICT)
 
         try:
-            jinja2_template = environment.from_string(self.subject)
-            subject = jinja2_template.render(variables)
+            subject = get_template(self, attribute="subject").render(variables)
         except TemplateSyntaxError as e:
             subject = (
                 f"Syntax error in subject template at line {e.lineno}: {e.message}"
@@ -116,8 +99,7 @@ class Email(Template):
             subject = str(e)
 
         try:
-            jinja2_template = environment.from_string(self.template)
-            body = jinja2_template.render(variables)
+            body = get_template(self).render(variables)
         except TemplateSyntaxError as e:
             body = f"Syntax error in body template at line {e.lineno}: {e.message}"
         except Exception:
@@ -1,8 +1,142 @@
 import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 import pynetbox
 import requests
 from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger("peering.manager.netbox")
+
+
+class TimeoutSession(requests.Session):
+    """
+    HTTP session applying a default timeout to all requests.
+    """
+
+    def __init__(self, timeout=None):
+        super().__init__()
+        self.timeout = timeout
+
+    def request(self, *args, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        return super().request(*args, **kwargs)
+
+
+class APIPool(object):
+    """
+    Keeps one NetBox API client, and its HTTP session, per process along with the
+    devices it looked up.
+
+    The client is created again if the NetBox settings change. Devices are kept
+    for `NETBOX_DEVICE_CACHE_TIMEOUT` seconds.
+    """
+
+    def __init__(self):
+        self._forget()
+        # Sockets must not be shared between processes, forget the client
+        # inherited from the parent process
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._forget)
+
+    def _forget(self):
+        self.lock = threading.Lock()
+        self.key = None
+        self.api = None
+        self.devices = {}
+
+    def _get_key(self):
+        return (
+            settings.NETBOX_API,
+            settings.NETBOX_API_TOKEN,
+            settings.NETBOX_API_THREADING,
+            settings.NETBOX_API_VERIFY_SSL,
+            settings.NETBOX_API_TIMEOUT,
+            settings.NETBOX_API_RETRIES,
+            settings.NETBOX_API_CONCURRENCY,
+        )
+
+    def _create_api(self):
+        # pynetbox adds /api on its own. strip it off here to maintain
+        # backward compatibility with earlier Peering Manager behavior
+        base_url = settings.NETBOX_API.strip("/")
+        if base_url.endswith("/api"):
+            base_url = base_url[:-3]
+        api = pynetbox.api(
+            base_url,
+            token=settings.NETBOX_API_TOKEN,
+            threading=settings.NETBOX_API_THREADING,
+        )
+
+        # Retry failed reads and keep enough connections for concurrent calls
+        session = TimeoutSession(timeout=settings.NETBOX_API_TIMEOUT or None)
+        adapter = HTTPAdapter(
+            pool_maxsize=max(settings.NETBOX_API_CONCURRENCY, 1),
+            max_retries=Retry(
+                total=settings.NETBOX_API_RETRIES,
+                backoff_factor=0.5,
+                status_forcelist=(429, 500, 502, 503, 504),
+                allowed_methods=frozenset(["GET", "HEAD", "OPTIONS"]),
+            ),
+        )
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+
+        # Disable SSL verification on user request
+        if not settings.NETBOX_API_VERIFY_SSL:
+            session.verify = False
+
+        api.http_session = session
+        return api
+
+    def get_api(self):
+        """
+        Returns the NetBox API client of the process, `None` if NetBox is not
+        configured.
+        """
+        if not settings.NETBOX_API:
+            return None
+
+        key = self._get_key()
+        with self.lock:
+            if self.key != key:
+                self.key = key
+                self.api = self._create_api()
+                self.devices = {}
+            return self.api
+
+    def get_device(self, api, device_id):
+        """
+        Returns the NetBox device with the given ID, looked up with the given API
+        client at most once per `NETBOX_DEVICE_CACHE_TIMEOUT` seconds.
+        """
+        timeout = settings.NETBOX_DEVICE_CACHE_TIMEOUT
+        key = (api.base_url, device_id)
+        with self.lock:
+            cached = self.devices.get(key)
+        if timeout and cached and cached[0] > time.monotonic():
+            return cached[1]
+
+        logger.debug(f"calling dcim.devices.get: {device_id}")
+        device = api.dcim.devices.get(device_id)
+        if timeout and device:
+            with self.lock:
+                self.devices[key] = (time.monotonic() + timeout, device)
+        return device
+
+    def clear(self):
+        """
+        Forgets all looked up devices.
+        """
+        with self.lock:
+            self.devices = {}
+
+
+api_pool = APIPool()
 
 
 class NetBox(object):
@@ -13,22 +147,7 @@ class NetBox(object):
     logger = logging.getLogger("peering.manager.netbox")
 
     def __init__(self, *args, **kwargs):
-        self.api = None
-        if settings.NETBOX_API:
-            # pynetbox adds /api on its own. strip it off here to maintain
-            # backward compatibility with earlier Peering Manager behavior
-            base_url = settings.NETBOX_API.strip("/")
-            if base_url.endswith("/api"):
-                base_url = base_url[:-3]
-            self.api = pynetbox.api(
-                base_url,
-                token=settings.NETBOX_API_TOKEN,
-                threading=settings.NETBOX_API_THREADING,
-            )
-
-            # Disable SSL verification on user request
-            if not settings.NETBOX_API_VERIFY_SSL:
-                self.api.http_session.verify = False
+        self.api = api_pool.get_api()
 
     def get_devices(self):
         """
@@ -43,8 +162,42 @@ class NetBox(object):
         """
         Runs the given NAPALM method on the device via the NetBox API.
         """
-        self.logger.debug(f"calling dcim.devices.get: {device_id}")
-        device = self.api.dcim.devices.get(device_id)
+        device = api_pool.get_device(self.api, device_id)
         self.logger.debug(f"calling napalm: {method}")
         result = device.napalm.list(method=method)
         return next(result)[method]
+
+    def napalm_batch(self, device_ids, method, concurrency=None):
+        """
+        Runs the given NAPALM method on many devices via the NetBox API, up to
+        `concurrency` (`NETBOX_API_CONCURRENCY` by default) at the same time.
+
+        Calls start right away. An iterator of tuples made of the device ID, the
+        result, the raised exception (`None` on success) and the duration of the
+        call is returned, tuples come as soon as calls are done.
+        """
+        device_ids = list(dict.fromkeys(device_ids))
+        if not device_ids:
+            return iter([])
+
+        def call(device_id):
+            started = time.monotonic()
+            try:
+                result = self.napalm(device_id, method)
+            except Exception as e:
+                self.logger.error(
+                    f'error while calling napalm {method} on netbox device {device_id} reason "{e}"'
+                )
+                return device_id, None, e, time.monotonic() - started
+            return device_id, result, None, time.monotonic() - started
+
+        executor = ThreadPoolExecutor(
+            max_workers=min(
+                max(concurrency or settings.NETBOX_API_CONCURRENCY, 1),
+                len(device_ids),
+            ),
+            thread_name_prefix="netbox-napalm",
+        )
+        futures = [executor.submit(call, device_id) for device_id in device_ids]
+        executor.shutdown(wait=False)
+        return (future.result() for future in as_completed(futures))
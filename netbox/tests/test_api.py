@@ -1,9 +1,9 @@
 from unittest.mock import patch
 
 import pynetbox
-from django.test import TestCase
+from django.test import TestCase, override_settings
 
-from netbox.api import NetBox
+from netbox.api import NetBox, TimeoutSession, api_pool
 from utils.testing import MockedResponse
 
 
@@ -27,6 +27,28 @@ class NetBoxTestCase(TestCase):
 
         self.netbox = NetBox()
         self.netbox.api = pynetbox.api("http://netbox.example.net", token="test")
+        api_pool.clear()
+
+    @override_settings(
+        NETBOX_API="http://netbox.example.net/api/",
+        NETBOX_API_TIMEOUT=10,
+        NETBOX_API_RETRIES=2,
+    )
+    def test_api_pool(self):
+        api = NetBox().api
+        self.assertEqual("http://netbox.example.net/api", api.base_url)
+        self.assertIsInstance(api.http_session, TimeoutSession)
+        self.assertEqual(10, api.http_session.timeout)
+        self.assertEqual(
+            2, api.http_session.get_adapter(api.base_url).max_retries.total
+        )
+        # The client is shared until settings change
+        self.assertIs(api, NetBox().api)
+        with self.settings(NETBOX_API_TIMEOUT=20):
+            self.assertIsNot(api, NetBox().api)
+
+        with self.settings(NETBOX_API=""):
+            self.assertIsNone(NetBox().api)
 
     @patch(
         "requests.sessions.Session.get",
@@ -56,3 +78,28 @@ class NetBoxTestCase(TestCase):
         ):
             facts = self.netbox.napalm(1, "get_facts")
             self.assertEqual("router01", facts["hostname"])
+
+        # The device is not looked up again
+        with patch("requests.sessions.Session.get") as get:
+            self.netbox.napalm(1, "get_facts")
+            get.assert_not_called()
+
+    def test_napalm_batch(self):
+        def napalm(device_id, method):
+            if device_id == 2:
+                raise ValueError("unreachable")
+            return {"hostname": f"router0{device_id}"}
+
+        with patch.object(self.netbox, "napalm", side_effect=napalm):
+            results = {
+                device_id: (result, error)
+                for device_id, result, error, _ in self.netbox.napalm_batch(
+                    [1, 2, 3, 1], "get_facts", concurrency=2
+                )
+            }
+
+        self.assertEqual(3, len(results))
+        self.assertEqual(({"hostname": "router01"}, None), results[1])
+        self.assertIsNone(results[2][0])
+        self.assertIsInstance(results[2][1], ValueError)
+        self.assertEqual(({"hostname": "router03"}, None), results[3])
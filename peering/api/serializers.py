@@ -9,10 +9,17 @@ from devices.api.serializers import (
 )
 from extras.api.serializers import NestedIXAPISerializer
 from net.api.serializers import NestedConnectionSerializer
-from peering.enums import BGPGroupStatus, BGPSessionStatus, DeviceStatus
+from peering.enums import (
+    BGPGroupStatus,
+    BGPSessionStateResolution,
+    BGPSessionStatus,
+    BGPState,
+    DeviceStatus,
+)
 from peering.models import (
     AutonomousSystem,
     BGPGroup,
+    BGPSessionStateRecord,
     Community,
     DirectPeeringSession,
     InternetExchange,
@@ -32,6 +39,7 @@ __all__ = (
     "AutonomousSystemSerializer",
     "AutonomousSystemGenerateEmailSerializer",
     "BGPGroupSerializer",
+    "BGPSessionStateRecordSerializer",
     "CommunitySerializer",
     "DirectPeeringSessionSerializer",
     "InternetExchangeSerializer",
@@ -136,6 +144,23 @@ class BGPGroupSerializer(PrimaryModelSerializer):
         ]
 
 
+class BGPSessionStateRecordSerializer(serializers.ModelSerializer):
+    resolution = ChoiceField(choices=BGPSessionStateResolution, read_only=True)
+    bgp_state = ChoiceField(choices=BGPState, read_only=True)
+
+    class Meta:
+        model = BGPSessionStateRecord
+        fields = [
+            "id",
+            "time",
+            "resolution",
+            "bgp_state",
+            "received_prefix_count",
+            "advertised_prefix_count",
+            "state_changes",
+        ]
+
+
 class CommunitySerializer(PrimaryModelSerializer):
     class Meta:
         model = Community
@@ -307,6 +332,7 @@ class InternetExchangePeeringSessionSerializer(PrimaryModelSerializer):
 
 class RouterSerializer(PrimaryModelSerializer):
     poll_bgp_sessions_last_updated = serializers.DateTimeField(read_only=True)
+    poll_bgp_sessions_next = serializers.DateTimeField(read_only=True)
     configuration_template = NestedConfigurationSerializer(required=False)
     local_autonomous_system = NestedAutonomousSystemSerializer()
     platform = NestedPlatformSerializer()
@@ -324,6 +350,8 @@ class RouterSerializer(PrimaryModelSerializer):
             "encrypt_passwords",
             "poll_bgp_sessions_state",
             "poll_bgp_sessions_last_updated",
+            "poll_bgp_sessions_interval",
+            "poll_bgp_sessions_next",
             "configuration_template",
             "local_autonomous_system",
             "netbox_device_id",
@@ -341,6 +369,7 @@ class RouterSerializer(PrimaryModelSerializer):
 class RouterConfigureSerializer(serializers.Serializer):
     routers = serializers.ListField(child=serializers.IntegerField())
     commit = serializers.BooleanField()
+    force = serializers.BooleanField(required=False, default=False)
 
 
 class RoutingPolicySerializer(PrimaryModelSerializer):
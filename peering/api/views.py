@@ -12,6 +12,7 @@ from messaging.models import Email
 from peering.filters import (
     AutonomousSystemFilterSet,
     BGPGroupFilterSet,
+    BGPSessionStateRecordFilterSet,
     CommunityFilterSet,
     DirectPeeringSessionFilterSet,
     InternetExchangeFilterSet,
@@ -20,10 +21,10 @@ from peering.filters import (
     RoutingPolicyFilterSet,
 )
 from peering.jobs import (
+    deploy_configurations,
     generate_configuration,
     import_sessions_to_internet_exchange,
     poll_bgp_sessions,
-    set_napalm_configuration,
     test_napalm_connection,
 )
 from peering.models import (
@@ -44,6 +45,7 @@ from .serializers import (
     AutonomousSystemGenerateEmailSerializer,
     AutonomousSystemSerializer,
     BGPGroupSerializer,
+    BGPSessionStateRecordSerializer,
     CommunitySerializer,
     DirectPeeringSessionSerializer,
     InternetExchangePeeringSessionSerializer,
@@ -284,6 +286,30 @@ class DirectPeeringSessionViewSet(ModelViewSet):
     serializer_class = DirectPeeringSessionSerializer
     filterset_class = DirectPeeringSessionFilterSet
 
+    @extend_schema(
+        operation_id="peering_direct_peering_sessions_state_history",
+        request=None,
+        responses={
+            200: OpenApiResponse(
+                response=BGPSessionStateRecordSerializer(many=True),
+                description="Retrieves the state history of the session.",
+            ),
+            404: OpenApiResponse(
+                response=OpenApiTypes.OBJECT,
+                description="The direct peering session does not exist.",
+            ),
+        },
+    )
+    @action(detail=True, methods=["get"], url_path="state-history")
+    def state_history(self, request, pk=None):
+        records = BGPSessionStateRecordFilterSet(
+            request.GET, self.get_object().get_state_history()
+        ).qs
+        page = self.paginate_queryset(records)
+        return self.get_paginated_response(
+            BGPSessionStateRecordSerializer(page, many=True).data
+        )
+
     @extend_schema(
         operation_id="peering_direct_peering_sessions_encrypt_password",
         request=None,
@@ -532,6 +558,30 @@ class InternetExchangePeeringSessionViewSet(ModelViewSet):
     serializer_class = InternetExchangePeeringSessionSerializer
     filterset_class = InternetExchangePeeringSessionFilterSet
 
+    @extend_schema(
+        operation_id="peering_internet_exchange_peering_sessions_state_history",
+        request=None,
+        responses={
+            200: OpenApiResponse(
+                response=BGPSessionStateRecordSerializer(many=True),
+                description="Retrieves the state history of the session.",
+            ),
+            404: OpenApiResponse(
+                response=OpenApiTypes.OBJECT,
+                description="The Internet exchange peering session does not exist.",
+            ),
+        },
+    )
+    @action(detail=True, methods=["get"], url_path="state-history")
+    def state_history(self, request, pk=None):
+        records = BGPSessionStateRecordFilterSet(
+            request.GET, self.get_object().get_state_history()
+        ).qs
+        page = self.paginate_queryset(records)
+        return self.get_paginated_response(
+            BGPSessionStateRecordSerializer(page, many=True).data
+        )
+
     @extend_schema(
         operation_id="peering_internet_exchange_peering_sessions_encrypt_password",
         request=None,
@@ -649,7 +699,7 @@ class RouterViewSet(ModelViewSet):
         responses={
             202: OpenApiResponse(
                 response=JobResultSerializer,
-                description="Job scheduled to generate configure routers.",
+                description="Job scheduled to deploy configurations on routers.",
             ),
             400: OpenApiResponse(
                 response=OpenApiTypes.NONE,
@@ -679,25 +729,24 @@ class RouterViewSet(ModelViewSet):
             raise ValidationError("routers list must not be empty")
         commit = serializer.validated_data.get("commit")
 
-        routers = Router.objects.filter(pk__in=router_ids)
+        routers = Router.objects.filter(pk__in=router_ids).select_related("platform")
         if not routers:
             return Response(status=status.HTTP_404_NOT_FOUND)
 
-        job_results = []
-        for router in routers:
-            job_result = JobResult.enqueue_job(
-                set_napalm_configuration,
-                "peering.router.set_napalm_configuration",
-                Router,
-                request.user,
-                router,
-                commit,
-            )
-            job_results.append(job_result)
+        # Routers are deployed in waves by a single job
+        job_result = JobResult.enqueue_job(
+            deploy_configurations,
+            "peering.router.set_napalm_configuration",
+            Router,
+            request.user,
+            list(routers),
+            commit,
+            force=serializer.validated_data.get("force"),
+        )
 
         return Response(
             JobResultSerializer(
-                job_results, many=True, context={"request": request}
+                [job_result], many=True, context={"request": request}
             ).data,
             status=status.HTTP_202_ACCEPTED,
         )
@@ -0,0 +1,200 @@
+import logging
+
+from django.conf import settings
+
+from peering.device_io import DeviceIO
+
+logger = logging.getLogger("peering.manager.peering.deployment")
+
+
+class ConfigurationDeployer(object):
+    """
+    Deploys configurations on many routers concurrently, in waves.
+
+    Configurations are all rendered first, by the calling thread. They are then
+    pushed to a first wave of `canary` routers and to the next waves of
+    `wave_size` routers, one wave after the other. Routers of a wave are
+    configured through `DeviceIO`, up to `concurrency` at the same time, while
+    results are saved by the calling thread. If a router of a wave fails, the
+    next waves are not deployed.
+
+    When commiting, routers whose configuration is unchanged since their last
+    deployment are skipped unless `force` is set.
+    """
+
+    def __init__(
+        self,
+        commit=True,
+        commit_check=True,
+        force=False,
+        concurrency=None,
+        canary=None,
+        wave_size=None,
+        timeout=None,
+        platform_concurrency=None,
+    ):
+        self.commit = commit
+        self.commit_check = commit_check
+        self.force = force
+        self.canary = max(
+            settings.CONFIG_DEPLOYMENT_CANARY if canary is None else canary, 0
+        )
+        self.wave_size = max(
+            settings.CONFIG_DEPLOYMENT_WAVE_SIZE if wave_size is None else wave_size,
+            0,
+        )
+        self.device_io = DeviceIO(
+            concurrency=concurrency or settings.CONFIG_DEPLOYMENT_CONCURRENCY,
+            timeout=settings.CONFIG_DEPLOYMENT_TIMEOUT if timeout is None else timeout,
+            platform_concurrency=platform_concurrency,
+        )
+
+    def get_waves(self, routers):
+        """
+        Splits routers in waves: the canary one followed by waves of `wave_size`
+        routers, or a single wave with all other routers if `wave_size` is 0.
+        """
+        routers = list(routers)
+        waves = []
+        if self.canary:
+            waves.append(routers[: self.canary])
+            routers = routers[self.canary :]
+
+        size = self.wave_size or len(routers)
+        waves.extend(routers[i : i + size] for i in range(0, len(routers), size))
+
+        return [wave for wave in waves if wave]
+
+    def _render(self, router):
+        """
+        Returns the configuration of a router and a reason for which it cannot be
+        deployed, `None` if it can be.
+        """
+        if not router.is_usable_for_task():
+            return None, "Router is disabled or its platform is unusable."
+        if not router.configuration_template:
+            return None, "Router has no configuration template."
+
+        try:
+            configuration = router.generate_configuration()
+        except Exception as e:
+            logger.exception(f"cannot render configuration of {router.hostname}")
+            return None, f"Error while rendering configuration: {e}"
+        if not configuration or not configuration.strip():
+            return None, "No configuration (or empty) generated."
+
+        return configuration, None
+
+    def _record(
+        self,
+        results,
+        router,
+        success,
+        message,
+        callback,
+        changes=None,
+        duration=0,
+        wave=None,
+    ):
+        results[router] = {
+            "success": success,
+            "message": message,
+            "changes": changes,
+            "duration": duration,
+            "wave": wave,
+        }
+        if callback:
+            callback(router, results[router])
+
+    def deploy(self, routers, callback=None):
+        """
+        Deploys configurations on all given routers.
+
+        A dictionary mapping each router to its result is returned, a result is a
+        dictionary with `success`, `message`, `changes` (the configuration
+        differences), `duration` (in seconds) and `wave` (the number of the wave
+        the router is part of) keys. If a `callback` is given, it is called with
+        each router and its result as soon as it is known.
+        """
+        results = {}
+        configurations = {}
+        for router in routers:
+            configuration, reason = self._render(router)
+            if reason:
+                self._record(results, router, False, reason, callback)
+            elif (
+                self.commit
+                and not self.force
+                and router.is_configuration_deployed(configuration)
+            ):
+                self._record(
+                    results,
+                    router,
+                    True,
+                    "Configuration unchanged since last deployment.",
+                    callback,
+                )
+            else:
+                configurations[router] = configuration
+
+        # Only talk to routers in DeviceIO threads, the database is not used there
+        def push(router):
+            return router.merge_napalm_configuration(
+                configurations[router],
+                commit=self.commit,
+                commit_check=self.commit_check,
+            )
+
+        failed = False
+        for number, wave in enumerate(self.get_waves(configurations), start=1):
+            if failed:
+                for router in wave:
+                    self._record(
+                        results,
+                        router,
+                        False,
+                        "Not deployed, a previous wave failed.",
+                        callback,
+                        wave=number,
+                    )
+                continue
+
+            logger.debug(f"deploying configuration wave {number} ({len(wave)} routers)")
+            for router, result, error, duration in self.device_io.map(push, wave):
+                changes = None
+                if not error:
+                    error, changes = result
+
+                if self.commit and not error:
+                    router.set_deployed_configuration(configurations[router])
+
+                if error:
+                    failed = True
+                    message = (
+                        str(error)
+                        if isinstance(error, TimeoutError)
+                        else f"Failed to install configuration: {error}"
+                    )
+                    success = False
+                elif not changes:
+                    message, success = "No configuration to install.", True
+                else:
+                    message = (
+                        "Configuration installed."
+                        if self.commit
+                        else "Configuration differences found."
+                    )
+                    success = True
+
+                self._record(
+                    results,
+                    router,
+                    success,
+                    message,
+                    callback,
+                    changes=changes,
+                    duration=duration,
+                    wave=number,
+                )
+
+        return results
@@ -0,0 +1,138 @@
+import asyncio
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger("peering.manager.peering.device_io")
+
+
+class DeviceIO(object):
+    """
+    Runs device interactions (NAPALM getters, NetBox NAPALM proxy calls) of many
+    routers under a single asyncio event loop.
+
+    Interactions are blocking so each one is run in an executor thread, the event
+    loop schedules them: up to `concurrency` at the same time and up to the limit
+    given for their platform in `platform_concurrency`. An interaction taking more
+    than `timeout` seconds is reported as failed.
+
+    The event loop runs in its own thread, results are handed back to the calling
+    thread which is the one expected to use the ORM.
+    """
+
+    def __init__(self, concurrency=None, timeout=None, platform_concurrency=None):
+        self.concurrency = max(concurrency or settings.BGP_POLLING_CONCURRENCY, 1)
+        self.timeout = settings.BGP_POLLING_TIMEOUT if timeout is None else timeout
+        self.platform_concurrency = (
+            settings.BGP_POLLING_PLATFORM_CONCURRENCY
+            if platform_concurrency is None
+            else platform_concurrency
+        )
+
+    def _call(self, func, router):
+        try:
+            return func(router)
+        finally:
+            # Executor threads must not leave database connections open
+            connections.close_all()
+
+    async def _run(
+        self, func, router, executor, semaphore, platform_semaphores, report
+    ):
+        # Wait for the platform limit first not to hold a slot others could use
+        platform_semaphore = platform_semaphores.get(
+            router.platform.slug if router.platform else None
+        )
+        if platform_semaphore:
+            await platform_semaphore.acquire()
+        try:
+            async with semaphore:
+                started = time.monotonic()
+                future = asyncio.get_running_loop().run_in_executor(
+                    executor, self._call, func, router
+                )
+                try:
+                    result = await asyncio.wait_for(
+                        asyncio.shield(future), self.timeout or None
+                    )
+                except asyncio.TimeoutError:
+                    logger.error(f"timed out waiting for {router.hostname}")
+                    report(
+                        router,
+                        None,
+                        TimeoutError(f"Timed out after {self.timeout} seconds."),
+                        time.monotonic() - started,
+                    )
+                    # Threads cannot be interrupted, keep the slot until the call
+                    # returns so that limits are still enforced
+                    try:
+                        await future
+                    except Exception:
+                        pass
+                except Exception as e:
+                    logger.error(
+                        f'error while talking to {router.hostname} reason "{e}"'
+                    )
+                    report(router, None, e, time.monotonic() - started)
+                else:
+                    report(router, result, None, time.monotonic() - started)
+        finally:
+            if platform_semaphore:
+                platform_semaphore.release()
+
+    async def _run_all(self, func, routers, results):
+        semaphore = asyncio.Semaphore(self.concurrency)
+        platform_semaphores = {
+            platform: asyncio.Semaphore(limit)
+            for platform, limit in self.platform_concurrency.items()
+            if limit
+        }
+        executor = ThreadPoolExecutor(
+            max_workers=self.concurrency, thread_name_prefix="device-io"
+        )
+
+        def report(*result):
+            results.put(result)
+
+        try:
+            await asyncio.gather(
+                *(
+                    self._run(
+                        func, router, executor, semaphore, platform_semaphores, report
+                    )
+                    for router in routers
+                )
+            )
+        finally:
+            executor.shutdown(wait=False)
+
+    def map(self, func, routers):
+        """
+        Calls `func` with each router and yields tuples made of the router, the
+        result, the raised exception (`None` on success) and the duration of the
+        call as soon as they are known, not in the order of the routers.
+
+        Routers should come with their platform already fetched.
+        """
+        routers = list(routers)
+        if not routers:
+            return
+
+        results = queue.Queue()
+        thread = threading.Thread(
+            target=asyncio.run,
+            args=(self._run_all(func, routers, results),),
+            name="device-io-loop",
+            daemon=True,
+        )
+        thread.start()
+
+        # Stop as soon as all results are known, timed out calls may still be
+        # running in the background
+        for _ in routers:
+            yield results.get()
@@ -43,6 +43,14 @@ class BGPState(ChoiceSet):
     )
 
 
+class BGPSessionStateResolution(ChoiceSet):
+    RAW = 0
+    HOURLY = 1
+    DAILY = 2
+
+    CHOICES = ((RAW, "Raw"), (HOURLY, "Hourly"), (DAILY, "Daily"))
+
+
 class CommunityType(ChoiceSet):
     EGRESS = "egress"
     INGRESS = "ingress"
@@ -15,7 +15,9 @@ from utils.filters import (
 
 from .enums import (
     BGPGroupStatus,
+    BGPSessionStateResolution,
     BGPSessionStatus,
+    BGPState,
     CommunityType,
     DeviceStatus,
     RoutingPolicyType,
@@ -23,6 +25,7 @@ from .enums import (
 from .models import (
     AutonomousSystem,
     BGPGroup,
+    BGPSessionStateRecord,
     Community,
     DirectPeeringSession,
     InternetExchange,
@@ -65,6 +68,18 @@ class BGPGroupFilterSet(
         fields = ["id"]
 
 
+class BGPSessionStateRecordFilterSet(BaseFilterSet):
+    time = django_filters.DateTimeFromToRangeFilter()
+    resolution = django_filters.MultipleChoiceFilter(
+        choices=BGPSessionStateResolution, null_value=None
+    )
+    bgp_state = django_filters.MultipleChoiceFilter(choices=BGPState, null_value="")
+
+    class Meta:
+        model = BGPSessionStateRecord
+        fields = ["id", "state_changes"]
+
+
 class CommunityFilterSet(
     BaseFilterSet, CreatedUpdatedFilterSet, NameSlugSearchFilterSet
 ):
@@ -34,7 +34,9 @@ from utils.forms.widgets import (
 
 from .enums import (
     BGPGroupStatus,
+    BGPSessionStateResolution,
     BGPSessionStatus,
+    BGPState,
     CommunityType,
     DeviceStatus,
     IPFamily,
@@ -43,6 +45,7 @@ from .enums import (
 from .models import (
     AutonomousSystem,
     BGPGroup,
+    BGPSessionStateRecord,
     Community,
     DirectPeeringSession,
     InternetExchange,
@@ -206,6 +209,29 @@ class BGPGroupFilterForm(BootstrapMixin, forms.Form):
     tag = TagFilterField(model)
 
 
+class BGPSessionStateRecordFilterForm(BootstrapMixin, forms.Form):
+    model = BGPSessionStateRecord
+    time_after = forms.DateTimeField(
+        label="After",
+        required=False,
+        widget=forms.TextInput(attrs={"placeholder": "YYYY-MM-DD hh:mm:ss"}),
+    )
+    time_before = forms.DateTimeField(
+        label="Before",
+        required=False,
+        widget=forms.TextInput(attrs={"placeholder": "YYYY-MM-DD hh:mm:ss"}),
+    )
+    resolution = forms.MultipleChoiceField(
+        required=False, choices=BGPSessionStateResolution, widget=StaticSelectMultiple
+    )
+    bgp_state = forms.MultipleChoiceField(
+        required=False,
+        choices=BGPState,
+        widget=StaticSelectMultiple,
+        label="BGP state",
+    )
+
+
 class CommunityForm(BootstrapMixin, forms.ModelForm):
     slug = SlugField(max_length=255)
     type = forms.ChoiceField(
@@ -789,6 +815,7 @@ class RouterForm(BootstrapMixin, forms.ModelForm):
             "status",
             "encrypt_passwords",
             "poll_bgp_sessions_state",
+            "poll_bgp_sessions_interval",
             "configuration_template",
             "local_autonomous_system",
             "local_context_data",
@@ -4,10 +4,52 @@ from django_rq import job
 
 from extras.enums import LogLevel
 from net.models import Connection
+from peering.deployment import ConfigurationDeployer
+from peering.device_io import DeviceIO
+from peering.metrics import collect
+from peering.polling import BGPSessionsPoller
 
 logger = logging.getLogger("peering.manager.peering.jobs")
 
 
+@job("default")
+def deploy_configurations(routers, commit, job_result, commit_check=True, **kwargs):
+    job_result.mark_running(
+        f"Deploying configuration on {len(routers)} routers.", logger=logger
+    )
+
+    with collect(job_result=job_result):
+        results = ConfigurationDeployer(
+            commit=commit, commit_check=commit_check, **kwargs
+        ).deploy(routers)
+
+    failed = 0
+    for router, result in results.items():
+        if not result["success"]:
+            failed += 1
+        job_result.log(
+            f"{result['message']} (wave {result['wave'] or '-'}, {result['duration']:.2f}s)",
+            obj=router,
+            level_choice=LogLevel.SUCCESS if result["success"] else LogLevel.FAILURE,
+            logger=logger,
+            save=False,
+        )
+        if not result["success"]:
+            job_result.set_output(result["message"], obj=router)
+        elif result["changes"]:
+            job_result.set_output(result["changes"], obj=router)
+
+    message = (
+        f"Deployed configuration on {len(results) - failed} routers, {failed} failed."
+    )
+    if failed:
+        job_result.mark_failed(message, logger=logger)
+    else:
+        job_result.mark_completed(message, logger=logger)
+
+    return not failed
+
+
 @job("default")
 def generate_configuration(router, job_result):
     job_result.mark_running(
@@ -39,7 +81,7 @@ def import_sessions_to_internet_exchange(internet_exchange, job_result):
 
     connections = Connection.objects.filter(
         internet_exchange_point=internet_exchange, router__isnull=False
-    )
+    ).select_related("router__platform")
     if connections.count() < 1:
         job_result.mark_completed(
             "No usable connections.", obj=internet_exchange, logger=logger
@@ -53,6 +95,7 @@ def import_sessions_to_internet_exchange(internet_exchange, job_result):
         logger=logger,
     )
 
+    usable_connections = []
     for connection in connections:
         if not connection.router or not connection.router.is_usable_for_task():
             job_result.log(
@@ -62,8 +105,32 @@ def import_sessions_to_internet_exchange(internet_exchange, job_result):
                 logger=logger,
             )
             continue
+        usable_connections.append(connection)
+
+    # Retrieve BGP neighbors of all routers at once, each router only once
+    bgp_neighbors = {}
+    with collect(job_result=job_result):
+        for router, neighbors, error, _ in DeviceIO().map(
+            lambda router: router.get_bgp_neighbors(),
+            {c.router_id: c.router for c in usable_connections}.values(),
+        ):
+            if error:
+                job_result.log(
+                    f"Cannot get BGP neighbors of {router}: {error}",
+                    obj=internet_exchange,
+                    level_choice=LogLevel.WARNING,
+                    logger=logger,
+                )
+            else:
+                bgp_neighbors[router.pk] = neighbors
+
+    for connection in usable_connections:
+        if connection.router_id not in bgp_neighbors:
+            continue
 
-        session_number, asn_number = internet_exchange.import_sessions(connection)
+        session_number, asn_number = internet_exchange.import_sessions(
+            connection, bgp_neighbors=bgp_neighbors[connection.router_id]
+        )
         job_result.log(
             f"Imported {session_number} sessions for {asn_number} autonomous systems.",
             obj=internet_exchange,
@@ -83,7 +150,8 @@ def poll_bgp_sessions(router, job_result):
 
     job_result.mark_running("Polling BGP sessions state.", obj=router, logger=logger)
 
-    success = router.poll_bgp_sessions()
+    with collect(job_result=job_result):
+        success = router.poll_bgp_sessions()
 
     if success:
         job_result.mark_completed(
@@ -97,6 +165,36 @@ def poll_bgp_sessions(router, job_result):
     return success
 
 
+@job("default")
+def poll_bgp_sessions_fleet(routers, job_result):
+    job_result.mark_running(
+        f"Polling BGP sessions state of {len(routers)} routers.", logger=logger
+    )
+
+    with collect(job_result=job_result):
+        results = BGPSessionsPoller().poll(routers)
+
+    failed = 0
+    for router, result in results.items():
+        if not result["success"]:
+            failed += 1
+        job_result.log(
+            f"{result['message']} ({result['duration']:.2f}s)",
+            obj=router,
+            level_choice=LogLevel.SUCCESS if result["success"] else LogLevel.FAILURE,
+            logger=logger,
+            save=False,
+        )
+
+    message = f"Polled BGP sessions state of {len(results) - failed} routers, {failed} failed."
+    if failed:
+        job_result.mark_failed(message, logger=logger)
+    else:
+        job_result.mark_completed(message, logger=logger)
+
+    return not failed
+
+
 @job("default")
 def set_napalm_configuration(router, commit, job_result):
     if not router.is_usable_for_task(job_result=job_result, logger=logger):
@@ -106,9 +204,10 @@ def set_napalm_configuration(router, commit, job_result):
         "Trying to install configuration.", obj=router, logger=logger
     )
 
-    error, changes = router.set_napalm_configuration(
-        router.generate_configuration(), commit=commit
-    )
+    with collect(job_result=job_result):
+        error, changes = router.set_napalm_configuration(
+            router.generate_configuration(), commit=commit
+        )
 
     if error:
         job_result.set_output(error)
@@ -141,7 +240,8 @@ def test_napalm_connection(router, job_result):
 
     job_result.mark_running("Trying to connect...", obj=router, logger=logger)
 
-    success = router.test_napalm_connection()
+    with collect(job_result=job_result):
+        success = router.test_napalm_connection()
 
     if success:
         job_result.mark_completed("Connection successful.", obj=router, logger=logger)
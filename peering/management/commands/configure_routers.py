@@ -1,7 +1,8 @@
 from django.core.management.base import BaseCommand
 
 from extras.models import JobResult
-from peering.jobs import set_napalm_configuration
+from peering.deployment import ConfigurationDeployer
+from peering.jobs import deploy_configurations
 from peering.models import Router
 
 
@@ -12,7 +13,12 @@ class Command(BaseCommand):
         parser.add_argument(
             "--no-commit-check",
             action="store_true",
-            help="Do not check for configuration changes before commiting them (no effect in task mode).",
+            help="Do not check for configuration changes before commiting them.",
+        )
+        parser.add_argument(
+            "--force",
+            action="store_true",
+            help="Deploy configurations even if unchanged since their last deployment.",
         )
         parser.add_argument(
             "--limit",
@@ -25,35 +31,22 @@ class Command(BaseCommand):
             action="store_true",
             help="Delegate router configuration to Redis worker process.",
         )
-
-    def process(self, router, quiet=False, as_task=False, no_commit_check=False):
-        if not quiet:
-            self.stdout.write(f"  - {router.hostname} ... ", ending="")
-
-        if not as_task:
-            configuration = router.generate_configuration()
-            error, changes = router.set_napalm_configuration(
-                configuration, commit=no_commit_check
-            )
-            if not no_commit_check and not error and changes:
-                error, _ = router.set_napalm_configuration(configuration, commit=True)
-
-            if not quiet:
-                if not error:
-                    self.stdout.write(self.style.SUCCESS("success"))
-                else:
-                    self.stdout.write(self.style.ERROR("failed"))
-        else:
-            job = JobResult.enqueue_job(
-                set_napalm_configuration,
-                "commands.configure_routers",
-                Router,
-                None,
-                router,
-                True,
-            )
-            if not quiet:
-                self.stdout.write(self.style.SUCCESS(f"task #{job.id}"))
+        parser.add_argument(
+            "-c",
+            "--concurrency",
+            type=int,
+            help="Maximum number of routers to configure at the same time.",
+        )
+        parser.add_argument(
+            "--canary",
+            type=int,
+            help="Number of routers to configure first, before any others.",
+        )
+        parser.add_argument(
+            "--wave-size",
+            type=int,
+            help="Number of routers to configure in each wave after the canary one (0 for a single wave).",
+        )
 
     def handle(self, *args, **options):
         quiet = options["verbosity"] == 0
@@ -62,17 +55,42 @@ class Command(BaseCommand):
         # is running on a supported platform
         routers = Router.objects.filter(
             configuration_template__isnull=False, platform__isnull=False
-        )
+        ).select_related("platform")
         if options["limit"]:
             routers = routers.filter(hostname__in=options["limit"].split(","))
 
         if not quiet:
             self.stdout.write("[*] Deploying configurations")
 
-        for r in routers:
-            self.process(
-                r,
-                quiet=quiet,
-                as_task=options["tasks"],
-                no_commit_check=options["no_commit_check"],
+        kwargs = {
+            "commit_check": not options["no_commit_check"],
+            "force": options["force"],
+            "concurrency": options["concurrency"],
+            "canary": options["canary"],
+            "wave_size": options["wave_size"],
+        }
+
+        if options["tasks"]:
+            job = JobResult.enqueue_job(
+                deploy_configurations,
+                "commands.configure_routers",
+                Router,
+                None,
+                list(routers),
+                True,
+                **kwargs,
             )
+            if not quiet:
+                self.stdout.write(self.style.SUCCESS(f"  - task #{job.id}"))
+            return
+
+        def report(router, result):
+            if quiet:
+                return
+            self.stdout.write(f"  - {router.hostname} ... ", ending="")
+            if result["success"]:
+                self.stdout.write(self.style.SUCCESS("success"))
+            else:
+                self.stdout.write(self.style.ERROR(f"failed ({result['message']})"))
+
+        ConfigurationDeployer(commit=True, **kwargs).deploy(routers, callback=report)
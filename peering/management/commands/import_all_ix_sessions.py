@@ -1,6 +1,7 @@
 from django.core.management.base import BaseCommand
 
 from net.models import Connection
+from peering.device_io import DeviceIO
 from peering.models import InternetExchange
 
 
@@ -11,10 +12,11 @@ class Command(BaseCommand):
         self.stdout.write("[*] Importing existing sessions from IXPs")
         internet_exchanges = InternetExchange.objects.all()
 
+        usable_connections = {}
         for ix in internet_exchanges:
-            if options["verbosity"] >= 2:
-                self.stdout.write(f"[*] Attempting to import sessions for {ix}")
-            connections = Connection.objects.filter(internet_exchange_point=ix)
+            connections = Connection.objects.filter(
+                internet_exchange_point=ix
+            ).select_related("router__platform")
             if connections.count() < 1:
                 if options["verbosity"] >= 2:
                     self.stdout.write(f"  - No connections on {ix}")
@@ -27,8 +29,38 @@ class Command(BaseCommand):
                             f"  - Ignored connection {connection}, no router associated or router is not usable"
                         )
                     continue
+                usable_connections.setdefault(ix, []).append(connection)
+
+        # Retrieve BGP neighbors of all routers concurrently, each router only once
+        routers = {
+            c.router_id: c.router
+            for connections in usable_connections.values()
+            for c in connections
+        }
+        bgp_neighbors = {}
+        for router, neighbors, error, _ in DeviceIO().map(
+            lambda router: router.get_bgp_neighbors(), routers.values()
+        ):
+            if error:
+                self.stdout.write(
+                    self.style.ERROR(
+                        f"  - Cannot get BGP neighbors of {router}: {error}"
+                    )
+                )
+            else:
+                bgp_neighbors[router.pk] = neighbors
+
+        for ix, connections in usable_connections.items():
+            if options["verbosity"] >= 2:
+                self.stdout.write(f"[*] Attempting to import sessions for {ix}")
+
+            for connection in connections:
+                if connection.router_id not in bgp_neighbors:
+                    continue
 
-                session_number, asn_number = ix.import_sessions(connection)
+                session_number, asn_number = ix.import_sessions(
+                    connection, bgp_neighbors=bgp_neighbors[connection.router_id]
+                )
                 self.stdout.write(
                     f"[*] Imported {session_number} sessions for {asn_number} autonomous systems"
                 )
@@ -1,8 +1,9 @@
 from django.core.management.base import BaseCommand
 
 from extras.models import JobResult
-from peering.jobs import poll_bgp_sessions
+from peering.jobs import poll_bgp_sessions_fleet
 from peering.models import Router
+from peering.polling import BGPSessionsPoller
 
 
 class Command(BaseCommand):
@@ -21,37 +22,45 @@ class Command(BaseCommand):
             action="store_true",
             help="Delegate BGP sessions polling to Redis worker process.",
         )
+        parser.add_argument(
+            "-c",
+            "--concurrency",
+            type=int,
+            help="Maximum number of routers to poll at the same time.",
+        )
+
+    def handle(self, *args, **options):
+        quiet = options["verbosity"] == 0
+        routers = Router.objects.filter(poll_bgp_sessions_state=True).select_related(
+            "platform"
+        )
+        if options["limit"]:
+            routers = routers.filter(hostname__in=options["limit"].split(","))
 
-    def process(self, router, quiet=False, as_task=False):
         if not quiet:
-            self.stdout.write(f"  - {router.hostname} ... ", ending="")
+            self.stdout.write("[*] Polling BGP sessions state")
 
-        if not as_task:
-            success = router.poll_bgp_sessions()
-            if not quiet:
-                if success:
-                    self.stdout.write(self.style.SUCCESS("success"))
-                else:
-                    self.stdout.write(self.style.ERROR("failed"))
-        else:
+        if options["tasks"]:
             job = JobResult.enqueue_job(
-                poll_bgp_sessions,
+                poll_bgp_sessions_fleet,
                 "commands.poll_bgp_sessions",
                 Router,
                 None,
-                router,
+                list(routers),
             )
             if not quiet:
-                self.stdout.write(self.style.SUCCESS(f"task #{job.id}"))
-
-    def handle(self, *args, **options):
-        quiet = options["verbosity"] == 0
-        routers = Router.objects.filter(poll_bgp_sessions_state=True)
-        if options["limit"]:
-            routers = routers.filter(hostname__in=options["limit"].split(","))
+                self.stdout.write(self.style.SUCCESS(f"  - task #{job.id}"))
+            return
 
-        if not quiet:
-            self.stdout.write("[*] Polling BGP sessions state")
+        def report(router, result):
+            if quiet:
+                return
+            self.stdout.write(f"  - {router.hostname} ... ", ending="")
+            if result["success"]:
+                self.stdout.write(self.style.SUCCESS("success"))
+            else:
+                self.stdout.write(self.style.ERROR(f"failed ({result['message']})"))
 
-        for r in routers:
-            self.process(r, quiet=quiet, as_task=options["tasks"])
+        BGPSessionsPoller(concurrency=options["concurrency"]).poll(
+            routers, callback=report
+        )
@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand
+
+from peering.polling import BGPPollingScheduler
+
+
+class Command(BaseCommand):
+    help = "Poll BGP sessions on routers when they are due, forever."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "-t",
+            "--tasks",
+            action="store_true",
+            help="Delegate BGP sessions polling to Redis worker process.",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Poll routers which are due and exit.",
+        )
+
+    def handle(self, *args, **options):
+        quiet = options["verbosity"] == 0
+        scheduler = BGPPollingScheduler(as_task=options["tasks"])
+
+        def report(router, result):
+            if quiet:
+                return
+            self.stdout.write(f"  - {router.hostname} ... ", ending="")
+            if result["success"]:
+                self.stdout.write(self.style.SUCCESS("success"))
+            else:
+                self.stdout.write(self.style.ERROR(f"failed ({result['message']})"))
+
+        if not quiet:
+            self.stdout.write("[*] Scheduling BGP sessions polling")
+
+        if options["once"]:
+            scheduler.run_pending(callback=report)
+        else:
+            scheduler.run(callback=report)
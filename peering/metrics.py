@@ -0,0 +1,157 @@
+import threading
+import time
+from contextlib import contextmanager
+
+from prometheus_client import Histogram
+
+device_operation_seconds = Histogram(
+    "peering_device_operation_seconds",
+    "Time spent in an operation on a router",
+    ["operation", "transport", "platform", "router", "outcome"],
+    buckets=(0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, float("inf")),
+)
+
+# Summaries gathering operations of running jobs
+_summaries = []
+_lock = threading.Lock()
+
+
+class DeviceOperationsSummary(object):
+    """
+    Gathers the number, outcome and duration of operations on routers.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.operations = {}
+
+    def __bool__(self):
+        return bool(self.operations)
+
+    def add(self, operation, transport, platform, router, success, duration):
+        with self.lock:
+            stats = self.operations.setdefault(
+                (operation, transport, platform, router), [0, 0, 0.0, 0.0]
+            )
+            stats[0] += 1
+            stats[1] += 0 if success else 1
+            stats[2] += duration
+            stats[3] = max(stats[3], duration)
+
+    def _aggregate(self, key):
+        aggregated = {}
+        with self.lock:
+            operations = list(self.operations.items())
+        for labels, (count, failures, total, maximum) in operations:
+            stats = aggregated.setdefault(key(*labels), [0, 0, 0.0, 0.0])
+            stats[0] += count
+            stats[1] += failures
+            stats[2] += total
+            stats[3] = max(stats[3], maximum)
+
+        return sorted(aggregated.items(), key=lambda item: item[1][2], reverse=True)
+
+    def as_dict(self, slowest=10):
+        """
+        Returns the statistics of operations by platform and the ones of the
+        `slowest` routers, the slowest first.
+        """
+
+        def stats(count, failures, total, maximum):
+            return {
+                "count": count,
+                "failures": failures,
+                "total_seconds": round(total, 3),
+                "average_seconds": round(total / count, 3),
+                "max_seconds": round(maximum, 3),
+            }
+
+        return {
+            "operations": [
+                {
+                    "operation": operation,
+                    "transport": transport,
+                    "platform": platform,
+                    **stats(*values),
+                }
+                for (operation, transport, platform), values in self._aggregate(
+                    lambda o, t, p, r: (o, t, p)
+                )
+            ],
+            "routers": [
+                {"router": router, "platform": platform, **stats(*values)}
+                for (router, platform), values in self._aggregate(
+                    lambda o, t, p, r: (r, p)
+                )[:slowest]
+            ],
+        }
+
+
+def record(router, operation, success, duration, transport="napalm"):
+    """
+    Records the outcome and duration of an operation on a router.
+    """
+    platform = router.platform.slug if router.platform else ""
+    device_operation_seconds.labels(
+        operation=operation,
+        transport=transport,
+        platform=platform,
+        router=router.hostname,
+        outcome="success" if success else "failure",
+    ).observe(duration)
+
+    with _lock:
+        summaries = list(_summaries)
+    for summary in summaries:
+        summary.add(operation, transport, platform, router.hostname, success, duration)
+
+
+class Measurement(object):
+    def __init__(self):
+        self.success = True
+
+
+@contextmanager
+def measure(router, operation, transport="napalm"):
+    """
+    Records the duration of the operation run in the block. The operation is
+    considered as failed if an exception is raised or if the `success` attribute
+    of the yielded object is set to `False`.
+    """
+    measurement = Measurement()
+    started = time.monotonic()
+    try:
+        yield measurement
+    except BaseException:
+        measurement.success = False
+        raise
+    finally:
+        record(
+            router,
+            operation,
+            measurement.success,
+            time.monotonic() - started,
+            transport=transport,
+        )
+
+
+@contextmanager
+def collect(job_result=None):
+    """
+    Yields a summary of the operations on routers run in the block, whatever the
+    thread running them. The summary is saved in the data of the given job result
+    as `device_operations`.
+    """
+    summary = DeviceOperationsSummary()
+    with _lock:
+        _summaries.append(summary)
+    try:
+        yield summary
+    finally:
+        with _lock:
+            _summaries.remove(summary)
+        if job_result is not None and summary:
+            if not job_result.data:
+                job_result.data = {}
+            job_result.data["device_operations"] = summary.as_dict()
+            job_result.save()
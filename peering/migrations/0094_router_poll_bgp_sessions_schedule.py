@@ -0,0 +1,35 @@
+# Generated by Django 4.0.10 on 2026-10-18 21:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("peering", "0093_remove_session_enabled_and_rename_router_state"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="router",
+            name="poll_bgp_sessions_failures",
+            field=models.PositiveSmallIntegerField(
+                blank=True, default=0, editable=False
+            ),
+        ),
+        migrations.AddField(
+            model_name="router",
+            name="poll_bgp_sessions_interval",
+            field=models.PositiveIntegerField(
+                blank=True,
+                default=0,
+                help_text="Seconds between two scheduled polls, the lower the higher the priority (0 to use the default)",
+                verbose_name="BGP sessions polling interval",
+            ),
+        ),
+        migrations.AddField(
+            model_name="router",
+            name="poll_bgp_sessions_next",
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+    ]
@@ -0,0 +1,81 @@
+# Generated by Django 4.0.10 on 2026-10-18 21:55
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("contenttypes", "0002_remove_content_type_name"),
+        ("peering", "0094_router_poll_bgp_sessions_schedule"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="BGPSessionStateRecord",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("session_id", models.PositiveBigIntegerField()),
+                ("time", models.DateTimeField()),
+                (
+                    "resolution",
+                    models.PositiveSmallIntegerField(
+                        choices=[(0, "Raw"), (1, "Hourly"), (2, "Daily")], default=0
+                    ),
+                ),
+                (
+                    "bgp_state",
+                    models.CharField(
+                        blank=True,
+                        choices=[
+                            ("idle", "Idle"),
+                            ("connect", "Connect"),
+                            ("active", "Active"),
+                            ("opensent", "OpenSent"),
+                            ("openconfirm", "OpenConfirm"),
+                            ("established", "Established"),
+                        ],
+                        max_length=50,
+                        null=True,
+                    ),
+                ),
+                ("received_prefix_count", models.PositiveIntegerField(default=0)),
+                ("advertised_prefix_count", models.PositiveIntegerField(default=0)),
+                ("state_changes", models.PositiveIntegerField(default=0)),
+                (
+                    "session_type",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="contenttypes.contenttype",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "BGP session state record",
+                "ordering": ["-time"],
+            },
+        ),
+        migrations.AddIndex(
+            model_name="bgpsessionstaterecord",
+            index=models.Index(
+                fields=["session_type", "session_id", "time"],
+                name="peering_bgp_session_91f883_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="bgpsessionstaterecord",
+            index=models.Index(
+                fields=["resolution", "time"], name="peering_bgp_resolut_94516a_idx"
+            ),
+        ),
+    ]
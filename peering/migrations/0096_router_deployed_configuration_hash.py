@@ -0,0 +1,18 @@
+# Generated by Django 4.0.10 on 2026-10-18 22:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("peering", "0095_bgpsessionstaterecord"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="router",
+            name="deployed_configuration_hash",
+            field=models.CharField(blank=True, editable=False, max_length=64),
+        ),
+    ]
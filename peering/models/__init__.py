@@ -2,6 +2,7 @@ from .abstracts import BGPSession, Template
 from .models import (
     AutonomousSystem,
     BGPGroup,
+    BGPSessionStateRecord,
     Community,
     DirectPeeringSession,
     InternetExchange,
@@ -14,6 +15,7 @@ __all__ = (
     "AutonomousSystem",
     "BGPGroup",
     "BGPSession",
+    "BGPSessionStateRecord",
     "Community",
     "DirectPeeringSession",
     "InternetExchange",
@@ -1,6 +1,7 @@
 import ipaddress
 import logging
 
+from django.contrib.contenttypes.fields import GenericRelation
 from django.db import models
 from django.utils.safestring import mark_safe
 from netfields import InetAddressField, NetManager
@@ -74,7 +75,7 @@ class AbstractGroup(
         Polls BGP sessions belonging to the group.
         """
         for router in self.get_routers():
-            router.poll_bgp_sessions()
+            router.poll_bgp_sessions(use_cache=True)
 
 
 class BGPSession(
@@ -99,6 +100,7 @@ class BGPSession(
       * a received prefix count (it will stay none if polling is disabled)
       * a advertised prefix count (it will stay none if polling is disabled)
       * a date and time record of the last established state of the session
+      * a history of the BGP states and prefix counts of the session
       * comments that consist of plain text that can use the markdown format
     """
 
@@ -141,6 +143,11 @@ class BGPSession(
     advertised_prefix_count = models.PositiveIntegerField(blank=True, default=0)
     last_established_state = models.DateTimeField(blank=True, null=True)
     comments = models.TextField(blank=True)
+    state_history = GenericRelation(
+        to="peering.BGPSessionStateRecord",
+        content_type_field="session_type",
+        object_id_field="session_id",
+    )
 
     objects = NetManager()
     logger = logging.getLogger("peering.manager.peering")
@@ -242,6 +249,18 @@ class BGPSession(
     def poll(self):
         raise NotImplementedError
 
+    def get_state_history(self, after=None, before=None):
+        """
+        Returns the state history records of the session, most recent first,
+        within the given time range if any.
+        """
+        records = self.state_history.all()
+        if after:
+            records = records.filter(time__gte=after)
+        if before:
+            records = records.filter(time__lte=before)
+        return records
+
     def get_bgp_state_html(self):
         """
         Return an HTML element based on the BGP state.
@@ -1,21 +1,26 @@
+import hashlib
 import ipaddress
 import logging
+import time
 
 import napalm
-from cacheops import cached_as
+from cacheops import CacheMiss, cache, invalidate_model, invalidate_obj
 from django.conf import settings
-from django.contrib.contenttypes.fields import GenericRelation
+from django.contrib.contenttypes.fields import GenericForeignKey, GenericRelation
+from django.contrib.contenttypes.models import ContentType
 from django.db import models, transaction
 from django.db.models import Q
 from django.urls import reverse
 from django.utils import timezone
 from django.utils.safestring import mark_safe
 from netfields import InetAddressField
+from redis.exceptions import RedisError
 
 from net.models import Connection
 from netbox.api import NetBox
 from peering import call_irr_as_set_resolver, parse_irr_as_set
 from peering.enums import (
+    BGPSessionStateResolution,
     BGPState,
     CommunityType,
     DeviceStatus,
@@ -23,6 +28,8 @@ from peering.enums import (
     RoutingPolicyType,
 )
 from peering.fields import ASNField, CommunityField
+from peering.metrics import measure, record
+from peering.napalm_pool import napalm_pool
 from peeringdb.functions import get_shared_internet_exchanges
 from peeringdb.models import IXLanPrefix, Network, NetworkContact, NetworkIXLan
 from utils.models import (
@@ -116,6 +123,40 @@ class AutonomousSystem(
 
         return autonomous_system
 
+    @staticmethod
+    def bulk_create_from_peeringdb(asns):
+        """
+        Returns a dictionary mapping each of the given ASNs having a PeeringDB
+        record to its autonomous system, creating the missing ones in bulk.
+        """
+        networks = {n.asn: n for n in Network.objects.filter(asn__in=set(asns))}
+        autonomous_systems = {
+            a.asn: a for a in AutonomousSystem.objects.filter(asn__in=networks)
+        }
+
+        missing = [
+            AutonomousSystem(
+                asn=network.asn,
+                name=network.name,
+                irr_as_set=network.irr_as_set,
+                ipv6_max_prefixes=network.info_prefixes6,
+                ipv4_max_prefixes=network.info_prefixes4,
+            )
+            for asn, network in networks.items()
+            if asn not in autonomous_systems
+        ]
+        if missing:
+            # Another process may have created some of them meanwhile
+            AutonomousSystem.objects.bulk_create(missing, ignore_conflicts=True)
+            autonomous_systems.update(
+                (a.asn, a)
+                for a in AutonomousSystem.objects.filter(
+                    asn__in=[a.asn for a in missing]
+                )
+            )
+
+        return autonomous_systems
+
     def __str__(self):
         return f"AS{self.asn} - {self.name}"
 
@@ -412,6 +453,142 @@ class BGPGroup(AbstractGroup):
         )
 
 
+class BGPSessionStateRecordQuerySet(models.QuerySet):
+    def truncate(self, time, resolution):
+        """
+        Returns the start of the period of the given `resolution` including `time`.
+        """
+        time = timezone.localtime(time).replace(minute=0, second=0, microsecond=0)
+        if resolution == BGPSessionStateResolution.DAILY:
+            time = time.replace(hour=0)
+        return time
+
+    def downsample(self, resolution, cutoff, batch_size=1000):
+        """
+        Merges records of the given `resolution` older than `cutoff` into records
+        of the next coarser resolution, one per session and period, and returns
+        the number of merged records.
+
+        A merged record keeps the last state and prefix counts of its period and
+        the total number of state changes that occurred during it.
+        """
+        target = resolution + 1
+        # Only merge complete periods
+        cutoff = self.truncate(cutoff, target)
+        records = (
+            self.filter(resolution=resolution, time__lt=cutoff)
+            .order_by("session_type_id", "session_id", "time")
+            .values_list(
+                "session_type_id",
+                "session_id",
+                "time",
+                "bgp_state",
+                "received_prefix_count",
+                "advertised_prefix_count",
+                "state_changes",
+            )
+        )
+
+        with transaction.atomic():
+            merged, current, batch = 0, None, []
+            for (
+                type_id,
+                session_id,
+                time,
+                state,
+                received,
+                advertised,
+                changes,
+            ) in records.iterator(chunk_size=batch_size):
+                merged += 1
+                key = (type_id, session_id, self.truncate(time, target))
+                if not current or current[0] != key:
+                    current = (
+                        key,
+                        self.model(
+                            session_type_id=type_id,
+                            session_id=session_id,
+                            time=key[2],
+                            resolution=target,
+                        ),
+                    )
+                    batch.append(current[1])
+                record = current[1]
+                record.bgp_state = state
+                record.received_prefix_count = received
+                record.advertised_prefix_count = advertised
+                record.state_changes += changes
+
+                # Keep the record being merged until its period is complete
+                if len(batch) > batch_size:
+                    self.bulk_create(batch[:-1])
+                    del batch[:-1]
+            self.bulk_create(batch)
+            self.filter(resolution=resolution, time__lt=cutoff)._raw_delete(
+                using=self.db
+            )
+
+        return merged
+
+
+class BGPSessionStateRecord(models.Model):
+    """
+    Append-only history of the BGP state and prefix counts of a session.
+
+    Records are written when the state or the prefix counts of a session change.
+    They are later downsampled to hourly and then daily records, which keep the
+    last values of their period and the number of state changes (flaps) that
+    occurred during it.
+    """
+
+    session_type = models.ForeignKey(
+        to=ContentType, on_delete=models.CASCADE, related_name="+"
+    )
+    session_id = models.PositiveBigIntegerField()
+    session = GenericForeignKey(ct_field="session_type", fk_field="session_id")
+    time = models.DateTimeField()
+    resolution = models.PositiveSmallIntegerField(
+        choices=BGPSessionStateResolution, default=BGPSessionStateResolution.RAW
+    )
+    bgp_state = models.CharField(max_length=50, choices=BGPState, blank=True, null=True)
+    received_prefix_count = models.PositiveIntegerField(default=0)
+    advertised_prefix_count = models.PositiveIntegerField(default=0)
+    state_changes = models.PositiveIntegerField(default=0)
+
+    objects = BGPSessionStateRecordQuerySet.as_manager()
+
+    class Meta:
+        ordering = ["-time"]
+        indexes = [
+            models.Index(fields=["session_type", "session_id", "time"]),
+            models.Index(fields=["resolution", "time"]),
+        ]
+        verbose_name = "BGP session state record"
+
+    def __str__(self):
+        return f"{self.session} at {self.time}"
+
+    get_bgp_state_html = BGPSession.get_bgp_state_html
+
+    @classmethod
+    def from_session(cls, session, previous_state=None, time=None):
+        """
+        Returns an unsaved record of the current state of the given session, which
+        was in `previous_state` before.
+        """
+        return cls(
+            session_type=ContentType.objects.get_for_model(session),
+            session_id=session.pk,
+            time=time or timezone.now(),
+            bgp_state=session.bgp_state,
+            received_prefix_count=session.received_prefix_count,
+            advertised_prefix_count=session.advertised_prefix_count,
+            state_changes=int(
+                previous_state is not None and previous_state != session.bgp_state
+            ),
+        )
+
+
 class Community(ChangeLoggedMixin, ConfigContextMixin, ExportTemplatesMixin, TagsMixin):
     name = models.CharField(max_length=128)
     slug = models.SlugField(unique=True, max_length=255)
@@ -492,12 +669,25 @@ class DirectPeeringSession(BGPSession):
 
         state = self.router.poll_bgp_session(self.ip_address)
         if state:
+            previous = (
+                self.bgp_state,
+                self.received_prefix_count,
+                self.advertised_prefix_count,
+            )
             self.bgp_state = state["bgp_state"]
             self.received_prefix_count = state["received_prefix_count"]
             self.advertised_prefix_count = state["advertised_prefix_count"]
             if self.bgp_state == BGPState.ESTABLISHED:
                 self.last_established_state = timezone.now()
             self.save()
+            if previous != (
+                self.bgp_state,
+                self.received_prefix_count,
+                self.advertised_prefix_count,
+            ):
+                BGPSessionStateRecord.from_session(
+                    self, previous_state=previous[0]
+                ).save()
             return True
 
         return False
@@ -700,73 +890,98 @@ class InternetExchange(AbstractGroup):
         return network_service
 
     @transaction.atomic
-    def import_sessions(self, connection):
+    def import_sessions(self, connection, bgp_neighbors=None):
         """
         Imports sessions setup on a connected router.
+
+        BGP neighbors already retrieved from the router can be given with
+        `bgp_neighbors` to avoid interacting with it.
+
+        Returns the number of imported sessions and the number of autonomous
+        systems they belong to.
         """
-        session_number, asn_number = 0, 0
-        ignored_autonomous_systems = []
+        if bgp_neighbors is None:
+            bgp_neighbors = connection.router.get_bgp_neighbors()
 
-        allowed_prefixes = self.get_prefixes()
-        sessions = connection.router.get_bgp_neighbors()
+        # Index prefixes by IP version and length, an address fits in a prefix if
+        # its network for one of these lengths is known
+        prefixes = {}
+        for p in self.get_prefixes():
+            prefix = ipaddress.ip_network(p.prefix)
+            prefixes.setdefault((prefix.version, prefix.prefixlen), set()).add(prefix)
 
         def is_valid(ip_address):
-            for p in allowed_prefixes:
-                if p.prefix.version == ip_address.version:
-                    if ip_address in p.prefix:
-                        return True
-            return False
+            return any(
+                ipaddress.ip_network((ip_address, length), strict=False) in networks
+                for (version, length), networks in prefixes.items()
+                if version == ip_address.version
+            )
+
+        def get_existing():
+            return {
+                ipaddress.ip_interface(str(ip)).ip
+                for ip in InternetExchangePeeringSession.objects.nocache()
+                .filter(ixp_connection=connection)
+                .values_list("ip_address", flat=True)
+            }
 
-        for session in sessions:
+        existing = get_existing()
+        candidates = {}
+        for session in bgp_neighbors:
             ip = ipaddress.ip_address(session["ip_address"])
             if not is_valid(ip):
                 logger.debug(
                     f"ignoring ixp session, {str(ip)} does not fit in any prefixes"
                 )
                 continue
-
-            logger.debug(f"processing ixp session {str(ip)}")
-            remote_asn = session["remote_asn"]
-
-            try:
-                InternetExchangePeeringSession.objects.get(
-                    ixp_connection=connection, ip_address=ip
-                )
+            if ip in existing or ip in candidates:
                 logger.debug(
-                    f"ixp session {str(ip)} with as{remote_asn} already exists"
+                    f"ixp session {str(ip)} with as{session['remote_asn']} already exists"
                 )
                 continue
-            except InternetExchangePeeringSession.DoesNotExist:
-                logger.debug(
-                    f"ixp session {str(ip)} with as{remote_asn} does not exist"
-                )
+            candidates[ip] = session["remote_asn"]
 
-            # Get the AS, create it if needed
-            autonomous_system = AutonomousSystem.create_from_peeringdb(remote_asn)
-
-            # Do not count the AS if it does not have a PeeringDB record
-            if autonomous_system:
-                logger.debug(f"as{remote_asn} created")
-                asn_number += 1
-            else:
-                if remote_asn not in ignored_autonomous_systems:
-                    ignored_autonomous_systems.append(remote_asn)
-                    logger.debug(
-                        f"could not create as{remote_asn}, session {str(ip)} ignored"
-                    )
+        # Get the ASes, create them if needed
+        autonomous_systems = AutonomousSystem.bulk_create_from_peeringdb(
+            candidates.values()
+        )
 
+        sessions = []
+        for ip, remote_asn in candidates.items():
             # Only add a session if we can use the AS it is linked to
-            if autonomous_system:
-                logger.debug(f"creating session {str(ip)}")
-                InternetExchangePeeringSession.objects.create(
-                    autonomous_system=autonomous_system,
-                    ixp_connection=connection,
-                    ip_address=ip,
+            autonomous_system = autonomous_systems.get(remote_asn)
+            if not autonomous_system:
+                logger.debug(
+                    f"could not create as{remote_asn}, session {str(ip)} ignored"
                 )
-                session_number += 1
-                logger.debug(f"session {str(ip)} created")
+                continue
 
-        return session_number, asn_number
+            session = InternetExchangePeeringSession(
+                autonomous_system=autonomous_system,
+                ixp_connection=connection,
+                ip_address=str(ip),
+            )
+            # Signals are not sent by bulk_create
+            session.encrypt_password(commit=False)
+            sessions.append(session)
+
+        with transaction.atomic():
+            # Imports on the same connection wait for each other, sessions created
+            # meanwhile are not created again nor counted
+            Connection.objects.select_for_update().filter(pk=connection.pk).exists()
+            existing = get_existing()
+            sessions = [
+                s
+                for s in sessions
+                if ipaddress.ip_address(s.ip_address) not in existing
+            ]
+            # Sessions created outside of imports are still ignored
+            InternetExchangePeeringSession.objects.bulk_create(
+                sessions, ignore_conflicts=True
+            )
+        logger.debug(f"created {len(sessions)} ixp sessions on {connection}")
+
+        return len(sessions), len({s.autonomous_system_id for s in sessions})
 
 
 class InternetExchangePeeringSession(BGPSession):
@@ -850,12 +1065,25 @@ class InternetExchangePeeringSession(BGPSession):
 
         state = self.ixp_connection.router.poll_bgp_session(self.ip_address)
         if state:
+            previous = (
+                self.bgp_state,
+                self.received_prefix_count,
+                self.advertised_prefix_count,
+            )
             self.bgp_state = state["bgp_state"]
             self.received_prefix_count = state["received_prefix_count"]
             self.advertised_prefix_count = state["advertised_prefix_count"]
             if self.bgp_state == BGPState.ESTABLISHED:
                 self.last_established_state = timezone.now()
             self.save()
+            if previous != (
+                self.bgp_state,
+                self.received_prefix_count,
+                self.advertised_prefix_count,
+            ):
+                BGPSessionStateRecord.from_session(
+                    self, previous_state=previous[0]
+                ).save()
             return True
 
         return False
@@ -929,9 +1157,22 @@ class Router(ChangeLoggedMixin, ConfigContextMixin, ExportTemplatesMixin, TagsMi
         verbose_name="Poll BGP sessions state",
     )
     poll_bgp_sessions_last_updated = models.DateTimeField(blank=True, null=True)
+    poll_bgp_sessions_interval = models.PositiveIntegerField(
+        blank=True,
+        default=0,
+        help_text="Seconds between two scheduled polls, the lower the higher the priority (0 to use the default)",
+        verbose_name="BGP sessions polling interval",
+    )
+    poll_bgp_sessions_next = models.DateTimeField(blank=True, null=True, editable=False)
+    poll_bgp_sessions_failures = models.PositiveSmallIntegerField(
+        blank=True, default=0, editable=False
+    )
     configuration_template = models.ForeignKey(
         "devices.Configuration", blank=True, null=True, on_delete=models.SET_NULL
     )
+    deployed_configuration_hash = models.CharField(
+        max_length=64, blank=True, editable=False
+    )
     netbox_device_id = models.PositiveIntegerField(
         blank=True, default=0, verbose_name="NetBox device"
     )
@@ -1117,6 +1358,45 @@ class Router(ChangeLoggedMixin, ConfigContextMixin, ExportTemplatesMixin, TagsMi
         else:
             return ""
 
+    @staticmethod
+    def get_configuration_hash(config):
+        """
+        Returns the fingerprint of a rendered configuration.
+        """
+        return hashlib.sha256(config.encode()).hexdigest()
+
+    def is_configuration_deployed(self, config):
+        """
+        Tells if the given configuration is the last one successfully commited on
+        the router.
+        """
+        return bool(
+            self.deployed_configuration_hash
+        ) and self.deployed_configuration_hash == self.get_configuration_hash(config)
+
+    def set_deployed_configuration(self, config):
+        """
+        Saves the fingerprint of a configuration successfully commited on the
+        router.
+        """
+        self.deployed_configuration_hash = self.get_configuration_hash(config)
+        Router.objects.filter(pk=self.pk).update(
+            deployed_configuration_hash=self.deployed_configuration_hash
+        )
+        invalidate_obj(self)
+
+    def get_napalm_args(self):
+        """
+        Returns NAPALM optional arguments: first global, then platform's, finish
+        with router's.
+        """
+        args = dict(settings.NAPALM_ARGS)
+        if self.platform and self.platform.napalm_args:
+            args.update(self.platform.napalm_args)
+        if self.napalm_args:
+            args.update(self.napalm_args)
+        return args
+
     def get_napalm_device(self):
         """
         Returns an instance of the NAPALM driver to connect to a router.
@@ -1131,19 +1411,12 @@ class Router(ChangeLoggedMixin, ConfigContextMixin, ExportTemplatesMixin, TagsMi
             driver = napalm.get_network_driver(self.platform.napalm_driver)
             self.logger.debug(f"found napalm driver '{self.platform.napalm_driver}'")
 
-            # Merge NAPALM args: first global, then platform's, finish with router's
-            args = settings.NAPALM_ARGS
-            if self.platform.napalm_args:
-                args.update(self.platform.napalm_args)
-            if self.napalm_args:
-                args.update(self.napalm_args)
-
             return driver(
                 hostname=self.hostname,
                 username=self.napalm_username or settings.NAPALM_USERNAME,
                 password=self.napalm_password or settings.NAPALM_PASSWORD,
                 timeout=self.napalm_timeout or settings.NAPALM_TIMEOUT,
-                optional_args=args,
+                optional_args=self.get_napalm_args(),
             )
         except napalm.base.exceptions.ModuleImportError:
             # Unable to import proper driver from napalm
@@ -1168,6 +1441,7 @@ class Router(ChangeLoggedMixin, ConfigContextMixin, ExportTemplatesMixin, TagsMi
         if not device:
             return success
 
+        started = time.monotonic()
         try:
             self.logger.debug(f"connecting to {self.hostname}")
             device.open()
@@ -1181,6 +1455,7 @@ class Router(ChangeLoggedMixin, ConfigContextMixin, ExportTemplatesMixin, TagsMi
             self.logger.debug(f"successfully connected to {self.hostname}")
             success = True
         finally:
+            record(self, "open", success, time.monotonic() - started)
             return success
 
     def close_napalm_device(self, device):
@@ -1196,7 +1471,8 @@ class Router(ChangeLoggedMixin, ConfigContextMixin, ExportTemplatesMixin, TagsMi
             return False
 
         try:
-            device.close()
+            with measure(self, "close"):
+                device.close()
             self.logger.debug(f"closed connection with {self.hostname}")
         except Exception as e:
             self.logger.debug(f"failed to close connection with {self.hostname}: {e}")
@@ -1219,7 +1495,8 @@ class Router(ChangeLoggedMixin, ConfigContextMixin, ExportTemplatesMixin, TagsMi
         self.logger.debug(f"testing connection with {self.hostname}")
         opened = self.open_napalm_device(device)
         if opened:
-            alive = device.is_alive()
+            with measure(self, "is_alive"):
+                alive = device.is_alive()
             if alive:
                 closed = self.close_napalm_device(device)
 
@@ -1231,7 +1508,9 @@ class Router(ChangeLoggedMixin, ConfigContextMixin, ExportTemplatesMixin, TagsMi
 
         return opened and closed and alive
 
-    def set_napalm_configuration(self, config, commit=False):
+    def set_napalm_configuration(
+        self, config, commit=False, commit_check=False, force=False
+    ):
         """
         Tries to merge a given configuration on a device using NAPALM.
 
@@ -1241,6 +1520,12 @@ class Router(ChangeLoggedMixin, ConfigContextMixin, ExportTemplatesMixin, TagsMi
         The optional named argument 'commit' is a boolean which is used to know if the
         changes must be commited or discarded. The default value is `False` which
         means that the changes will be discarded.
+
+        If `commit_check` is set, the changes are commited only if there are any,
+        sparing a second connection to check for them first.
+
+        The fingerprint of a successfully commited configuration is saved, the
+        same configuration is not commited again unless `force` is set.
         """
         error, changes = None, None
 
@@ -1259,27 +1544,54 @@ class Router(ChangeLoggedMixin, ConfigContextMixin, ExportTemplatesMixin, TagsMi
             self.logger.debug(f"{self.hostname}: no configuration to merge: {config}")
             return "no configuration found to be merged", changes
 
-        device = self.get_napalm_device()
-        opened = self.open_napalm_device(device)
+        if commit and not force and self.is_configuration_deployed(config):
+            self.logger.debug(
+                f"{self.hostname}: configuration unchanged since last deployment"
+            )
+            return error, changes
+
+        error, changes = self.merge_napalm_configuration(
+            config, commit=commit, commit_check=commit_check
+        )
+        if commit and not error:
+            self.set_deployed_configuration(config)
+
+        return error, changes
+
+    def merge_napalm_configuration(self, config, commit=False, commit_check=False):
+        """
+        Merges a configuration on a device using NAPALM, commiting or discarding
+        the changes, and returns the error, if any, and the changes.
+
+        Only the device is used, nothing is read from or written to the database,
+        it can be called from a `DeviceIO` thread. See `set_napalm_configuration`.
+        """
+        error, changes = None, None
+
+        with napalm_pool.borrow(self) as device:
+            if not device:
+                return f"unable to connect to {self.hostname}", changes
 
-        if opened:
             try:
                 # Load the config
                 self.logger.debug(f"merging configuration on {self.hostname}")
-                device.load_merge_candidate(config=config)
+                with measure(self, "load_merge_candidate"):
+                    device.load_merge_candidate(config=config)
                 self.logger.debug(f"merged configuration\n{config}")
 
                 # Get the config diff
                 self.logger.debug(
                     f"checking for configuration changes on {self.hostname}"
                 )
-                changes = device.compare_config()
+                with measure(self, "compare_config"):
+                    changes = device.compare_config()
                 self.logger.debug(f"raw napalm output\n{changes}")
 
                 # Commit the config if required
-                if commit:
+                if commit and (changes or not commit_check):
                     self.logger.debug(f"commiting configuration on {self.hostname}")
-                    device.commit_config()
+                    with measure(self, "commit_config"):
+                        device.commit_config()
                 else:
                     self.logger.debug(f"discarding configuration on {self.hostname}")
                     device.discard_config()
@@ -1300,19 +1612,12 @@ class Router(ChangeLoggedMixin, ConfigContextMixin, ExportTemplatesMixin, TagsMi
                 self.logger.debug(
                     f"successfully merged configuration on {self.hostname}"
                 )
-            finally:
-                closed = self.close_napalm_device(device)
-                if not closed:
-                    self.logger.debug(
-                        f"error while closing connection with {self.hostname}"
-                    )
-        else:
-            error = f"unable to connect to {self.hostname}"
 
         return error, changes
 
     def _napalm_bgp_neighbors_to_peer_list(self, napalm_dict):
         bgp_peers = []
+        seen = set()
 
         if not napalm_dict:
             return bgp_peers
@@ -1331,24 +1636,26 @@ class Router(ChangeLoggedMixin, ConfigContextMixin, ExportTemplatesMixin, TagsMi
                     self.logger.debug(
                         f"ignored bgp neighbor {ip} in {vrf} vrf on {self.hostname}",
                     )
-                elif ip in [str(i["ip_address"]) for i in bgp_peers]:
+                    continue
+
+                try:
+                    ip_address = ipaddress.ip_address(ip)
+                except ValueError as e:
+                    # Error while parsing the IP address
+                    self.logger.error(
+                        f'ignored bgp neighbor {ip} in {vrf} vrf on {self.hostname} reason "{e}"',
+                    )
+                    continue
+
+                if ip_address in seen:
                     self.logger.debug(f"duplicate bgp neighbor {ip} on {self.hostname}")
-                else:
-                    try:
-                        # Save the BGP session (IP and remote ASN)
-                        bgp_peers.append(
-                            {
-                                "ip_address": ipaddress.ip_address(ip),
-                                "remote_asn": details["remote_as"],
-                            }
-                        )
-                    except ValueError as e:
-                        # Error while parsing the IP address
-                        self.logger.error(
-                            f'ignored bgp neighbor {ip} in {vrf} vrf on {self.hostname} reason "{e}"',
-                        )
-                        # Force next iteration
-                        continue
+                    continue
+
+                # Save the BGP session (IP and remote ASN)
+                seen.add(ip_address)
+                bgp_peers.append(
+                    {"ip_address": ip_address, "remote_asn": details["remote_as"]}
+                )
 
         return bgp_peers
 
@@ -1364,13 +1671,14 @@ class Router(ChangeLoggedMixin, ConfigContextMixin, ExportTemplatesMixin, TagsMi
         """
         bgp_sessions = []
 
-        device = self.get_napalm_device()
-        opened = self.open_napalm_device(device)
+        with napalm_pool.borrow(self) as device:
+            if not device:
+                return bgp_sessions
 
-        if opened:
             # Get all BGP neighbors on the router
             self.logger.debug(f"getting bgp neighbors on {self.hostname}")
-            bgp_neighbors = device.get_bgp_neighbors()
+            with measure(self, "get_bgp_neighbors"):
+                bgp_neighbors = device.get_bgp_neighbors()
             self.logger.debug(f"raw napalm output {bgp_neighbors}")
             self.logger.debug(
                 f"found {len(bgp_neighbors)} vrfs with bgp neighbors on {self.hostname}"
@@ -1381,13 +1689,6 @@ class Router(ChangeLoggedMixin, ConfigContextMixin, ExportTemplatesMixin, TagsMi
                 f"found {len(bgp_sessions)} bgp neighbors on {self.hostname}"
             )
 
-            # Close connection to the device
-            closed = self.close_napalm_device(device)
-            if not closed:
-                self.logger.debug(
-                    f"error while closing connection with {self.hostname}"
-                )
-
         return bgp_sessions
 
     def get_netbox_bgp_neighbors(self):
@@ -1403,7 +1704,8 @@ class Router(ChangeLoggedMixin, ConfigContextMixin, ExportTemplatesMixin, TagsMi
         bgp_sessions = []
 
         self.logger.debug(f"getting bgp neighbors on {self.hostname}")
-        bgp_neighbors = NetBox().napalm(self.netbox_device_id, "get_bgp_neighbors")
+        with measure(self, "get_bgp_neighbors", transport="netbox"):
+            bgp_neighbors = NetBox().napalm(self.netbox_device_id, "get_bgp_neighbors")
         self.logger.debug(f"raw napalm output {bgp_neighbors}")
         self.logger.debug(
             f"found {len(bgp_neighbors)} vrfs with bgp neighbors on {self.hostname}"
@@ -1462,23 +1764,15 @@ class Router(ChangeLoggedMixin, ConfigContextMixin, ExportTemplatesMixin, TagsMi
         """
         bgp_neighbors_detail = []
 
-        device = self.get_napalm_device()
-        opened = self.open_napalm_device(device)
-
-        if opened:
-            # Get all BGP neighbors on the router
-            self.logger.debug(f"getting bgp neighbors detail on {self.hostname}")
-            bgp_neighbors_detail = device.get_bgp_neighbors_detail()
-            self.logger.debug(f"raw napalm output {bgp_neighbors_detail}")
-            self.logger.debug(
-                f"found {len(bgp_neighbors_detail)} vrfs with bgp neighbors on {self.hostname}"
-            )
-
-            # Close connection to the device
-            closed = self.close_napalm_device(device)
-            if not closed:
+        with napalm_pool.borrow(self) as device:
+            if device:
+                # Get all BGP neighbors on the router
+                self.logger.debug(f"getting bgp neighbors detail on {self.hostname}")
+                with measure(self, "get_bgp_neighbors_detail"):
+                    bgp_neighbors_detail = device.get_bgp_neighbors_detail()
+                self.logger.debug(f"raw napalm output {bgp_neighbors_detail}")
                 self.logger.debug(
-                    f"error while closing connection with {self.hostname}"
+                    f"found {len(bgp_neighbors_detail)} vrfs with bgp neighbors on {self.hostname}"
                 )
 
         return (
@@ -1498,9 +1792,10 @@ class Router(ChangeLoggedMixin, ConfigContextMixin, ExportTemplatesMixin, TagsMi
         bgp_neighbors_detail = []
 
         self.logger.debug(f"getting bgp neighbors detail on {self.hostname}")
-        bgp_neighbors_detail = NetBox().napalm(
-            self.netbox_device_id, "get_bgp_neighbors_detail"
-        )
+        with measure(self, "get_bgp_neighbors_detail", transport="netbox"):
+            bgp_neighbors_detail = NetBox().napalm(
+                self.netbox_device_id, "get_bgp_neighbors_detail"
+            )
         self.logger.debug(f"raw napalm output {bgp_neighbors_detail}")
         self.logger.debug(
             f"found {len(bgp_neighbors_detail)} vrfs with bgp neighbors on {self.hostname}",
@@ -1512,29 +1807,130 @@ class Router(ChangeLoggedMixin, ConfigContextMixin, ExportTemplatesMixin, TagsMi
             else self.find_bgp_neighbor_detail(bgp_neighbors_detail, ip_address)
         )
 
-    def get_bgp_neighbors_detail(self, ip_address=None):
+    def _get_bgp_neighbors_detail_cache_key(self):
+        return (
+            f"peering.router.{self.pk}.bgp_neighbors_detail:"
+            f"{self.hostname}:{self.use_netbox}:{self.netbox_device_id}"
+        )
+
+    def invalidate_bgp_neighbors_detail(self):
+        """
+        Removes BGP neighbors detail of the router from the cache, they will be
+        retrieved from the router on the next lookup.
+        """
+        self._bgp_neighbors_detail = None
+        if not settings.CACHEOPS_ENABLED:
+            return
+        try:
+            cache.delete(self._get_bgp_neighbors_detail_cache_key())
+        except RedisError:
+            pass
+
+    def _get_cached_bgp_neighbors_detail_index(self):
+        """
+        Returns BGP neighbors detail of the router along with an index of
+        neighbors by remote address if they are cached, `None` otherwise.
+        """
+        timeout = settings.CACHE_BGP_DETAIL_TIMEOUT
+        if not timeout:
+            return None
+
+        memo = getattr(self, "_bgp_neighbors_detail", None)
+        if memo and memo[0] > time.time():
+            return memo[1], memo[2]
+        if not settings.CACHEOPS_ENABLED:
+            return None
+
+        try:
+            bgp_neighbors_detail = cache.get(self._get_bgp_neighbors_detail_cache_key())
+        except (CacheMiss, RedisError):
+            return None
+        return self._index_bgp_neighbors_detail(bgp_neighbors_detail)
+
+    def _index_bgp_neighbors_detail(self, bgp_neighbors_detail):
+        index = {}
+        for neighbor in self.bgp_neighbors_detail_as_list(bgp_neighbors_detail):
+            try:
+                remote_address = ipaddress.ip_address(neighbor["remote_address"])
+            except (KeyError, ValueError):
+                continue
+            index.setdefault(remote_address, neighbor)
+
+        timeout = settings.CACHE_BGP_DETAIL_TIMEOUT
+        if timeout:
+            self._bgp_neighbors_detail = (
+                time.time() + timeout,
+                bgp_neighbors_detail,
+                index,
+            )
+        return bgp_neighbors_detail, index
+
+    def cache_bgp_neighbors_detail(self, bgp_neighbors_detail):
+        """
+        Caches BGP neighbors detail retrieved from the router and returns them.
+        """
+        return self._cache_bgp_neighbors_detail_index(bgp_neighbors_detail)[0]
+
+    def _cache_bgp_neighbors_detail_index(self, bgp_neighbors_detail):
+        # Force evaluation of lambda (NAPALM uses them in its IOS driver)
+        bgp_neighbors_detail = dict(bgp_neighbors_detail or {})
+        timeout = settings.CACHE_BGP_DETAIL_TIMEOUT
+        if timeout and settings.CACHEOPS_ENABLED:
+            try:
+                cache.set(
+                    self._get_bgp_neighbors_detail_cache_key(),
+                    bgp_neighbors_detail,
+                    timeout,
+                )
+            except RedisError:
+                pass
+        return self._index_bgp_neighbors_detail(bgp_neighbors_detail)
+
+    def _get_bgp_neighbors_detail_index(self, use_cache=False):
+        """
+        Returns all BGP neighbors detail of the router along with an index of
+        neighbors by remote address.
+
+        The router is always queried unless `use_cache` is set. Both are then kept
+        for `CACHE_BGP_DETAIL_TIMEOUT` seconds, in the cache for other processes
+        and on the instance itself, so that lookups using the cache do not query
+        the router again during that time.
+        """
+        if use_cache:
+            cached = self._get_cached_bgp_neighbors_detail_index()
+            if cached:
+                return cached
+
+        if self.use_netbox:
+            r = self.get_netbox_bgp_neighbors_detail()
+        else:
+            r = self.get_napalm_bgp_neighbors_detail()
+        return self._cache_bgp_neighbors_detail_index(r)
+
+    def get_bgp_neighbors_detail(self, ip_address=None, use_cache=False):
         """
         Returns a list of dictionaries listing all BGP neighbors found on the router
         using either NAPALM or NetBox depending on the use_netbox flag and their
         respective detail.
 
         If the `ip_address` named parameter is not `None`, only the neighbor with this
-        IP address will be returned
+        IP address will be returned, `None` if it is not found. It is looked up in
+        the detail of all neighbors.
+
+        If `use_cache` is set, the detail of all neighbors is taken from the cache
+        when possible, so that many lookups query the router once. Otherwise the
+        router is queried and the cache refreshed.
 
         If an error occurs or no BGP neighbors can be found, the returned list
         will be empty.
         """
+        bgp_neighbors_detail, index = self._get_bgp_neighbors_detail_index(
+            use_cache=use_cache
+        )
+        if not ip_address:
+            return bgp_neighbors_detail
 
-        @cached_as(self, timeout=settings.CACHE_BGP_DETAIL_TIMEOUT)
-        def _get_bgp_neighbors_detail():
-            if self.use_netbox:
-                r = self.get_netbox_bgp_neighbors_detail(ip_address=ip_address)
-            else:
-                r = self.get_napalm_bgp_neighbors_detail(ip_address=ip_address)
-            # Force evaluation of lambda (NAPALM uses them in its IOS driver)
-            return dict(r)
-
-        return _get_bgp_neighbors_detail()
+        return index.get(ipaddress.ip_interface(str(ip_address)).ip)
 
     def bgp_neighbors_detail_as_list(self, bgp_neighbors_detail):
         """
@@ -1568,7 +1964,9 @@ class Router(ChangeLoggedMixin, ConfigContextMixin, ExportTemplatesMixin, TagsMi
             return False
 
         # Get BGP session detail
-        bgp_neighbor_detail = self.get_bgp_neighbors_detail(ip_address=ip_address)
+        bgp_neighbor_detail = self.get_bgp_neighbors_detail(
+            ip_address=ip_address, use_cache=True
+        )
         if bgp_neighbor_detail:
             received = bgp_neighbor_detail["received_prefix_count"]
             advertised = bgp_neighbor_detail["advertised_prefix_count"]
@@ -1582,11 +1980,19 @@ class Router(ChangeLoggedMixin, ConfigContextMixin, ExportTemplatesMixin, TagsMi
         return {}
 
     @transaction.atomic
-    def poll_bgp_sessions(self):
+    def poll_bgp_sessions(self, bgp_neighbors_detail=None, use_cache=False):
         """
         Polls the state of all BGP sessions on this router and update the
         corresponding IXP or direct sessions found in records.
+
+        BGP neighbors detail already retrieved from the router can be given with
+        `bgp_neighbors_detail` to only update the records. Otherwise they are
+        retrieved from the router, or from the cache if `use_cache` is set. The number of sessions
+        whose BGP state changed is kept in `bgp_state_changes`. State and prefix
+        count changes are appended to the state history of the sessions.
         """
+        self.bgp_state_changes = 0
+
         if not self.is_usable_for_task():
             self.logger.debug(
                 f"cannot poll bgp sessions state for {self.hostname}, disabled or platform unusable"
@@ -1598,34 +2004,54 @@ class Router(ChangeLoggedMixin, ConfigContextMixin, ExportTemplatesMixin, TagsMi
             )
             return False
 
-        directs = self.get_direct_peering_sessions()
-        ixps = self.get_ixp_peering_sessions()
+        # Index sessions by host IP once, NAPALM ignores prefix length
+        # Direct sessions take precedence over IXP ones sharing the same IP
+        fields = [
+            "bgp_state",
+            "received_prefix_count",
+            "advertised_prefix_count",
+            "last_established_state",
+        ]
+        indexes = []
+        for sessions in (
+            self.get_direct_peering_sessions(),
+            self.get_ixp_peering_sessions(),
+        ):
+            index = {}
+            for session in sessions.only("pk", "ip_address", *fields):
+                index.setdefault(session.ip_address.ip, []).append(session)
+            indexes.append(index)
 
-        if not directs and not ixps:
+        if not any(indexes):
             self.logger.debug(f"no bgp sessions attached to {self.hostname}")
             return False
 
         # Get BGP neighbors details from router, but only get them once
-        bgp_neighbors_detail = self.bgp_neighbors_detail_as_list(
-            self.get_bgp_neighbors_detail()
-        )
+        if bgp_neighbors_detail is None:
+            bgp_neighbors_detail = self.get_bgp_neighbors_detail(use_cache=use_cache)
+        bgp_neighbors_detail = self.bgp_neighbors_detail_as_list(bgp_neighbors_detail)
         if not bgp_neighbors_detail:
             self.logger.debug(f"no bgp sessions found on {self.hostname}")
             return False
 
+        now = timezone.now()
+        changed = {}
+        records = []
         for neighbor_detail in bgp_neighbors_detail:
             ip_address = neighbor_detail["remote_address"]
             self.logger.debug(f"looking for session {ip_address} in {self.hostname}")
 
             # Check if the session is in our database, skip it if not
-            # NAPALM ignores prefix length, so __host is used to lookup the actual IP
-            match = directs.filter(ip_address__host=ip_address) or ixps.filter(
-                ip_address__host=ip_address
-            )
+            try:
+                host = ipaddress.ip_address(ip_address)
+            except ValueError:
+                self.logger.debug(f"invalid session address {ip_address}, ignoring")
+                continue
+            match = next((i[host] for i in indexes if host in i), None)
             if not match:
                 self.logger.debug(f"session {ip_address} not found for {self.hostname}")
                 continue
-            if match.count() > 1:
+            if len(match) > 1:
                 self.logger.debug(
                     f"multiple sessions found for {ip_address} and {self.hostname}, ignoring"
                 )
@@ -1639,22 +2065,51 @@ class Router(ChangeLoggedMixin, ConfigContextMixin, ExportTemplatesMixin, TagsMi
                 f"found session {ip_address} on {self.hostname} in {state} state"
             )
 
-            # Update fields
-            session = match.first()
-            session.bgp_state = state
-            session.received_prefix_count = 0 if received < 0 else received
-            session.advertised_prefix_count = 0 if advertised < 0 else advertised
-            # Update the BGP state of the session
-            if session.bgp_state == BGPState.ESTABLISHED:
-                session.last_established_state = timezone.now()
-            session.save()
+            # Compute changes, the BGP state update time changes when established
+            session = match[0]
+            values = {
+                "bgp_state": state,
+                "received_prefix_count": 0 if received < 0 else received,
+                "advertised_prefix_count": 0 if advertised < 0 else advertised,
+            }
+            if state == BGPState.ESTABLISHED:
+                values["last_established_state"] = now
+            previous_state = session.bgp_state
+            updated = []
+            for field, value in values.items():
+                if getattr(session, field) != value:
+                    setattr(session, field, value)
+                    updated.append(field)
+            if updated:
+                changed.setdefault((type(session), tuple(updated)), []).append(session)
+            if "bgp_state" in updated:
+                self.bgp_state_changes += 1
+            if {"bgp_state", "received_prefix_count", "advertised_prefix_count"} & set(
+                updated
+            ):
+                records.append(
+                    BGPSessionStateRecord.from_session(
+                        session, previous_state=previous_state, time=now
+                    )
+                )
+            self.logger.debug(
+                f"session {ip_address} on {self.hostname} polled as {state}"
+            )
+
+        # Only write the fields that changed, grouping sessions changing the same
+        for (model, updated), sessions in changed.items():
+            model.objects.bulk_update(sessions, updated)
+            invalidate_model(model)
             self.logger.debug(
-                f"session {ip_address} on {self.hostname} saved as {state}"
+                f"saved {len(sessions)} {model._meta.verbose_name_plural} on {self.hostname}"
             )
 
+        # Keep track of state and prefix count changes
+        BGPSessionStateRecord.objects.bulk_create(records)
+
         # Save last session states update
-        self.poll_bgp_sessions_last_updated = timezone.now()
-        self.save()
+        self.poll_bgp_sessions_last_updated = now
+        self.save(update_fields=["poll_bgp_sessions_last_updated"])
 
         return True
 
@@ -0,0 +1,163 @@
+import atexit
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+
+logger = logging.getLogger("peering.manager.napalm")
+
+
+class NapalmDevicePool(object):
+    """
+    Keeps opened NAPALM devices of a process to reuse them between operations on
+    the same router.
+
+    A device is borrowed by a single caller at a time and given back to the pool
+    once the operation is done. Idle devices are closed after
+    `NAPALM_POOL_IDLE_TIMEOUT` seconds and the least recently used ones are closed
+    when more than `NAPALM_POOL_SIZE` devices are kept. Devices are checked with
+    `is_alive()` before being reused.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.idle = {}
+        # Sockets must not be shared between processes, forget devices inherited
+        # from the parent process
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._forget)
+
+    def _forget(self):
+        self.lock = threading.Lock()
+        self.idle = {}
+
+    def _key(self, router):
+        return (
+            router.pk,
+            router.hostname,
+            router.platform.napalm_driver if router.platform else None,
+            router.napalm_username or settings.NAPALM_USERNAME,
+            router.napalm_password or settings.NAPALM_PASSWORD,
+            router.napalm_timeout or settings.NAPALM_TIMEOUT,
+            json.dumps(router.get_napalm_args(), sort_keys=True, default=str),
+        )
+
+    def _close(self, router, device):
+        router.close_napalm_device(device)
+
+    def _is_alive(self, device):
+        try:
+            return bool(device.is_alive().get("is_alive"))
+        except Exception:
+            return False
+
+    def _expire(self, now):
+        """
+        Removes idle devices which have not been used for too long, or above the
+        maximum size, and returns them to be closed.
+        """
+        timeout = settings.NAPALM_POOL_IDLE_TIMEOUT
+        entries = sorted(
+            (
+                (entry[2], key, entry)
+                for key, devices in self.idle.items()
+                for entry in devices
+            ),
+            key=lambda e: e[0],
+        )
+        # Least recently used devices go first
+        extra = max(len(entries) - settings.NAPALM_POOL_SIZE, 0)
+
+        expired = []
+        for i, (last_used, key, entry) in enumerate(entries):
+            if i >= extra and not (timeout and now - last_used > timeout):
+                continue
+            self.idle[key].remove(entry)
+            if not self.idle[key]:
+                del self.idle[key]
+            expired.append(entry)
+
+        return expired
+
+    def _acquire(self, router, key):
+        with self.lock:
+            expired = self._expire(time.monotonic())
+            devices = self.idle.get(key, [])
+            entry = devices.pop() if devices else None
+            if not devices:
+                self.idle.pop(key, None)
+
+        for r, device, _ in expired:
+            logger.debug(f"closing idle connection with {r.hostname}")
+            self._close(r, device)
+
+        if entry:
+            if self._is_alive(entry[1]):
+                logger.debug(f"reusing connection with {router.hostname}")
+                return entry[1]
+            logger.debug(f"dropping dead connection with {router.hostname}")
+            self._close(router, entry[1])
+
+        device = router.get_napalm_device()
+        return device if router.open_napalm_device(device) else None
+
+    def _release(self, router, key, device):
+        with self.lock:
+            self.idle.setdefault(key, []).append((router, device, time.monotonic()))
+            expired = self._expire(time.monotonic())
+
+        for r, d, _ in expired:
+            logger.debug(f"closing idle connection with {r.hostname}")
+            self._close(r, d)
+
+    @contextmanager
+    def borrow(self, router):
+        """
+        Yields an opened NAPALM device for the given router, `None` if it cannot
+        be opened. The device must not be closed by the caller.
+
+        If the pool is disabled, a new device is opened and closed each time.
+        """
+        if settings.NAPALM_POOL_SIZE < 1:
+            device = router.get_napalm_device()
+            opened = router.open_napalm_device(device)
+            try:
+                yield device if opened else None
+            finally:
+                if opened:
+                    self._close(router, device)
+            return
+
+        key = self._key(router)
+        device = self._acquire(router, key)
+        if not device:
+            yield None
+            return
+
+        try:
+            yield device
+        except BaseException:
+            # The state of the connection is unknown, do not reuse it
+            self._close(router, device)
+            raise
+        else:
+            self._release(router, key, device)
+
+    def clear(self):
+        """
+        Closes all idle devices.
+        """
+        with self.lock:
+            entries = [entry for devices in self.idle.values() for entry in devices]
+            self.idle = {}
+
+        for router, device, _ in entries:
+            self._close(router, device)
+
+
+napalm_pool = NapalmDevicePool()
+atexit.register(napalm_pool.clear)
@@ -0,0 +1,324 @@
+import logging
+import random
+import time
+from datetime import timedelta
+
+from cacheops import invalidate_model
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from extras.models import JobResult
+from netbox.api import NetBox
+from peering.device_io import DeviceIO
+from peering.enums import DeviceStatus
+from peering.metrics import record
+from peering.models import Router
+
+logger = logging.getLogger("peering.manager.peering.polling")
+
+# Number of routers whose BGP sessions are written in a single transaction
+WRITE_BATCH_SIZE = 10
+
+
+def get_polling_interval(router):
+    """
+    Returns the number of seconds between two polls of a router.
+    """
+    return router.poll_bgp_sessions_interval or settings.BGP_POLLING_INTERVAL
+
+
+def schedule_next_poll(router, success, changed=False, now=None):
+    """
+    Sets the time of the next poll of a router given the result of the last one,
+    without saving the router.
+
+    Routers are polled every `get_polling_interval()` seconds, twice as often
+    while their sessions change and exponentially less often after failures up to
+    `BGP_POLLING_MAX_BACKOFF` seconds. A random jitter of `BGP_POLLING_JITTER`
+    times the delay is applied to spread polls over time.
+    """
+    interval = get_polling_interval(router)
+
+    if success:
+        router.poll_bgp_sessions_failures = 0
+    else:
+        router.poll_bgp_sessions_failures = min(
+            router.poll_bgp_sessions_failures + 1, 32767
+        )
+
+    if router.poll_bgp_sessions_failures:
+        delay = min(
+            interval * 2 ** min(router.poll_bgp_sessions_failures, 16),
+            max(settings.BGP_POLLING_MAX_BACKOFF, interval),
+        )
+    elif changed:
+        delay = interval / 2
+    else:
+        delay = interval
+    delay *= 1 + random.uniform(-1, 1) * settings.BGP_POLLING_JITTER
+
+    router.poll_bgp_sessions_next = (now or timezone.now()) + timedelta(seconds=delay)
+
+
+class BGPSessionsPoller(object):
+    """
+    Polls the state of BGP sessions of many routers concurrently.
+
+    Routers are queried through `DeviceIO`, up to `concurrency` at the same time
+    and up to the limit given for their platform in `platform_concurrency`. A
+    router that does not answer within `timeout` seconds is considered as failed.
+    Routers using NetBox are queried with batches of NAPALM calls proxied by
+    NetBox instead, limited by the `NETBOX_API_*` settings.
+    Retrieved data is written to the database by the calling thread, in batches
+    of `WRITE_BATCH_SIZE` routers.
+    """
+
+    def __init__(self, concurrency=None, timeout=None, platform_concurrency=None):
+        self.device_io = DeviceIO(
+            concurrency=concurrency,
+            timeout=timeout,
+            platform_concurrency=platform_concurrency,
+        )
+
+    def _can_poll(self, router):
+        """
+        Returns a reason for which a router cannot be polled, `None` if it can be.
+        """
+        if not router.is_usable_for_task():
+            return "Router is disabled or its platform is unusable."
+        if not router.poll_bgp_sessions_state:
+            return "BGP sessions state polling is disabled."
+        if (
+            not router.get_direct_peering_sessions().exists()
+            and not router.get_ixp_peering_sessions().exists()
+        ):
+            return "No BGP sessions attached to the router."
+        return None
+
+    def _fetch(self, routers):
+        """
+        Yields tuples made of each router, its BGP neighbors detail, the raised
+        exception (`None` on success) and the duration of the retrieval as soon as
+        they are known.
+
+        Routers using NetBox are queried with a batch of NAPALM calls proxied by
+        NetBox, the others through `DeviceIO`, both at the same time. The cache of
+        BGP neighbors detail is never used but refreshed with the results.
+        """
+        netbox_routers, others = {}, []
+        for router in routers:
+            if router.use_netbox:
+                netbox_routers.setdefault(router.netbox_device_id, []).append(router)
+            else:
+                others.append(router)
+
+        netbox_results = (
+            NetBox().napalm_batch(netbox_routers, "get_bgp_neighbors_detail")
+            if netbox_routers
+            else []
+        )
+
+        yield from self.device_io.map(
+            lambda router: router.get_bgp_neighbors_detail(), others
+        )
+        for device_id, bgp_neighbors_detail, error, duration in netbox_results:
+            for router in netbox_routers[device_id]:
+                record(
+                    router,
+                    "get_bgp_neighbors_detail",
+                    not error,
+                    duration,
+                    transport="netbox",
+                )
+                if not error:
+                    bgp_neighbors_detail = router.cache_bgp_neighbors_detail(
+                        bgp_neighbors_detail
+                    )
+                yield router, bgp_neighbors_detail, error, duration
+
+    def _write(self, batch, results, callback):
+        with transaction.atomic():
+            for router, bgp_neighbors_detail, duration in batch:
+                try:
+                    if router.poll_bgp_sessions(
+                        bgp_neighbors_detail=bgp_neighbors_detail
+                    ):
+                        result = (True, "Successfully polled BGP sessions state.")
+                    else:
+                        result = (False, "No BGP sessions state found.")
+                except Exception as e:
+                    logger.exception(f"cannot save bgp sessions of {router.hostname}")
+                    result = (False, f"Error while saving BGP sessions state: {e}")
+                self._record(
+                    results,
+                    router,
+                    *result,
+                    duration,
+                    callback,
+                    changes=getattr(router, "bgp_state_changes", 0),
+                )
+        batch.clear()
+
+    def _record(self, results, router, success, message, duration, callback, changes=0):
+        results[router] = {
+            "success": success,
+            "message": message,
+            "duration": duration,
+            "changes": changes,
+        }
+        if callback:
+            callback(router, results[router])
+
+    def poll(self, routers, callback=None):
+        """
+        Polls BGP sessions state of all given routers.
+
+        A dictionary mapping each router to its result is returned, a result is a
+        dictionary with `success`, `message`, `duration` (in seconds) and
+        `changes` (the number of sessions whose BGP state changed) keys. If a
+        `callback` is given, it is called with each router and its result as soon
+        as it is known.
+
+        The next poll of each router is scheduled according to its result.
+        """
+        results = {}
+        pending = []
+        for router in routers:
+            reason = self._can_poll(router)
+            if reason:
+                self._record(results, router, False, reason, 0, callback)
+            else:
+                pending.append(router)
+
+        batch = []
+        for router, bgp_neighbors_detail, error, duration in self._fetch(pending):
+            if error:
+                message = (
+                    str(error)
+                    if isinstance(error, TimeoutError)
+                    else f"Error while polling BGP sessions state: {error}"
+                )
+                self._record(results, router, False, message, duration, callback)
+                continue
+
+            batch.append((router, bgp_neighbors_detail, duration))
+            if len(batch) >= WRITE_BATCH_SIZE:
+                self._write(batch, results, callback)
+
+        if batch:
+            self._write(batch, results, callback)
+
+        now = timezone.now()
+        scheduled = []
+        for router, result in results.items():
+            if router.pk and router.poll_bgp_sessions_state:
+                schedule_next_poll(
+                    router, result["success"], changed=result["changes"] > 0, now=now
+                )
+                scheduled.append(router)
+        Router.objects.bulk_update(
+            scheduled, ["poll_bgp_sessions_next", "poll_bgp_sessions_failures"]
+        )
+        if scheduled:
+            invalidate_model(Router)
+
+        return results
+
+
+class BGPPollingScheduler(object):
+    """
+    Polls BGP sessions of routers when they are due, according to the next poll
+    time of each router.
+
+    Due routers are polled with a `BGPSessionsPoller`, by the scheduler itself or
+    by a background task if `as_task` is set. Routers with the shortest polling
+    interval are polled first.
+    """
+
+    def __init__(self, as_task=False, poller=None):
+        self.as_task = as_task
+        self.poller = poller or BGPSessionsPoller()
+
+    def get_routers(self):
+        # Next poll times are written with bulk queries, never read them from cache
+        return (
+            Router.objects.nocache()
+            .filter(poll_bgp_sessions_state=True)
+            .exclude(status=DeviceStatus.DISABLED)
+            .select_related("platform")
+        )
+
+    def run_pending(self, now=None, callback=None):
+        """
+        Polls routers which are due and returns them.
+
+        Routers which have never been scheduled are not polled right away, their
+        first poll is spread over their polling interval instead.
+        """
+        now = now or timezone.now()
+        unscheduled, due = [], []
+        for router in self.get_routers():
+            if not router.poll_bgp_sessions_next:
+                router.poll_bgp_sessions_next = now + timedelta(
+                    seconds=random.uniform(0, get_polling_interval(router))
+                )
+                unscheduled.append(router)
+            elif router.poll_bgp_sessions_next <= now:
+                due.append(router)
+        if unscheduled:
+            Router.objects.bulk_update(unscheduled, ["poll_bgp_sessions_next"])
+            invalidate_model(Router)
+
+        if not due:
+            return due
+
+        due.sort(key=lambda r: (get_polling_interval(r), r.poll_bgp_sessions_next))
+        logger.debug(f"{len(due)} routers due for bgp sessions polling")
+
+        if self.as_task:
+            # Do not enqueue the routers again until the task reschedules them
+            for router in due:
+                router.poll_bgp_sessions_next = now + timedelta(
+                    seconds=get_polling_interval(router)
+                )
+            Router.objects.bulk_update(due, ["poll_bgp_sessions_next"])
+            invalidate_model(Router)
+
+            from peering.jobs import poll_bgp_sessions_fleet
+
+            JobResult.enqueue_job(
+                poll_bgp_sessions_fleet,
+                "peering.router.poll_bgp_sessions",
+                Router,
+                None,
+                due,
+            )
+        else:
+            self.poller.poll(due, callback=callback)
+
+        return due
+
+    def get_sleep_time(self, maximum=60):
+        """
+        Returns the number of seconds until the next router is due, at most
+        `maximum`.
+        """
+        next_poll = (
+            self.get_routers()
+            .filter(poll_bgp_sessions_next__isnull=False)
+            .order_by("poll_bgp_sessions_next")
+            .values_list("poll_bgp_sessions_next", flat=True)
+            .first()
+        )
+        if not next_poll:
+            return maximum
+        return min(max((next_poll - timezone.now()).total_seconds(), 0), maximum)
+
+    def run(self, callback=None):
+        """
+        Polls routers as they are due, forever.
+        """
+        while True:
+            self.run_pending(callback=callback)
+            time.sleep(max(self.get_sleep_time(), 1))
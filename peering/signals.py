@@ -18,3 +18,6 @@ def alter_internet_exchange_peering_session(instance, **kwargs):
 def alter_router(instance, **kwargs):
     if not instance.poll_bgp_sessions_state and instance.poll_bgp_sessions_last_updated:
         instance.poll_bgp_sessions_last_updated = None
+    if not instance.poll_bgp_sessions_state:
+        instance.poll_bgp_sessions_next = None
+        instance.poll_bgp_sessions_failures = 0
@@ -1,4 +1,5 @@
 import django_tables2 as tables
+from django.conf import settings
 from django.utils.safestring import mark_safe
 
 from net.models import Connection
@@ -14,6 +15,7 @@ from utils.tables import (
 from .models import (
     AutonomousSystem,
     BGPGroup,
+    BGPSessionStateRecord,
     Community,
     DirectPeeringSession,
     InternetExchange,
@@ -137,6 +139,25 @@ class BGPGroupTable(BaseTable):
         )
 
 
+class BGPSessionStateRecordTable(BaseTable):
+    time = tables.DateTimeColumn(format=settings.SHORT_DATETIME_FORMAT)
+    state = BGPSessionStateColumn(accessor="bgp_state")
+    received_prefix_count = tables.Column(verbose_name="Received")
+    advertised_prefix_count = tables.Column(verbose_name="Advertised")
+    state_changes = tables.Column(verbose_name="State Changes")
+
+    class Meta(BaseTable.Meta):
+        model = BGPSessionStateRecord
+        fields = (
+            "time",
+            "resolution",
+            "state",
+            "received_prefix_count",
+            "advertised_prefix_count",
+            "state_changes",
+        )
+
+
 class CommunityTable(BaseTable):
     pk = SelectColumn()
     name = tables.Column(linkify=True)
@@ -379,6 +400,7 @@ class RouterTable(BaseTable):
             "encrypt_passwords",
             "poll_bgp_sessions_state",
             "poll_bgp_sessions_last_updated",
+            "poll_bgp_sessions_next",
             "configuration_template",
             "connection_count",
             "directpeeringsession_count",
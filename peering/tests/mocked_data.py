@@ -69,3 +69,38 @@ def mocked_subprocess_popen(*args, **kwargs):
         return MockResponse(1, "".encode(), "Exit with error".encode())
 
     return MockResponse(-1, "".encode(), "Something went wrong".encode())
+
+
+class MockedDevice(object):
+    """
+    NAPALM driver which counts connections and returns the given configuration
+    changes.
+    """
+
+    def __init__(self, changes=""):
+        self.opened = 0
+        self.closed = 0
+        self.alive = True
+        self.changes = changes
+        self.commited = False
+
+    def open(self):
+        self.opened += 1
+
+    def close(self):
+        self.closed += 1
+
+    def is_alive(self):
+        return {"is_alive": self.alive}
+
+    def load_merge_candidate(self, config=None):
+        pass
+
+    def compare_config(self):
+        return self.changes
+
+    def commit_config(self):
+        self.commited = True
+
+    def discard_config(self):
+        pass
@@ -1,6 +1,8 @@
+from datetime import timedelta
 from unittest.mock import patch
 
 from django.urls import reverse
+from django.utils import timezone
 from rest_framework import status
 
 from bgp.models import Relationship
@@ -9,6 +11,7 @@ from net.models import Connection
 from peering.constants import *
 from peering.enums import (
     BGPSessionStatus,
+    BGPState,
     CommunityType,
     DeviceStatus,
     RoutingPolicyType,
@@ -16,6 +19,7 @@ from peering.enums import (
 from peering.models import (
     AutonomousSystem,
     BGPGroup,
+    BGPSessionStateRecord,
     Community,
     DirectPeeringSession,
     InternetExchange,
@@ -250,6 +254,37 @@ class DirectPeeringSessionTest(StandardAPITestCases.View):
             },
         ]
 
+    def test_state_history(self):
+        session = DirectPeeringSession.objects.first()
+        now = timezone.now()
+        records = []
+        for i, state in enumerate((BGPState.ACTIVE, BGPState.ESTABLISHED)):
+            session.bgp_state = state
+            records.append(
+                BGPSessionStateRecord.from_session(
+                    session, time=now - timedelta(days=1 - i)
+                )
+            )
+        BGPSessionStateRecord.objects.bulk_create(records)
+
+        url = reverse(
+            "peering-api:directpeeringsession-state-history", kwargs={"pk": session.pk}
+        )
+        response = self.client.get(url, format="json", **self.header)
+        self.assertHttpStatus(response, status.HTTP_200_OK)
+        self.assertEqual(2, response.data["count"])
+
+        response = self.client.get(
+            url,
+            {"time_after": (now - timedelta(hours=1)).isoformat()},
+            format="json",
+            **self.header,
+        )
+        self.assertEqual(1, response.data["count"])
+        self.assertEqual(
+            BGPState.ESTABLISHED, response.data["results"][0]["bgp_state"]["value"]
+        )
+
 
 class InternetExchangeTest(StandardAPITestCases.View):
     model = InternetExchange
@@ -0,0 +1,234 @@
+import threading
+import time
+import uuid
+from unittest.mock import patch
+
+from django.contrib.contenttypes.models import ContentType
+from django.test import TestCase
+
+from devices.models import Configuration, Platform
+from extras.enums import JobResultStatus
+from extras.models import JobResult
+from peering.deployment import ConfigurationDeployer
+from peering.enums import DeviceStatus
+from peering.jobs import deploy_configurations
+from peering.models import AutonomousSystem, Router
+from peering.tests.mocked_data import MockedDevice
+
+
+class ConfigurationDeployerTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        local_as = AutonomousSystem.objects.create(
+            asn=64510, name="Local", affiliated=True
+        )
+        platform = Platform.objects.get(slug="juniper-junos")
+        template = Configuration.objects.create(
+            name="Test", template="hostname {{ router.hostname }}"
+        )
+        cls.routers = [
+            Router.objects.create(
+                local_autonomous_system=local_as,
+                name=f"Router {i}",
+                hostname=f"router{i}.example.com",
+                platform=platform,
+                status=DeviceStatus.ENABLED,
+                configuration_template=template,
+            )
+            for i in range(1, 7)
+        ]
+        cls.disabled = Router.objects.create(
+            local_autonomous_system=local_as,
+            name="Disabled",
+            hostname="disabled.example.com",
+            platform=platform,
+            status=DeviceStatus.DISABLED,
+            configuration_template=template,
+        )
+
+    def get_routers(self):
+        return Router.objects.select_related("platform").order_by("pk")
+
+    def test_get_waves(self):
+        routers = list(range(7))
+        self.assertEqual(
+            [[0], [1, 2, 3], [4, 5, 6]],
+            ConfigurationDeployer(canary=1, wave_size=3).get_waves(routers),
+        )
+        self.assertEqual(
+            [[0, 1], [2, 3, 4, 5, 6]],
+            ConfigurationDeployer(canary=2, wave_size=0).get_waves(routers),
+        )
+        self.assertEqual(
+            [[0, 1, 2, 3], [4, 5, 6]],
+            ConfigurationDeployer(canary=0, wave_size=4).get_waves(routers),
+        )
+        self.assertEqual([], ConfigurationDeployer().get_waves([]))
+
+    def test_deploy(self):
+        running, peak, rendered = 0, 0, []
+        lock = threading.Lock()
+        generate_configuration = Router.generate_configuration
+
+        def render(router):
+            rendered.append(router.pk)
+            return generate_configuration(router)
+
+        def merge_napalm_configuration(router, config, **kwargs):
+            nonlocal running, peak
+            self.assertEqual(f"hostname {router.hostname}", config)
+            with lock:
+                running += 1
+                peak = max(peak, running)
+            time.sleep(0.05)
+            with lock:
+                running -= 1
+            return None, f"+ {router.hostname}"
+
+        with patch.object(
+            Router, "generate_configuration", autospec=True, side_effect=render
+        ), patch.object(
+            Router,
+            "merge_napalm_configuration",
+            autospec=True,
+            side_effect=merge_napalm_configuration,
+        ):
+            results = ConfigurationDeployer(
+                concurrency=2, canary=1, wave_size=3
+            ).deploy(self.get_routers())
+
+        # Each configuration is rendered once, disabled routers are ignored
+        self.assertEqual(sorted(r.pk for r in self.routers), sorted(rendered))
+        self.assertEqual(2, peak)
+        self.assertFalse(results[self.disabled]["success"])
+        self.assertIsNone(results[self.disabled]["wave"])
+        for router in self.routers:
+            self.assertTrue(results[router]["success"])
+            self.assertEqual(f"+ {router.hostname}", results[router]["changes"])
+            router.refresh_from_db()
+            self.assertTrue(
+                router.is_configuration_deployed(f"hostname {router.hostname}")
+            )
+        self.assertEqual([1, 2, 2, 2, 3, 3], [results[r]["wave"] for r in self.routers])
+
+    def test_deploy_stops_on_failure(self):
+        def merge_napalm_configuration(router, config, **kwargs):
+            if router.pk == self.routers[2].pk:
+                return "unable to connect", None
+            return None, ""
+
+        called = []
+        with patch.object(
+            Router,
+            "merge_napalm_configuration",
+            autospec=True,
+            side_effect=lambda router, *args, **kwargs: called.append(router.pk)
+            or merge_napalm_configuration(router, *args, **kwargs),
+        ):
+            results = ConfigurationDeployer(canary=1, wave_size=2).deploy(self.routers)
+
+        # The wave with the failed router is complete, the next ones are skipped
+        self.assertEqual([r.pk for r in self.routers[:3]], sorted(called))
+        self.assertEqual(
+            [True, True, False, False, False, False],
+            [results[r]["success"] for r in self.routers],
+        )
+        self.assertEqual(
+            "Not deployed, a previous wave failed.", results[self.routers[5]]["message"]
+        )
+
+    def test_commit_check(self):
+        router = self.routers[0]
+        for changes, commit_check, commited in (
+            ("", True, False),
+            ("", False, True),
+            ("+ change", True, True),
+        ):
+            device = MockedDevice(changes=changes)
+            with patch.object(
+                Router, "get_napalm_device", return_value=device
+            ), patch.object(Router, "open_napalm_device", return_value=True):
+                error, _ = router.set_napalm_configuration(
+                    "hostname test",
+                    commit=True,
+                    commit_check=commit_check,
+                    force=True,
+                )
+            self.assertIsNone(error)
+            self.assertEqual(commited, device.commited)
+
+    def test_skip_unchanged(self):
+        router = Router.objects.select_related("platform").get(pk=self.routers[0].pk)
+        device = MockedDevice(changes="+ change")
+        with patch.object(
+            Router, "get_napalm_device", return_value=device
+        ) as get_napalm_device, patch.object(
+            Router, "open_napalm_device", return_value=True
+        ):
+            # Only commited configurations are recorded
+            router.set_napalm_configuration("hostname test")
+            self.assertEqual("", router.deployed_configuration_hash)
+            router.set_napalm_configuration("hostname test", commit=True)
+            router.refresh_from_db()
+            self.assertTrue(router.is_configuration_deployed("hostname test"))
+            self.assertFalse(router.is_configuration_deployed("hostname other"))
+            self.assertEqual(2, get_napalm_device.call_count)
+
+            self.assertEqual(
+                (None, None),
+                router.set_napalm_configuration("hostname test", commit=True),
+            )
+            self.assertEqual(2, get_napalm_device.call_count)
+            # Changes are still looked for when not commiting
+            self.assertEqual(
+                (None, "+ change"), router.set_napalm_configuration("hostname test")
+            )
+            self.assertEqual(3, get_napalm_device.call_count)
+            router.set_napalm_configuration("hostname test", commit=True, force=True)
+            self.assertEqual(4, get_napalm_device.call_count)
+
+        Router.objects.filter(pk=router.pk).update(
+            deployed_configuration_hash=Router.get_configuration_hash(
+                f"hostname {router.hostname}"
+            )
+        )
+        for commit, force, calls in (
+            (True, False, 5),
+            (True, True, 6),
+            (False, False, 6),
+        ):
+            with patch.object(
+                Router, "merge_napalm_configuration", return_value=(None, "")
+            ) as merge_napalm_configuration:
+                results = ConfigurationDeployer(commit=commit, force=force).deploy(
+                    self.get_routers()
+                )
+            self.assertEqual(calls, merge_napalm_configuration.call_count)
+            self.assertTrue(results[router]["success"])
+        router.refresh_from_db()
+        self.assertEqual(
+            "Configuration unchanged since last deployment.",
+            ConfigurationDeployer().deploy([router])[router]["message"],
+        )
+
+    def test_deploy_configurations(self):
+        job_result = JobResult.objects.create(
+            name="test",
+            obj_type=ContentType.objects.get_for_model(Router),
+            user=None,
+            job_id=uuid.uuid4(),
+        )
+
+        with patch.object(
+            Router, "merge_napalm_configuration", return_value=(None, "+ change")
+        ) as merge_napalm_configuration:
+            self.assertFalse(
+                deploy_configurations(list(self.get_routers()), False, job_result)
+            )
+
+        self.assertEqual(6, merge_napalm_configuration.call_count)
+        self.assertFalse(merge_napalm_configuration.call_args.kwargs["commit"])
+        self.assertEqual(JobResultStatus.FAILED, job_result.status)
+        self.assertEqual(6, job_result.data["main"]["success"])
+        self.assertEqual(2, job_result.data["main"]["failure"])
+        self.assertEqual(7, len(job_result.data["output"]["log"]))
@@ -0,0 +1,87 @@
+import threading
+import time
+
+from django.test import TestCase
+
+from devices.models import Platform
+from peering.device_io import DeviceIO
+from peering.enums import DeviceStatus
+from peering.models import AutonomousSystem, Router
+
+
+class DeviceIOTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        local_as = AutonomousSystem.objects.create(
+            asn=64500, name="Local", affiliated=True
+        )
+        junos = Platform.objects.get(slug="juniper-junos")
+        iosxr = Platform.objects.get(slug="cisco-iosxr")
+        for i in range(1, 11):
+            Router.objects.create(
+                local_autonomous_system=local_as,
+                name=f"Router {i}",
+                hostname=f"router{i}.example.com",
+                platform=junos if i % 2 else iosxr,
+                status=DeviceStatus.ENABLED,
+            )
+
+    def get_routers(self):
+        return Router.objects.select_related("platform").order_by("pk")
+
+    def test_map(self):
+        running = {"*": 0, "juniper-junos": 0}
+        peak = dict(running)
+        lock = threading.Lock()
+
+        def call(router):
+            keys = ["*", router.platform.slug]
+            with lock:
+                for key in keys:
+                    if key in running:
+                        running[key] += 1
+                        peak[key] = max(peak[key], running[key])
+            time.sleep(0.02)
+            with lock:
+                for key in keys:
+                    if key in running:
+                        running[key] -= 1
+            if router.hostname == "router10.example.com":
+                raise ValueError("unreachable")
+            return router.hostname
+
+        results = list(
+            DeviceIO(concurrency=4, platform_concurrency={"juniper-junos": 1}).map(
+                call, self.get_routers()
+            )
+        )
+
+        self.assertEqual(10, len(results))
+        self.assertEqual(4, peak["*"])
+        self.assertEqual(1, peak["juniper-junos"])
+        for router, result, error, duration in results:
+            if router.hostname == "router10.example.com":
+                self.assertIsNone(result)
+                self.assertIsInstance(error, ValueError)
+            else:
+                self.assertEqual(router.hostname, result)
+                self.assertIsNone(error)
+            self.assertGreater(duration, 0)
+
+    def test_map_timeout(self):
+        def call(router):
+            if router.hostname == "router1.example.com":
+                time.sleep(0.5)
+            return router.hostname
+
+        results = {
+            router.hostname: error
+            for router, _, error, _ in DeviceIO(concurrency=2, timeout=0.1).map(
+                call, self.get_routers()
+            )
+        }
+        self.assertIsInstance(results.pop("router1.example.com"), TimeoutError)
+        self.assertEqual([None] * 9, list(results.values()))
+
+    def test_map_empty(self):
+        self.assertEqual([], list(DeviceIO().map(lambda router: None, [])))
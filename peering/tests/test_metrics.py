@@ -0,0 +1,158 @@
+import uuid
+from unittest.mock import patch
+
+from django.contrib.contenttypes.models import ContentType
+from django.test import TestCase
+from prometheus_client import REGISTRY
+
+from devices.models import Platform
+from extras.models import JobResult
+from peering.enums import DeviceStatus
+from peering.metrics import DeviceOperationsSummary, collect, measure, record
+from peering.models import AutonomousSystem, Router
+
+
+class DeviceMetricsTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        local_as = AutonomousSystem.objects.create(
+            asn=64500, name="Local", affiliated=True
+        )
+        platform = Platform.objects.get(slug="juniper-junos")
+        cls.routers = [
+            Router.objects.create(
+                local_autonomous_system=local_as,
+                name=f"Router {i}",
+                hostname=f"router{i}.example.com",
+                platform=platform,
+                status=DeviceStatus.ENABLED,
+            )
+            for i in range(1, 3)
+        ]
+
+    def get_sample(self, router, operation, outcome):
+        return REGISTRY.get_sample_value(
+            "peering_device_operation_seconds_count",
+            {
+                "operation": operation,
+                "transport": "napalm",
+                "platform": "juniper-junos",
+                "router": router.hostname,
+                "outcome": outcome,
+            },
+        )
+
+    def test_measure(self):
+        router = self.routers[0]
+        before = self.get_sample(router, "commit_config", "failure") or 0
+
+        with self.assertRaises(ValueError):
+            with measure(router, "commit_config"):
+                raise ValueError()
+        with measure(router, "commit_config") as measurement:
+            measurement.success = False
+
+        self.assertEqual(
+            before + 2, self.get_sample(router, "commit_config", "failure")
+        )
+
+    def test_summary(self):
+        summary = DeviceOperationsSummary()
+        self.assertFalse(summary)
+        summary.add("open", "napalm", "junos", "r1", True, 1)
+        summary.add("open", "napalm", "junos", "r2", False, 3)
+        summary.add("open", "napalm", "eos", "r3", True, 0.5)
+        summary.add("compare_config", "napalm", "junos", "r1", True, 4)
+
+        self.assertDictEqual(
+            {
+                "operations": [
+                    {
+                        "operation": "open",
+                        "transport": "napalm",
+                        "platform": "junos",
+                        "count": 2,
+                        "failures": 1,
+                        "total_seconds": 4,
+                        "average_seconds": 2,
+                        "max_seconds": 3,
+                    },
+                    {
+                        "operation": "compare_config",
+                        "transport": "napalm",
+                        "platform": "junos",
+                        "count": 1,
+                        "failures": 0,
+                        "total_seconds": 4,
+                        "average_seconds": 4,
+                        "max_seconds": 4,
+                    },
+                    {
+                        "operation": "open",
+                        "transport": "napalm",
+                        "platform": "eos",
+                        "count": 1,
+                        "failures": 0,
+                        "total_seconds": 0.5,
+                        "average_seconds": 0.5,
+                        "max_seconds": 0.5,
+                    },
+                ],
+                "routers": [
+                    {
+                        "router": "r1",
+                        "platform": "junos",
+                        "count": 2,
+                        "failures": 0,
+                        "total_seconds": 5,
+                        "average_seconds": 2.5,
+                        "max_seconds": 4,
+                    }
+                ],
+            },
+            summary.as_dict(slowest=1),
+        )
+
+    def test_collect(self):
+        record(self.routers[0], "open", True, 1)
+        with collect() as summary:
+            with patch(
+                "peering.models.models.NetBox.napalm",
+                return_value={"global": {"peers": {}}},
+            ):
+                self.routers[1].get_netbox_bgp_neighbors()
+            record(self.routers[0], "open", False, 2)
+        record(self.routers[0], "open", True, 1)
+
+        summary = summary.as_dict()
+        self.assertEqual(
+            [("open", 1, 1), ("get_bgp_neighbors", 1, 0)],
+            [
+                (o["operation"], o["count"], o["failures"])
+                for o in summary["operations"]
+            ],
+        )
+        self.assertEqual("netbox", summary["operations"][1]["transport"])
+        self.assertEqual(
+            ["router1.example.com", "router2.example.com"],
+            [r["router"] for r in summary["routers"]],
+        )
+
+    def test_collect_job_result(self):
+        job_result = JobResult.objects.create(
+            name="test",
+            obj_type=ContentType.objects.get_for_model(Router),
+            user=None,
+            job_id=uuid.uuid4(),
+        )
+
+        with collect(job_result=job_result):
+            pass
+        self.assertIsNone(job_result.data)
+
+        with collect(job_result=job_result):
+            record(self.routers[0], "compare_config", True, 1)
+        job_result.refresh_from_db()
+        self.assertEqual(
+            1, job_result.data["device_operations"]["operations"][0]["count"]
+        )
@@ -1,13 +1,16 @@
 import ipaddress
+from datetime import datetime, timedelta, timezone
 from unittest.mock import patch
 
-from django.test import TestCase
+from django.test import TestCase, override_settings
 
 from bgp.models import Relationship
 from devices.models import PasswordAlgorithm, Platform
 from net.models import Connection
 from peering.enums import (
+    BGPSessionStateResolution,
     BGPSessionStatus,
+    BGPState,
     CommunityType,
     DeviceStatus,
     RoutingPolicyType,
@@ -15,6 +18,7 @@ from peering.enums import (
 from peering.models import (
     AutonomousSystem,
     BGPGroup,
+    BGPSessionStateRecord,
     Community,
     DirectPeeringSession,
     InternetExchange,
@@ -23,6 +27,7 @@ from peering.models import (
     RoutingPolicy,
 )
 from peering.tests.mocked_data import load_peeringdb_data, mocked_subprocess_popen
+from peeringdb.models import IXLanPrefix
 from utils.testing import load_json
 
 
@@ -114,6 +119,117 @@ class AutonomousSystemTest(TestCase):
         )
 
 
+class BGPSessionStateRecordTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        local_as = AutonomousSystem.objects.create(
+            asn=64500, name="Local Test", affiliated=True
+        )
+        relationship = Relationship.objects.create(name="Test", slug="test")
+        cls.sessions = [
+            DirectPeeringSession.objects.create(
+                local_autonomous_system=local_as,
+                autonomous_system=local_as,
+                relationship=relationship,
+                ip_address=f"2001:db8::{i}",
+            )
+            for i in range(1, 3)
+        ]
+
+    def record(self, session, time, state, previous_state, received=0):
+        session.bgp_state = state
+        session.received_prefix_count = received
+        return BGPSessionStateRecord.from_session(
+            session, previous_state=previous_state, time=time
+        )
+
+    @override_settings(TIME_ZONE="UTC")
+    def test_downsample(self):
+        start = datetime(2022, 1, 1, tzinfo=timezone.utc)
+        BGPSessionStateRecord.objects.bulk_create(
+            [
+                self.record(self.sessions[0], start, BGPState.ACTIVE, None),
+                self.record(
+                    self.sessions[0],
+                    start + timedelta(minutes=10),
+                    BGPState.ESTABLISHED,
+                    BGPState.ACTIVE,
+                    received=10,
+                ),
+                self.record(
+                    self.sessions[0],
+                    start + timedelta(minutes=20),
+                    BGPState.IDLE,
+                    BGPState.ESTABLISHED,
+                ),
+                self.record(
+                    self.sessions[0],
+                    start + timedelta(minutes=30),
+                    BGPState.ESTABLISHED,
+                    BGPState.IDLE,
+                    received=20,
+                ),
+                self.record(
+                    self.sessions[1],
+                    start + timedelta(minutes=10),
+                    BGPState.ESTABLISHED,
+                    None,
+                    received=5,
+                ),
+                self.record(
+                    self.sessions[0],
+                    start + timedelta(hours=1, minutes=10),
+                    BGPState.ACTIVE,
+                    BGPState.ESTABLISHED,
+                ),
+                # Not complete yet
+                self.record(
+                    self.sessions[0],
+                    start + timedelta(hours=2, minutes=10),
+                    BGPState.ESTABLISHED,
+                    BGPState.ACTIVE,
+                ),
+            ]
+        )
+
+        self.assertEqual(
+            6,
+            BGPSessionStateRecord.objects.downsample(
+                BGPSessionStateResolution.RAW, start + timedelta(hours=2, minutes=30)
+            ),
+        )
+        self.assertEqual(
+            1,
+            BGPSessionStateRecord.objects.filter(
+                resolution=BGPSessionStateResolution.RAW
+            ).count(),
+        )
+        history = list(
+            self.sessions[0]
+            .get_state_history(before=start + timedelta(hours=2))
+            .values_list("time", "bgp_state", "received_prefix_count", "state_changes")
+        )
+        self.assertListEqual(
+            [
+                (start + timedelta(hours=1), BGPState.ACTIVE, 0, 1),
+                (start, BGPState.ESTABLISHED, 20, 3),
+            ],
+            history,
+        )
+        self.assertEqual(1, self.sessions[1].get_state_history().count())
+
+        self.assertEqual(
+            3,
+            BGPSessionStateRecord.objects.downsample(
+                BGPSessionStateResolution.HOURLY, start + timedelta(days=1)
+            ),
+        )
+        record = self.sessions[0].get_state_history(before=start).get()
+        self.assertEqual(BGPSessionStateResolution.DAILY, record.resolution)
+        self.assertEqual(BGPState.ACTIVE, record.bgp_state)
+        self.assertEqual(4, record.state_changes)
+
+
 class CommunityTest(TestCase):
     @classmethod
     def setUpTestData(cls):
@@ -177,6 +293,12 @@ class DirectPeeringSessionTest(TestCase):
         ):
             self.assertTrue(self.session.poll())
             self.assertEqual(567_257, self.session.received_prefix_count)
+            # Only changes are recorded
+            self.assertTrue(self.session.poll())
+            record = self.session.get_state_history().get()
+            self.assertEqual(BGPState.ESTABLISHED, record.bgp_state)
+            self.assertEqual(567_257, record.received_prefix_count)
+            self.assertEqual(0, record.state_changes)
 
 
 class InternetExchangeTest(TestCase):
@@ -190,6 +312,108 @@ class InternetExchangeTest(TestCase):
         )
         load_peeringdb_data()
 
+    def test_import_sessions(self):
+        router = Router.objects.create(
+            name="test",
+            hostname="test.example.com",
+            local_autonomous_system=self.autonomous_system,
+        )
+        connection = Connection.objects.create(
+            internet_exchange_point=self.internet_exchange,
+            router=router,
+            ipv6_address="2001:db8:10::1/64",
+            ipv4_address="192.0.2.1/24",
+        )
+        InternetExchangePeeringSession.objects.create(
+            autonomous_system=AutonomousSystem.objects.create(
+                asn=64496, name="Existing"
+            ),
+            ixp_connection=connection,
+            ip_address="2001:db8:10::2/64",
+        )
+        prefixes = [
+            IXLanPrefix(prefix="2001:db8:10::/64"),
+            IXLanPrefix(prefix="192.0.2.0/24"),
+        ]
+        bgp_neighbors = [
+            # Already existing
+            {"ip_address": ipaddress.ip_address("2001:db8:10::2"), "remote_asn": 64496},
+            # Not in any prefixes
+            {
+                "ip_address": ipaddress.ip_address("2001:db8:20::3"),
+                "remote_asn": 201281,
+            },
+            # Unknown in PeeringDB
+            {"ip_address": ipaddress.ip_address("192.0.2.4"), "remote_asn": 64497},
+            {
+                "ip_address": ipaddress.ip_address("2001:db8:10::5"),
+                "remote_asn": 201281,
+            },
+            {"ip_address": ipaddress.ip_address("192.0.2.5"), "remote_asn": 201281},
+            # Duplicate
+            {"ip_address": ipaddress.ip_address("192.0.2.5"), "remote_asn": 201281},
+        ]
+
+        with patch.object(InternetExchange, "get_prefixes", return_value=prefixes):
+            self.assertEqual(
+                (2, 1),
+                self.internet_exchange.import_sessions(
+                    connection, bgp_neighbors=bgp_neighbors
+                ),
+            )
+            # Nothing left to import
+            self.assertEqual(
+                (0, 0),
+                self.internet_exchange.import_sessions(
+                    connection, bgp_neighbors=bgp_neighbors
+                ),
+            )
+
+            # Sessions created while importing are not counted
+            bulk_create_from_peeringdb = AutonomousSystem.bulk_create_from_peeringdb
+
+            def create_meanwhile(asns):
+                autonomous_systems = bulk_create_from_peeringdb(asns)
+                InternetExchangePeeringSession.objects.create(
+                    autonomous_system=autonomous_systems[201281],
+                    ixp_connection=connection,
+                    ip_address="192.0.2.6",
+                )
+                return autonomous_systems
+
+            with patch.object(
+                AutonomousSystem,
+                "bulk_create_from_peeringdb",
+                side_effect=create_meanwhile,
+            ):
+                self.assertEqual(
+                    (1, 1),
+                    self.internet_exchange.import_sessions(
+                        connection,
+                        bgp_neighbors=[
+                            {
+                                "ip_address": ipaddress.ip_address("192.0.2.6"),
+                                "remote_asn": 201281,
+                            },
+                            {
+                                "ip_address": ipaddress.ip_address("192.0.2.7"),
+                                "remote_asn": 201281,
+                            },
+                        ],
+                    ),
+                )
+
+        autonomous_system = AutonomousSystem.objects.get(asn=201281)
+        self.assertEqual("RIPE::AS-MAZOYER-EU", autonomous_system.irr_as_set)
+        self.assertFalse(AutonomousSystem.objects.filter(asn=64497).exists())
+        self.assertEqual(
+            ["192.0.2.5", "192.0.2.6", "192.0.2.7", "2001:db8:10::5"],
+            sorted(
+                str(s.ip_address)
+                for s in autonomous_system.internetexchangepeeringsession_set.all()
+            ),
+        )
+
 
 class InternetExchangePeeringSessionTest(TestCase):
     @classmethod
@@ -278,6 +502,12 @@ class InternetExchangePeeringSessionTest(TestCase):
         ):
             self.assertTrue(self.session.poll())
             self.assertEqual(567_257, self.session.received_prefix_count)
+            # Only changes are recorded
+            self.assertTrue(self.session.poll())
+            record = self.session.get_state_history().get()
+            self.assertEqual(BGPState.ESTABLISHED, record.bgp_state)
+            self.assertEqual(567_257, record.received_prefix_count)
+            self.assertEqual(0, record.state_changes)
 
 
 class RouterTest(TestCase):
@@ -494,6 +724,69 @@ class RouterTest(TestCase):
             self.router.bgp_neighbors_detail_as_list(self.bgp_neighbors_detail),
         )
 
+    @override_settings(CACHEOPS_ENABLED=True)
+    def test_get_bgp_neighbors_detail(self):
+        self.router.invalidate_bgp_neighbors_detail()
+        with patch.object(
+            Router,
+            "get_napalm_bgp_neighbors_detail",
+            return_value=self.bgp_neighbors_detail,
+        ) as get_napalm_bgp_neighbors_detail:
+            self.assertEqual(
+                self.bgp_neighbors_detail, self.router.get_bgp_neighbors_detail()
+            )
+            self.assertEqual(
+                "192.0.2.1",
+                self.router.get_bgp_neighbors_detail(
+                    ip_address="192.0.2.1/24", use_cache=True
+                )["remote_address"],
+            )
+            self.assertIsNotNone(
+                self.router.get_bgp_neighbors_detail(
+                    ip_address=ipaddress.ip_address("2001:db8::1"), use_cache=True
+                )
+            )
+            self.assertIsNone(
+                self.router.get_bgp_neighbors_detail(
+                    ip_address="192.0.2.250", use_cache=True
+                )
+            )
+            # All lookups using the cache are served by a single call to the router
+            get_napalm_bgp_neighbors_detail.assert_called_once()
+
+            # Other instances of the router use the cache
+            Router.objects.get(pk=self.router.pk).get_bgp_neighbors_detail(
+                use_cache=True
+            )
+            get_napalm_bgp_neighbors_detail.assert_called_once()
+
+            # Lookups not using the cache always query the router
+            self.router.get_bgp_neighbors_detail()
+            self.assertEqual(2, get_napalm_bgp_neighbors_detail.call_count)
+
+            self.router.invalidate_bgp_neighbors_detail()
+            self.router.get_bgp_neighbors_detail(ip_address="192.0.2.1", use_cache=True)
+            self.assertEqual(3, get_napalm_bgp_neighbors_detail.call_count)
+
+            with override_settings(CACHE_BGP_DETAIL_TIMEOUT=0):
+                self.router.get_bgp_neighbors_detail(
+                    ip_address="192.0.2.1", use_cache=True
+                )
+                self.router.get_bgp_neighbors_detail(
+                    ip_address="192.0.2.1", use_cache=True
+                )
+                self.assertEqual(5, get_napalm_bgp_neighbors_detail.call_count)
+
+            # The shared cache is not used when caching is disabled
+            self.router.invalidate_bgp_neighbors_detail()
+            self.router.get_bgp_neighbors_detail()
+            with override_settings(CACHEOPS_ENABLED=False):
+                Router.objects.get(pk=self.router.pk).get_bgp_neighbors_detail(
+                    use_cache=True
+                )
+            self.assertEqual(7, get_napalm_bgp_neighbors_detail.call_count)
+        self.router.invalidate_bgp_neighbors_detail()
+
     def test_find_bgp_neighbor_detail(self):
         self.assertIsNone(
             self.router.find_bgp_neighbor_detail(
@@ -567,6 +860,48 @@ class RouterTest(TestCase):
             session.refresh_from_db()
             self.assertEqual(567_257, session.received_prefix_count)
 
+            # Sessions sharing an IP are ignored, the others are never saved one
+            # by one
+            duplicate = DirectPeeringSession.objects.create(
+                local_autonomous_system=self.local_as,
+                local_ip_address="192.0.2.2/24",
+                autonomous_system=autonomous_system,
+                bgp_group=group,
+                relationship=relationship,
+                ip_address="192.0.2.1/24",
+                status=BGPSessionStatus.ENABLED,
+                router=self.router,
+            )
+            DirectPeeringSession.objects.create(
+                local_autonomous_system=self.local_as,
+                local_ip_address="192.0.2.2/24",
+                autonomous_system=autonomous_system,
+                bgp_group=group,
+                relationship=relationship,
+                ip_address="192.0.2.1/24",
+                status=BGPSessionStatus.ENABLED,
+                router=self.router,
+            )
+            session.received_prefix_count = 0
+            session.save()
+            with patch.object(DirectPeeringSession, "save") as save:
+                self.assertTrue(self.router.poll_bgp_sessions())
+                save.assert_not_called()
+            session.refresh_from_db()
+            duplicate.refresh_from_db()
+            self.assertEqual(567_257, session.received_prefix_count)
+            self.assertEqual(0, duplicate.received_prefix_count)
+            self.assertIsNone(duplicate.bgp_state)
+
+            # Fields written while polling are not overwritten
+            Router.objects.get(pk=self.router.pk).set_deployed_configuration(
+                "hostname test"
+            )
+            self.assertTrue(self.router.poll_bgp_sessions())
+            self.router.refresh_from_db()
+            self.assertTrue(self.router.is_configuration_deployed("hostname test"))
+            self.assertIsNotNone(self.router.poll_bgp_sessions_last_updated)
+
     def test_set_napalm_configuration(self):
         error, changes = self.router.set_napalm_configuration(None)
         self.assertIsNotNone(error)
@@ -0,0 +1,123 @@
+import uuid
+from unittest.mock import patch
+
+from django.contrib.contenttypes.models import ContentType
+from django.test import TestCase, override_settings
+from rq import Worker as BaseWorker
+
+from devices.models import Platform
+from extras.models import JobResult
+from peering.enums import DeviceStatus
+from peering.jobs import set_napalm_configuration
+from peering.models import AutonomousSystem, Router
+from peering.napalm_pool import NapalmDevicePool
+from peering.tests.mocked_data import MockedDevice
+from peering.workers import Worker
+
+
+class NapalmDevicePoolTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        local_as = AutonomousSystem.objects.create(
+            asn=64500, name="Local", affiliated=True
+        )
+        platform = Platform.objects.get(slug="juniper-junos")
+        cls.routers = [
+            Router.objects.create(
+                local_autonomous_system=local_as,
+                name=f"Router {i}",
+                hostname=f"router{i}.example.com",
+                platform=platform,
+                status=DeviceStatus.ENABLED,
+            )
+            for i in range(1, 4)
+        ]
+
+    def setUp(self):
+        self.pool = NapalmDevicePool()
+        self.devices = []
+
+        def get_napalm_device(router):
+            self.devices.append(MockedDevice())
+            return self.devices[-1]
+
+        patcher = patch.object(
+            Router, "get_napalm_device", autospec=True, side_effect=get_napalm_device
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    @override_settings(NAPALM_POOL_SIZE=0)
+    def test_disabled(self):
+        for _ in range(2):
+            with self.pool.borrow(self.routers[0]) as device:
+                self.assertIsNotNone(device)
+        self.assertEqual(2, len(self.devices))
+        self.assertEqual([1, 1], [d.closed for d in self.devices])
+
+    @override_settings(NAPALM_POOL_SIZE=2, NAPALM_POOL_IDLE_TIMEOUT=60)
+    def test_borrow(self):
+        router = self.routers[0]
+        with self.pool.borrow(router) as first:
+            pass
+        with self.pool.borrow(router) as second:
+            # Borrowed devices are not shared
+            with self.pool.borrow(router) as third:
+                self.assertIsNot(second, third)
+        self.assertIs(first, second)
+        self.assertEqual(2, len(self.devices))
+        self.assertEqual(0, first.closed)
+
+        # Dead devices are replaced
+        first.alive = False
+        with self.pool.borrow(router) as device:
+            self.assertIsNot(first, device)
+        self.assertEqual(1, first.closed)
+
+        # Devices are not reused after an error
+        with self.assertRaises(ValueError):
+            with self.pool.borrow(router) as device:
+                raise ValueError()
+        self.assertEqual(1, device.closed)
+
+        self.pool.clear()
+        self.assertTrue(all(d.closed == 1 for d in self.devices))
+
+    @override_settings(NAPALM_POOL_SIZE=2, NAPALM_POOL_IDLE_TIMEOUT=60)
+    def test_limits(self):
+        for router in self.routers:
+            with self.pool.borrow(router):
+                pass
+        # The least recently used device is closed above the maximum size
+        self.assertEqual([1, 0, 0], [d.closed for d in self.devices])
+
+        with patch("peering.napalm_pool.time.monotonic", return_value=10**9):
+            with self.pool.borrow(self.routers[1]) as device:
+                self.assertIsNot(self.devices[1], device)
+        # Idle devices are closed after the timeout
+        self.assertEqual([1, 1, 1, 0], [d.closed for d in self.devices])
+
+    @override_settings(NAPALM_POOL_SIZE=2, NAPALM_POOL_IDLE_TIMEOUT=60)
+    def test_jobs(self):
+        router = self.routers[0]
+        with patch("peering.models.models.napalm_pool", self.pool), patch.object(
+            Router, "generate_configuration", return_value="hostname test"
+        ):
+            for _ in range(2):
+                job_result = JobResult.objects.create(
+                    name="test",
+                    obj_type=ContentType.objects.get_for_model(Router),
+                    user=None,
+                    job_id=uuid.uuid4(),
+                )
+                self.assertTrue(set_napalm_configuration(router, False, job_result))
+        # Tasks run by the same process share connections
+        self.assertEqual(1, len(self.devices))
+        self.assertEqual((1, 0), (self.devices[0].opened, self.devices[0].closed))
+
+        # Tasks run in their own process close them once done
+        with patch("peering.workers.napalm_pool", self.pool), patch.object(
+            BaseWorker, "perform_job", return_value=True
+        ):
+            self.assertTrue(Worker.perform_job(object.__new__(Worker), None, None))
+        self.assertEqual(1, self.devices[0].closed)
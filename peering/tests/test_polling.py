@@ -0,0 +1,285 @@
+import threading
+import time
+import uuid
+from datetime import timedelta
+from unittest.mock import patch
+
+from django.contrib.contenttypes.models import ContentType
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from bgp.models import Relationship
+from devices.models import Platform
+from extras.enums import JobResultStatus
+from extras.models import JobResult
+from netbox.api import NetBox
+from peering.enums import BGPSessionStatus, DeviceStatus
+from peering.jobs import poll_bgp_sessions_fleet
+from peering.metrics import collect
+from peering.models import AutonomousSystem, BGPGroup, DirectPeeringSession, Router
+from peering.polling import (
+    BGPPollingScheduler,
+    BGPSessionsPoller,
+    get_polling_interval,
+    schedule_next_poll,
+)
+from utils.testing import load_json
+
+
+class BGPSessionsPollerTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.local_as = AutonomousSystem.objects.create(
+            asn=64510, name="Local", affiliated=True
+        )
+        autonomous_system = AutonomousSystem.objects.create(asn=64501, name="Remote")
+        group = BGPGroup.objects.create(name="Test", slug="test")
+        relationship = Relationship.objects.create(name="Test", slug="test")
+        platform = Platform.objects.get(slug="juniper-junos")
+
+        cls.routers = []
+        cls.sessions = []
+        for i in range(1, 5):
+            router = Router.objects.create(
+                local_autonomous_system=cls.local_as,
+                name=f"Router {i}",
+                hostname=f"router{i}.example.com",
+                platform=platform,
+                status=DeviceStatus.ENABLED,
+                poll_bgp_sessions_state=True,
+            )
+            cls.routers.append(router)
+            cls.sessions.append(
+                DirectPeeringSession.objects.create(
+                    local_autonomous_system=cls.local_as,
+                    local_ip_address="2001:db8::2/126",
+                    autonomous_system=autonomous_system,
+                    bgp_group=group,
+                    relationship=relationship,
+                    ip_address="2001:db8::1/126",
+                    status=BGPSessionStatus.ENABLED,
+                    router=router,
+                )
+            )
+        cls.disabled = Router.objects.create(
+            local_autonomous_system=cls.local_as,
+            name="Disabled",
+            hostname="disabled.example.com",
+            platform=platform,
+            status=DeviceStatus.DISABLED,
+            poll_bgp_sessions_state=True,
+        )
+        cls.bgp_neighbors_detail = load_json(
+            "peering/tests/fixtures/get_bgp_neighbors_detail.json"
+        )
+
+    def get_routers(self):
+        return Router.objects.select_related("platform").order_by("pk")
+
+    def test_poll(self):
+        running, peak = 0, 0
+        lock = threading.Lock()
+
+        def get_bgp_neighbors_detail(router):
+            nonlocal running, peak
+            with lock:
+                running += 1
+                peak = max(peak, running)
+            time.sleep(0.05)
+            with lock:
+                running -= 1
+            if router.hostname == "router4.example.com":
+                raise Exception("unreachable")
+            return self.bgp_neighbors_detail
+
+        with patch.object(
+            Router,
+            "get_bgp_neighbors_detail",
+            autospec=True,
+            side_effect=get_bgp_neighbors_detail,
+        ):
+            results = BGPSessionsPoller(
+                concurrency=3, platform_concurrency={"juniper-junos": 2}
+            ).poll(self.get_routers())
+
+        self.assertEqual(5, len(results))
+        self.assertEqual(2, peak)
+        by_hostname = {r.hostname: result for r, result in results.items()}
+        for i in range(1, 4):
+            self.assertTrue(by_hostname[f"router{i}.example.com"]["success"])
+        self.assertFalse(by_hostname["router4.example.com"]["success"])
+        self.assertIn("unreachable", by_hostname["router4.example.com"]["message"])
+        self.assertFalse(by_hostname["disabled.example.com"]["success"])
+
+        for session in self.sessions[:3]:
+            session.refresh_from_db()
+            self.assertEqual(567_257, session.received_prefix_count)
+        self.sessions[3].refresh_from_db()
+        self.assertEqual(0, self.sessions[3].received_prefix_count)
+
+    def test_poll_timeout(self):
+        def get_bgp_neighbors_detail(router):
+            if router.hostname == "router1.example.com":
+                time.sleep(1)
+            return self.bgp_neighbors_detail
+
+        with patch.object(
+            Router,
+            "get_bgp_neighbors_detail",
+            autospec=True,
+            side_effect=get_bgp_neighbors_detail,
+        ):
+            results = BGPSessionsPoller(concurrency=2, timeout=0.2).poll(
+                self.get_routers()
+            )
+
+        by_hostname = {r.hostname: result for r, result in results.items()}
+        self.assertFalse(by_hostname["router1.example.com"]["success"])
+        self.assertIn("Timed out", by_hostname["router1.example.com"]["message"])
+        for i in range(2, 5):
+            self.assertTrue(by_hostname[f"router{i}.example.com"]["success"])
+
+    @override_settings(CACHE_BGP_DETAIL_TIMEOUT=0)
+    def test_poll_netbox(self):
+        for i, router in enumerate(self.routers[:2], start=1):
+            Router.objects.filter(pk=router.pk).update(
+                use_netbox=True, netbox_device_id=i
+            )
+
+        def napalm(netbox, device_id, method):
+            if device_id == 2:
+                raise Exception("netbox unreachable")
+            return self.bgp_neighbors_detail
+
+        with patch.object(
+            NetBox, "napalm", autospec=True, side_effect=napalm
+        ), patch.object(
+            Router,
+            "get_bgp_neighbors_detail",
+            autospec=True,
+            return_value=self.bgp_neighbors_detail,
+        ) as get_bgp_neighbors_detail, collect() as summary:
+            results = BGPSessionsPoller().poll(self.get_routers())
+
+        # Routers using NetBox are not queried one by one
+        self.assertEqual(2, get_bgp_neighbors_detail.call_count)
+        by_hostname = {r.hostname: result for r, result in results.items()}
+        self.assertTrue(by_hostname["router1.example.com"]["success"])
+        self.assertFalse(by_hostname["router2.example.com"]["success"])
+        self.assertIn(
+            "netbox unreachable", by_hostname["router2.example.com"]["message"]
+        )
+        self.sessions[0].refresh_from_db()
+        self.assertEqual(567_257, self.sessions[0].received_prefix_count)
+        operation = summary.as_dict()["operations"][0]
+        self.assertEqual(
+            ("get_bgp_neighbors_detail", "netbox", 2, 1),
+            (
+                operation["operation"],
+                operation["transport"],
+                operation["count"],
+                operation["failures"],
+            ),
+        )
+
+    def test_poll_bgp_sessions_fleet(self):
+        job_result = JobResult.objects.create(
+            name="test",
+            obj_type=ContentType.objects.get_for_model(Router),
+            user=None,
+            job_id=uuid.uuid4(),
+        )
+
+        save = JobResult.save
+        with patch.object(
+            Router, "get_bgp_neighbors_detail", return_value=self.bgp_neighbors_detail
+        ), patch.object(
+            JobResult, "save", autospec=True, side_effect=save
+        ) as job_result_save:
+            self.assertFalse(
+                poll_bgp_sessions_fleet(list(self.get_routers()), job_result)
+            )
+
+        # Results of routers are saved at once, when the job is marked as failed
+        self.assertEqual(2, job_result_save.call_count)
+        job_result.refresh_from_db()
+        self.assertEqual(JobResultStatus.FAILED, job_result.status)
+        self.assertEqual(4, job_result.data["main"]["success"])
+        self.assertEqual(2, job_result.data["main"]["failure"])
+
+
+@override_settings(
+    BGP_POLLING_INTERVAL=300, BGP_POLLING_JITTER=0.1, BGP_POLLING_MAX_BACKOFF=3600
+)
+class BGPPollingSchedulerTest(BGPSessionsPollerTest):
+    def assertDelay(self, expected, router, now):
+        delay = (router.poll_bgp_sessions_next - now).total_seconds()
+        self.assertGreaterEqual(delay, expected * 0.9)
+        self.assertLessEqual(delay, expected * 1.1)
+
+    def test_schedule_next_poll(self):
+        router = self.routers[0]
+        now = timezone.now()
+
+        schedule_next_poll(router, True, now=now)
+        self.assertDelay(300, router, now)
+        schedule_next_poll(router, True, changed=True, now=now)
+        self.assertDelay(150, router, now)
+
+        for failures, delay in ((1, 600), (2, 1200), (3, 2400), (4, 3600), (5, 3600)):
+            schedule_next_poll(router, False, now=now)
+            self.assertEqual(failures, router.poll_bgp_sessions_failures)
+            self.assertDelay(delay, router, now)
+
+        schedule_next_poll(router, True, now=now)
+        self.assertEqual(0, router.poll_bgp_sessions_failures)
+
+        router.poll_bgp_sessions_interval = 60
+        self.assertEqual(60, get_polling_interval(router))
+        schedule_next_poll(router, True, now=now)
+        self.assertDelay(60, router, now)
+
+    def test_run_pending(self):
+        scheduler = BGPPollingScheduler()
+        now = timezone.now()
+
+        # First polls are spread over the polling interval
+        self.assertEqual([], scheduler.run_pending(now=now))
+        for router in scheduler.get_routers():
+            self.assertLessEqual(
+                router.poll_bgp_sessions_next, now + timedelta(seconds=300)
+            )
+        self.assertLessEqual(scheduler.get_sleep_time(), 60)
+
+        Router.objects.filter(pk__in=[r.pk for r in self.routers[:2]]).update(
+            poll_bgp_sessions_next=now - timedelta(seconds=1)
+        )
+        Router.objects.filter(pk=self.routers[1].pk).update(
+            poll_bgp_sessions_interval=60
+        )
+        with patch.object(
+            Router, "get_bgp_neighbors_detail", return_value=self.bgp_neighbors_detail
+        ):
+            due = scheduler.run_pending(now=now)
+
+        # Routers with the shortest interval come first
+        self.assertEqual([self.routers[1].pk, self.routers[0].pk], [r.pk for r in due])
+        for router, interval in zip(self.routers[:2], (300, 60)):
+            router.refresh_from_db()
+            self.assertEqual(0, router.poll_bgp_sessions_failures)
+            # Sessions changed state during the poll, next one comes sooner
+            self.assertDelay(interval / 2, router, now)
+            self.assertGreater(router.poll_bgp_sessions_next, timezone.now())
+
+    def test_run_pending_as_task(self):
+        now = timezone.now()
+        Router.objects.update(poll_bgp_sessions_next=now - timedelta(seconds=1))
+
+        with patch("peering.polling.JobResult.enqueue_job") as enqueue_job:
+            due = BGPPollingScheduler(as_task=True).run_pending(now=now)
+
+        enqueue_job.assert_called_once()
+        self.assertEqual(4, len(due))
+        self.assertEqual(due, enqueue_job.call_args.args[-1])
+        # Routers are not due anymore while the task runs
+        self.assertEqual([], BGPPollingScheduler(as_task=True).run_pending(now=now))
@@ -1,9 +1,12 @@
 import ipaddress
 
+from django.urls import reverse
+
 from bgp.models import Relationship
 from net.models import Connection
 from peering.enums import (
     BGPSessionStatus,
+    BGPState,
     CommunityType,
     DeviceStatus,
     RoutingPolicyType,
@@ -11,6 +14,7 @@ from peering.enums import (
 from peering.models import (
     AutonomousSystem,
     BGPGroup,
+    BGPSessionStateRecord,
     Community,
     DirectPeeringSession,
     InternetExchange,
@@ -164,6 +168,20 @@ class DirectPeeringSessionTestCase(ViewTestCases.PrimaryObjectViewTestCase):
             "comments": "New comments",
         }
 
+    def test_state_history(self):
+        session = DirectPeeringSession.objects.first()
+        session.bgp_state = BGPState.ESTABLISHED
+        BGPSessionStateRecord.from_session(session, previous_state=BGPState.IDLE).save()
+
+        self.add_permissions("view")
+        response = self.client.get(
+            reverse(
+                "peering:directpeeringsession_state_history", kwargs={"pk": session.pk}
+            )
+        )
+        self.assertHttpStatus(response, 200)
+        self.assertEqual(1, response.context["state_changes"])
+
 
 class InternetExchangeTestCase(ViewTestCases.PrimaryObjectViewTestCase):
     model = InternetExchange
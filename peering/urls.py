@@ -181,6 +181,11 @@ urlpatterns = [
         views.DirectPeeringSessionConfigContext.as_view(),
         name="directpeeringsession_configcontext",
     ),
+    path(
+        "direct-peering-sessions/<int:pk>/state-history/",
+        views.DirectPeeringSessionStateHistory.as_view(),
+        name="directpeeringsession_state_history",
+    ),
     path(
         "direct-peering-sessions/<int:pk>/changelog/",
         ObjectChangeLog.as_view(),
@@ -290,6 +295,11 @@ urlpatterns = [
         views.InternetExchangePeeringSessionConfigContext.as_view(),
         name="internetexchangepeeringsession_configcontext",
     ),
+    path(
+        "internet-exchange-peering-sessions/<int:pk>/state-history/",
+        views.InternetExchangePeeringSessionStateHistory.as_view(),
+        name="internetexchangepeeringsession_state_history",
+    ),
     path(
         "internet-exchange-peering-sessions/<int:pk>/changelog/",
         ObjectChangeLog.as_view(),
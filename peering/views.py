@@ -2,7 +2,7 @@ from django.conf import settings
 from django.contrib import messages
 from django.core.mail import EmailMessage
 from django.db import transaction
-from django.db.models import Count
+from django.db.models import Count, Sum
 from django.http import HttpResponse
 from django.shortcuts import get_object_or_404, redirect, render
 from django.template.defaultfilters import pluralize
@@ -36,6 +36,7 @@ from utils.functions import count_related
 from .filters import (
     AutonomousSystemFilterSet,
     BGPGroupFilterSet,
+    BGPSessionStateRecordFilterSet,
     CommunityFilterSet,
     DirectPeeringSessionFilterSet,
     InternetExchangeFilterSet,
@@ -50,6 +51,7 @@ from .forms import (
     BGPGroupBulkEditForm,
     BGPGroupFilterForm,
     BGPGroupForm,
+    BGPSessionStateRecordFilterForm,
     CommunityBulkEditForm,
     CommunityFilterForm,
     CommunityForm,
@@ -72,6 +74,7 @@ from .forms import (
 from .models import (
     AutonomousSystem,
     BGPGroup,
+    BGPSessionStateRecord,
     Community,
     DirectPeeringSession,
     InternetExchange,
@@ -82,6 +85,7 @@ from .models import (
 from .tables import (
     AutonomousSystemTable,
     BGPGroupTable,
+    BGPSessionStateRecordTable,
     CommunityTable,
     DirectPeeringSessionTable,
     InternetExchangePeeringSessionTable,
@@ -428,6 +432,31 @@ class CommunityBulkEdit(BulkEditView):
     form = CommunityBulkEditForm
 
 
+class BGPSessionStateHistoryView(ObjectChildrenView):
+    """
+    Displays the state history of a BGP session.
+    """
+
+    child_model = BGPSessionStateRecord
+    table = BGPSessionStateRecordTable
+    filterset = BGPSessionStateRecordFilterSet
+    filterset_form = BGPSessionStateRecordFilterForm
+    template_name = "peering/bgpsession/state_history.html"
+    base_template = None
+
+    def get_children(self, request, parent):
+        return parent.get_state_history()
+
+    def get_extra_context(self, request, instance):
+        records = self.filterset(request.GET, self.get_children(request, instance)).qs
+        return {
+            "base_template": self.base_template,
+            "active_tab": "state-history",
+            "state_changes": records.aggregate(total=Sum("state_changes"))["total"]
+            or 0,
+        }
+
+
 class DirectPeeringSessionList(ObjectListView):
     permission_required = "peering.view_directpeeringsession"
     queryset = DirectPeeringSession.objects.order_by(
@@ -453,6 +482,12 @@ class DirectPeeringSessionConfigContext(ObjectConfigContextView):
     base_template = "peering/directpeeringsession/_base.html"
 
 
+class DirectPeeringSessionStateHistory(BGPSessionStateHistoryView):
+    permission_required = "peering.view_directpeeringsession"
+    queryset = DirectPeeringSession.objects.all()
+    base_template = "peering/directpeeringsession/_base.html"
+
+
 class DirectPeeringSessionAdd(ObjectEditView):
     permission_required = "peering.add_directpeeringsession"
     queryset = DirectPeeringSession.objects.all()
@@ -764,6 +799,12 @@ class InternetExchangePeeringSessionConfigContext(ObjectConfigContextView):
     base_template = "peering/internetexchangepeeringsession/_base.html"
 
 
+class InternetExchangePeeringSessionStateHistory(BGPSessionStateHistoryView):
+    permission_required = "peering.view_internetexchangepeeringsession"
+    queryset = InternetExchangePeeringSession.objects.all()
+    base_template = "peering/internetexchangepeeringsession/_base.html"
+
+
 class InternetExchangePeeringSessionAdd(ObjectEditView):
     permission_required = "peering.add_internetexchangepeeringsession"
     queryset = InternetExchangePeeringSession.objects.all()
@@ -0,0 +1,19 @@
+from rq import Worker as BaseWorker
+
+from peering.napalm_pool import napalm_pool
+
+
+class Worker(BaseWorker):
+    """
+    RQ worker running each task in a new process, NAPALM connections kept by the
+    pool of this process are closed once the task is done.
+
+    The process running the task exits without calling cleanup functions, so
+    connections would otherwise be left to time out on routers.
+    """
+
+    def perform_job(self, job, queue):
+        try:
+            return super().perform_job(job, queue)
+        finally:
+            napalm_pool.clear()
@@ -1,5 +1,12 @@
+from .environment import get_environment, get_template
 from .extensions import IncludeTemplateExtension
 from .filters import FILTER_DICT
 from .loaders import PeeringManagerLoader
 
-__all__ = ("FILTER_DICT", "IncludeTemplateExtension", "PeeringManagerLoader")
+__all__ = (
+    "FILTER_DICT",
+    "IncludeTemplateExtension",
+    "PeeringManagerLoader",
+    "get_environment",
+    "get_template",
+)
@@ -0,0 +1,136 @@
+import threading
+
+from django.conf import settings
+from jinja2 import Environment, FileSystemBytecodeCache, MemcachedBytecodeCache
+
+from .extensions import IncludeTemplateExtension
+from .filters import FILTER_DICT
+from .loaders import PeeringManagerLoader
+
+_environments = {}
+_templates = {}
+_lock = threading.Lock()
+
+
+def get_bytecode_cache():
+    """
+    Returns the bytecode cache shared by processes according to the
+    `JINJA2_BYTECODE_CACHE` setting, `None` if it is disabled.
+    """
+    if not settings.JINJA2_BYTECODE_CACHE:
+        return None
+
+    if settings.JINJA2_BYTECODE_CACHE == "redis":
+        from cacheops.redis import redis_client
+
+        return MemcachedBytecodeCache(
+            redis_client,
+            prefix="peering_manager.jinja2.bytecode:",
+            timeout=settings.JINJA2_BYTECODE_CACHE_TIMEOUT or None,
+        )
+
+    return FileSystemBytecodeCache(directory=settings.JINJA2_BYTECODE_CACHE)
+
+
+def get_environment(trim_blocks=False, lstrip_blocks=False):
+    """
+    Returns the Jinja2 environment of the process for the given options, with
+    our extensions and filters.
+    """
+    key = (
+        trim_blocks,
+        lstrip_blocks,
+        tuple(settings.JINJA2_TEMPLATE_EXTENSIONS),
+        settings.JINJA2_BYTECODE_CACHE,
+    )
+    with _lock:
+        environment = _environments.get(key)
+        if environment:
+            return environment
+
+        environment = Environment(
+            loader=PeeringManagerLoader(),
+            trim_blocks=trim_blocks,
+            lstrip_blocks=lstrip_blocks,
+            bytecode_cache=get_bytecode_cache(),
+        )
+        environment.add_extension(IncludeTemplateExtension)
+        for extension in settings.JINJA2_TEMPLATE_EXTENSIONS:
+            environment.add_extension(extension)
+
+        # Add custom filters to our environment
+        environment.filters.update(FILTER_DICT)
+
+        _environments[key] = environment
+        return environment
+
+
+def _compile(environment, name, source):
+    """
+    Compiles a template, going through the bytecode cache of the environment if
+    it has one.
+
+    The bytecode depends on the options of the environment, they are part of the
+    name of the bucket so that environments do not share their buckets.
+    """
+    bytecode_cache = environment.bytecode_cache
+    bucket, code = None, None
+    if bytecode_cache:
+        bucket_name = ":".join(
+            [
+                name,
+                str(environment.trim_blocks),
+                str(environment.lstrip_blocks),
+                ",".join(sorted(environment.extensions)),
+            ]
+        )
+        bucket = bytecode_cache.get_bucket(environment, bucket_name, None, source)
+        code = bucket.code
+
+    if code is None:
+        code = environment.compile(source, name)
+        if bucket:
+            bucket.code = code
+            bytecode_cache.set_bucket(bucket)
+
+    return environment.template_class.from_code(
+        environment, code, environment.make_globals(None), None
+    )
+
+
+def get_template(obj, attribute="template"):
+    """
+    Returns the compiled Jinja2 template found in the given attribute of a
+    template object.
+
+    Templates of saved objects are compiled once per process and kept until the
+    object is updated.
+    """
+    environment = get_environment(
+        trim_blocks=obj.jinja2_trim, lstrip_blocks=obj.jinja2_lstrip
+    )
+    source = getattr(obj, attribute)
+    if not obj.pk:
+        return environment.from_string(source)
+
+    key = (obj._meta.label_lower, obj.pk, attribute)
+    with _lock:
+        cached = _templates.get(key)
+    # Check the source too in case the object was changed but not saved yet
+    if cached and cached[:3] == (environment, obj.updated, source):
+        return cached[3]
+
+    template = _compile(environment, ".".join(map(str, key)), source)
+    with _lock:
+        _templates[key] = (environment, obj.updated, source, template)
+
+    return template
+
+
+def clear():
+    """
+    Forgets all environments and compiled templates.
+    """
+    with _lock:
+        _environments.clear()
+        _templates.clear()
@@ -9,7 +9,8 @@ class PeeringManagerLoader(BaseLoader):
     def _lookup_object(self, kind, identifier):
         """
         Look for an object of a given kind using its identifier and return one of its
-        attributes (a template or a rendered template).
+        attributes (a template or a rendered template) along with a function telling
+        if it is still up to date.
         """
         attribute = "template"
 
@@ -27,7 +28,7 @@ class PeeringManagerLoader(BaseLoader):
             model = ExportTemplate
             attribute = "rendered"
         else:
-            return ""
+            return "", lambda: True
 
         try:
             lookup = {"pk": int(identifier)}
@@ -39,8 +40,17 @@ class PeeringManagerLoader(BaseLoader):
         except model.DoesNotExist:
             raise TemplateNotFound(identifier)
 
-        return getattr(o, attribute)
+        if attribute == "rendered":
+            # Rendered content depends on data, never reuse it
+            return getattr(o, attribute), lambda: False
+
+        def uptodate():
+            return model.objects.filter(**lookup).values_list(
+                "pk", "updated"
+            ).first() == (o.pk, o.updated)
+
+        return getattr(o, attribute), uptodate
 
     def get_source(self, environment, template):
-        source = self._lookup_object(*template.split("::", maxsplit=1))
-        return source, template, True
+        source, uptodate = self._lookup_object(*template.split("::", maxsplit=1))
+        return source, template, uptodate
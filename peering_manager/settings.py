@@ -5,6 +5,7 @@
 # every code releases.
 
 
+import os
 import platform
 import unicodedata
 import warnings
@@ -65,6 +66,23 @@ REDIS = getattr(configuration, "REDIS", {})
 RQ_DEFAULT_TIMEOUT = getattr(configuration, "RQ_DEFAULT_TIMEOUT", 300)
 CACHE_TIMEOUT = getattr(configuration, "CACHE_TIMEOUT", 0)
 CACHE_BGP_DETAIL_TIMEOUT = getattr(configuration, "CACHE_BGP_DETAIL_TIMEOUT", 900)
+BGP_POLLING_CONCURRENCY = getattr(configuration, "BGP_POLLING_CONCURRENCY", 8)
+BGP_POLLING_INTERVAL = getattr(configuration, "BGP_POLLING_INTERVAL", 300)
+BGP_POLLING_JITTER = getattr(configuration, "BGP_POLLING_JITTER", 0.1)
+BGP_POLLING_MAX_BACKOFF = getattr(configuration, "BGP_POLLING_MAX_BACKOFF", 3600)
+BGP_POLLING_PLATFORM_CONCURRENCY = getattr(
+    configuration, "BGP_POLLING_PLATFORM_CONCURRENCY", {}
+)
+BGP_POLLING_TIMEOUT = getattr(configuration, "BGP_POLLING_TIMEOUT", 300)
+BGP_SESSION_HISTORY_RETENTION = getattr(
+    configuration, "BGP_SESSION_HISTORY_RETENTION", 7
+)
+BGP_SESSION_HISTORY_HOURLY_RETENTION = getattr(
+    configuration, "BGP_SESSION_HISTORY_HOURLY_RETENTION", 90
+)
+BGP_SESSION_HISTORY_DAILY_RETENTION = getattr(
+    configuration, "BGP_SESSION_HISTORY_DAILY_RETENTION", 730
+)
 CHANGELOG_RETENTION = getattr(configuration, "CHANGELOG_RETENTION", 90)
 JOBRESULT_RETENTION = getattr(configuration, "JOBRESULT_RETENTION", 90)
 LOGIN_REQUIRED = getattr(configuration, "LOGIN_REQUIRED", False)
@@ -73,8 +91,17 @@ NAPALM_USERNAME = getattr(configuration, "NAPALM_USERNAME", "")
 NAPALM_PASSWORD = getattr(configuration, "NAPALM_PASSWORD", "")
 NAPALM_TIMEOUT = getattr(configuration, "NAPALM_TIMEOUT", 30)
 NAPALM_ARGS = getattr(configuration, "NAPALM_ARGS", {})
+NAPALM_POOL_SIZE = getattr(configuration, "NAPALM_POOL_SIZE", 0)
+NAPALM_POOL_IDLE_TIMEOUT = getattr(configuration, "NAPALM_POOL_IDLE_TIMEOUT", 60)
+CONFIG_DEPLOYMENT_CANARY = getattr(configuration, "CONFIG_DEPLOYMENT_CANARY", 1)
+CONFIG_DEPLOYMENT_CONCURRENCY = getattr(
+    configuration, "CONFIG_DEPLOYMENT_CONCURRENCY", 4
+)
+CONFIG_DEPLOYMENT_TIMEOUT = getattr(configuration, "CONFIG_DEPLOYMENT_TIMEOUT", 0)
+CONFIG_DEPLOYMENT_WAVE_SIZE = getattr(configuration, "CONFIG_DEPLOYMENT_WAVE_SIZE", 10)
 PAGINATE_COUNT = getattr(configuration, "PAGINATE_COUNT", 20)
 METRICS_ENABLED = getattr(configuration, "METRICS_ENABLED", False)
+METRICS_DIRECTORY = getattr(configuration, "METRICS_DIRECTORY", "")
 
 DATE_FORMAT = getattr(configuration, "DATE_FORMAT", "jS F, Y")
 DATETIME_FORMAT = getattr(configuration, "DATETIME_FORMAT", "jS F, Y G:i")
@@ -95,6 +122,7 @@ TIME_ZONE = getattr(configuration, "TIME_ZONE", BASE_TZ).rstrip()
 
 EMAIL = getattr(configuration, "EMAIL", {})
 HTTP_PROXIES = getattr(configuration, "HTTP_PROXIES", None)
+HTTP_CACHE_TIMEOUT = getattr(configuration, "HTTP_CACHE_TIMEOUT", 86400)
 BGPQ3_PATH = getattr(configuration, "BGPQ3_PATH", "bgpq3")
 BGPQ3_HOST = getattr(configuration, "BGPQ3_HOST", "whois.radb.net")
 BGPQ3_SOURCES = getattr(
@@ -108,6 +136,10 @@ BGPQ3_ARGS = getattr(
     {"ipv6": ["-r", "16", "-R", "48"], "ipv4": ["-r", "8", "-R", "24"]},
 )
 JINJA2_TEMPLATE_EXTENSIONS = getattr(configuration, "JINJA2_TEMPLATE_EXTENSIONS", [])
+JINJA2_BYTECODE_CACHE = getattr(configuration, "JINJA2_BYTECODE_CACHE", "")
+JINJA2_BYTECODE_CACHE_TIMEOUT = getattr(
+    configuration, "JINJA2_BYTECODE_CACHE_TIMEOUT", 86400
+)
 CONFIG_CONTEXT_MERGE_STRATEGY = {
     "recursive": getattr(configuration, "CONFIG_CONTEXT_RECURSIVE_MERGE", True),
     "list_merge": getattr(configuration, "CONFIG_CONTEXT_LIST_MERGE", "replace"),
@@ -168,6 +200,10 @@ NETBOX_API = getattr(configuration, "NETBOX_API", "")
 NETBOX_API_TOKEN = getattr(configuration, "NETBOX_API_TOKEN", "")
 NETBOX_API_THREADING = getattr(configuration, "NETBOX_API_THREADING", False)
 NETBOX_API_VERIFY_SSL = getattr(configuration, "NETBOX_API_VERIFY_SSL", True)
+NETBOX_API_TIMEOUT = getattr(configuration, "NETBOX_API_TIMEOUT", 30)
+NETBOX_API_RETRIES = getattr(configuration, "NETBOX_API_RETRIES", 3)
+NETBOX_API_CONCURRENCY = getattr(configuration, "NETBOX_API_CONCURRENCY", 8)
+NETBOX_DEVICE_CACHE_TIMEOUT = getattr(configuration, "NETBOX_DEVICE_CACHE_TIMEOUT", 300)
 NETBOX_DEVICE_ROLES = getattr(
     configuration, "NETBOX_DEVICE_ROLES", ["router", "firewall"]
 )
@@ -179,6 +215,11 @@ PEERINGDB = "https://www.peeringdb.com/asn/"
 PEERINGDB_USERNAME = getattr(configuration, "PEERINGDB_USERNAME", "")
 PEERINGDB_PASSWORD = getattr(configuration, "PEERINGDB_PASSWORD", "")
 PEERINGDB_API_KEY = getattr(configuration, "PEERINGDB_API_KEY", "")
+PEERINGDB_SYNC_BULK = getattr(configuration, "PEERINGDB_SYNC_BULK", False)
+PEERINGDB_SYNC_CHUNK_SIZE = getattr(configuration, "PEERINGDB_SYNC_CHUNK_SIZE", 1000)
+PEERINGDB_SYNC_CONCURRENCY = getattr(configuration, "PEERINGDB_SYNC_CONCURRENCY", 4)
+PEERINGDB_SYNC_COMMIT = getattr(configuration, "PEERINGDB_SYNC_COMMIT", None)
+PEERINGDB_SYNC_SCOPED = getattr(configuration, "PEERINGDB_SYNC_SCOPED", False)
 
 # GitHub releases check
 RELEASE_CHECK_URL = getattr(
@@ -356,6 +397,7 @@ else:
     }
 RQ_QUEUES = {"high": RQ_PARAMS, "default": RQ_PARAMS, "low": RQ_PARAMS}
 RQ_EXCEPTION_HANDLERS = ["extras.jobs.exception_handler"]
+RQ = {"WORKER_CLASS": "peering.workers.Worker"}
 
 
 # Email
@@ -459,6 +501,15 @@ if SAML2_CONFIGURED:
 
 # Prometheus setup
 if METRICS_ENABLED:
+    # Metrics of all processes (web server, workers and commands) are written in
+    # the same directory and aggregated when exported, this must be known before
+    # the first metric is created
+    if METRICS_DIRECTORY:
+        if not os.path.isdir(METRICS_DIRECTORY):
+            raise ImproperlyConfigured(
+                f"METRICS_DIRECTORY {METRICS_DIRECTORY} is not a directory."
+            )
+        os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", METRICS_DIRECTORY)
     PROMETHEUS_EXPORT_MIGRATIONS = False
     INSTALLED_APPS.append("django_prometheus")
     MIDDLEWARE = (
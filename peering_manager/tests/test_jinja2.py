@@ -1,9 +1,12 @@
 import ipaddress
 import json
+import tempfile
+from unittest.mock import patch
 
 import yaml
 from django.contrib.contenttypes.models import ContentType
-from django.test import TestCase
+from django.test import TestCase, override_settings
+from jinja2 import Environment
 
 from devices.models import Configuration
 from extras.models import ExportTemplate
@@ -25,7 +28,7 @@ from peering.models import (
     Router,
     RoutingPolicy,
 )
-from peering_manager.jinja2 import FILTER_DICT
+from peering_manager.jinja2 import FILTER_DICT, get_environment, get_template
 from utils.models import Tag
 
 
@@ -558,3 +561,75 @@ class Jinja2FilterTestCase(TestCase):
         self.assertEqual("  a\n  b\n  c", FILTER_DICT["indent"](data, 2, reset=True))
         data = "a\nb\nc"
         self.assertEqual("\ta\n\tb\n\tc", FILTER_DICT["indent"](data, 1, chars="\t"))
+
+
+class Jinja2CacheTestCase(TestCase):
+    def test_get_environment(self):
+        self.assertIs(get_environment(), get_environment())
+        self.assertIsNot(get_environment(), get_environment(trim_blocks=True))
+        self.assertTrue(get_environment(trim_blocks=True).trim_blocks)
+        self.assertIn("iterate", get_environment().filters)
+
+    def test_get_template(self):
+        configuration = Configuration.objects.create(name="test", template="{{ foo }}")
+
+        with patch.object(
+            Environment, "compile", autospec=True, side_effect=Environment.compile
+        ) as compile:
+            self.assertEqual("bar", configuration.render({"foo": "bar"}))
+            self.assertEqual(
+                "baz",
+                Configuration.objects.get(pk=configuration.pk).render({"foo": "baz"}),
+            )
+            self.assertEqual(1, compile.call_count)
+
+            # Changed templates are compiled again, saved or not
+            configuration.template = "{{ foo }}!"
+            self.assertEqual("bar!", configuration.render({"foo": "bar"}))
+            configuration.save()
+            self.assertEqual("bar!", configuration.render({"foo": "bar"}))
+            self.assertEqual(3, compile.call_count)
+
+    def test_get_template_include(self):
+        included = Configuration.objects.create(name="included", template="foo")
+        main = Configuration.objects.create(
+            name="main", template="{% include_configuration 'included' %}"
+        )
+        self.assertEqual("foo", main.render({}))
+
+        # Included templates are loaded again once updated
+        included.template = "bar"
+        included.save()
+        self.assertEqual("bar", main.render({}))
+
+    def test_get_template_email(self):
+        email = Email.objects.create(
+            name="test", subject="{{ foo }}", template="{{ foo }}!"
+        )
+        self.assertEqual(("bar", "bar!"), email.render({"foo": "bar"}))
+        self.assertIsNot(get_template(email), get_template(email, attribute="subject"))
+
+    def test_bytecode_cache(self):
+        with tempfile.TemporaryDirectory() as directory, override_settings(
+            JINJA2_BYTECODE_CACHE=directory
+        ):
+            configuration = Configuration.objects.create(
+                name="test", template="{{ foo }}"
+            )
+            self.assertEqual("bar", configuration.render({"foo": "bar"}))
+
+            # Another process would find the compiled template in the cache
+            with patch(
+                "peering_manager.jinja2.environment._templates", {}
+            ), patch.object(Environment, "compile") as compile:
+                self.assertEqual("baz", configuration.render({"foo": "baz"}))
+            compile.assert_not_called()
+
+            # Environments with other options do not share the compiled template
+            configuration.template = "{% if foo %}\n{{ foo }}\n{% endif %}"
+            configuration.save()
+            self.assertEqual("\nbar\n", configuration.render({"foo": "bar"}))
+            configuration.jinja2_trim = True
+            configuration.save()
+            with patch("peering_manager.jinja2.environment._templates", {}):
+                self.assertEqual("bar\n", configuration.render({"foo": "bar"}))
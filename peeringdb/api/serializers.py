@@ -221,4 +221,4 @@ class NetworkIXLanSerializer(serializers.ModelSerializer):
 class SynchronizationSerializer(serializers.ModelSerializer):
     class Meta:
         model = Synchronization
-        fields = ["id", "time", "created", "updated", "deleted"]
+        fields = ["id", "time", "created", "updated", "deleted", "statistics"]
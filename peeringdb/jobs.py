@@ -17,6 +17,13 @@ def synchronize(job_result):
 
     api = PeeringDB()
     last_sync = api.get_last_sync_time()
+    checkpoint = api.get_checkpoint()
+    if checkpoint:
+        job_result.log(
+            f"Resuming synchronization started at {checkpoint.time}",
+            level_choice=LogLevel.INFO,
+            logger=logger,
+        )
     synchronization = api.update_local_database(last_sync)
 
     if not synchronization:
@@ -39,4 +46,13 @@ def synchronize(job_result):
         logger=logger,
     )
 
+    for namespace, statistics in (synchronization.statistics or {}).items():
+        job_result.log(
+            f"{namespace}: fetched {statistics['bytes']} bytes in {statistics['fetch_time']}s, "
+            f"parsed {statistics['parsed']} objects, wrote {statistics['written']}, "
+            f"rejected {statistics['rejected']}, database time {statistics['database_time']}s",
+            level_choice=LogLevel.INFO,
+            logger=logger,
+        )
+
     job_result.mark_completed("Synchronization finished.", logger=logger)
@@ -1,4 +1,4 @@
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
 
 from extras.models import JobResult
 from peering.models import AutonomousSystem
@@ -14,6 +14,18 @@ class Command(BaseCommand):
         parser.add_argument(
             "-f", "--flush", action="store_true", help="Remove cached PeeringDB data"
         )
+        parser.add_argument(
+            "-r",
+            "--restart",
+            action="store_true",
+            help="Do not resume an interrupted synchronization, start over instead.",
+        )
+        parser.add_argument(
+            "-s",
+            "--snapshot",
+            metavar="DIRECTORY",
+            help="Import PeeringDB data from JSON files found in the given directory instead of using the API.",
+        )
         parser.add_argument(
             "-t",
             "--tasks",
@@ -28,28 +40,51 @@ class Command(BaseCommand):
         if options["flush"]:
             if not quiet:
                 self.stdout.write("[*] Removing cached data ... ", ending="")
-            api.clear_local_database()
+            elapsed = api.clear_local_database()
             if not quiet:
-                self.stdout.write("done", self.style.SUCCESS)
+                self.stdout.write(f"done ({elapsed:.2f}s)", self.style.SUCCESS)
             return
 
-        if options["tasks"]:
+        if options["snapshot"]:
+            if not quiet:
+                self.stdout.write(
+                    f"[*] Importing data from {options['snapshot']} ... ", ending=""
+                )
+            if not api.import_local_snapshot(options["snapshot"]):
+                if not quiet:
+                    self.stdout.write("failed", self.style.ERROR)
+                raise CommandError(
+                    f"No PeeringDB snapshot files found in {options['snapshot']}."
+                )
+            if not quiet:
+                self.stdout.write("done", self.style.SUCCESS)
+        elif options["tasks"]:
+            if options["restart"]:
+                api.delete_checkpoints()
             job = JobResult.enqueue_job(
                 synchronize, "peeringdb.synchronize", Synchronization, None
             )
             if not quiet:
                 self.stdout.write(self.style.SUCCESS(f"task #{job.id}"))
+            return
         else:
+            checkpoint = api.get_checkpoint()
+            if checkpoint and not options["restart"] and not quiet:
+                self.stdout.write(
+                    f"[*] Resuming synchronization started at {checkpoint.time}"
+                )
             if not quiet:
                 self.stdout.write("[*] Caching data locally ... ", ending="")
-            api.update_local_database(api.get_last_sync_time())
+            api.update_local_database(
+                api.get_last_sync_time(), resume=not options["restart"]
+            )
             if not quiet:
                 self.stdout.write("done", self.style.SUCCESS)
 
-            self.stdout.write("[*] Updating AS details")
-            for autonomous_system in AutonomousSystem.objects.defer("prefixes"):
-                if not quiet:
-                    self.stdout.write(f"  - AS{autonomous_system.asn} ... ", ending="")
-                autonomous_system.synchronize_with_peeringdb()
-                if not quiet:
-                    self.stdout.write("done", self.style.SUCCESS)
+        self.stdout.write("[*] Updating AS details")
+        for autonomous_system in AutonomousSystem.objects.defer("prefixes"):
+            if not quiet:
+                self.stdout.write(f"  - AS{autonomous_system.asn} ... ", ending="")
+            autonomous_system.synchronize_with_peeringdb()
+            if not quiet:
+                self.stdout.write("done", self.style.SUCCESS)
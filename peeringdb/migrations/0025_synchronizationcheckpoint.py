@@ -0,0 +1,37 @@
+# Generated by Django 4.0.10 on 2026-10-18 21:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("peeringdb", "0024_facility_status_dashboard_and_more"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SynchronizationCheckpoint",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("time", models.DateTimeField()),
+                ("since", models.PositiveIntegerField()),
+                ("namespace", models.CharField(blank=True, max_length=10)),
+                ("last_id", models.PositiveIntegerField(blank=True, null=True)),
+                ("created", models.PositiveIntegerField(default=0)),
+                ("updated", models.PositiveIntegerField(default=0)),
+                ("deleted", models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                "ordering": ["-time"],
+            },
+        ),
+    ]
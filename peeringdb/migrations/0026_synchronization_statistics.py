@@ -0,0 +1,18 @@
+# Generated by Django 4.0.10 on 2026-10-18 21:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("peeringdb", "0025_synchronizationcheckpoint"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="synchronization",
+            name="statistics",
+            field=models.JSONField(blank=True, editable=False, null=True),
+        ),
+    ]
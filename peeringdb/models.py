@@ -540,9 +540,34 @@ class Synchronization(models.Model):
     created = models.PositiveIntegerField()
     updated = models.PositiveIntegerField()
     deleted = models.PositiveIntegerField()
+    statistics = models.JSONField(blank=True, null=True, editable=False)
 
     class Meta:
         ordering = ["-time"]
 
     def __str__(self):
         return f"Synced {(self.created + self.deleted + self.updated)} objects at {self.time}"
+
+
+class SynchronizationCheckpoint(models.Model):
+    """
+    Progress of a synchronization committing its changes in several transactions.
+
+    It is used to resume an interrupted synchronization: `namespace` is the
+    namespace being synchronized (empty once all of them are) and `last_id` is the
+    ID of the last object committed for it.
+    """
+
+    time = models.DateTimeField()
+    since = models.PositiveIntegerField()
+    namespace = models.CharField(max_length=10, blank=True)
+    last_id = models.PositiveIntegerField(blank=True, null=True)
+    created = models.PositiveIntegerField(default=0)
+    updated = models.PositiveIntegerField(default=0)
+    deleted = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ["-time"]
+
+    def __str__(self):
+        return f"Synchronization started at {self.time} at {self.namespace or 'end'}"
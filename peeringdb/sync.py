@@ -1,16 +1,34 @@
+import bz2
+import gzip
 import logging
+import lzma
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from datetime import datetime
+from functools import lru_cache
+from itertools import chain
+from pathlib import Path
 
 import requests
-from cacheops import invalidate_model
+from cacheops import invalidate_all, invalidate_model
 from django.conf import settings
 from django.core.exceptions import FieldDoesNotExist, ValidationError
-from django.db import transaction
+from django.db import IntegrityError, connections, models, transaction
+from django.db.models import Q
 from django.db.utils import DEFAULT_DB_ALIAS
 from django.utils import timezone
+from prometheus_client import Counter, Histogram
+from requests.adapters import HTTPAdapter
 
 from net.models import Connection
+from peering.models import AutonomousSystem
 from peering.models import InternetExchange as IXP
 from utils.enums import ObjectChangeAction
+from utils.functions import chunked, get_json, iterate_json_array
 
 from .models import (
     Facility,
@@ -24,6 +42,7 @@ from .models import (
     NetworkIXLan,
     Organization,
     Synchronization,
+    SynchronizationCheckpoint,
 )
 
 # Order matters for caching data locally
@@ -40,17 +59,132 @@ NAMESPACES = {
     "poc": NetworkContact,
 }
 
+# Statistics recorded for each namespace during a synchronization
+STATISTICS = ["fetch_time", "bytes", "parsed", "written", "rejected", "database_time"]
+
+sync_fetch_seconds = Histogram(
+    "peeringdb_sync_fetch_seconds",
+    "Time spent downloading a PeeringDB namespace",
+    ["namespace"],
+)
+sync_database_seconds = Histogram(
+    "peeringdb_sync_database_seconds",
+    "Time spent validating and writing objects of a PeeringDB namespace",
+    ["namespace"],
+)
+sync_bytes = Counter(
+    "peeringdb_sync_bytes",
+    "Number of bytes downloaded for a PeeringDB namespace",
+    ["namespace"],
+)
+sync_rows = Counter(
+    "peeringdb_sync_rows",
+    "Number of objects of a PeeringDB namespace parsed, written or rejected",
+    ["namespace", "result"],
+)
+
+# Fields which are never synchronized
+IGNORED_FIELDS = ["created", "updated", "status"]
+
+# Model fields and Python types of values given by the API which do not need to be
+# converted before being validated
+TYPED_FIELDS = [
+    (models.BooleanField, (bool,)),
+    (models.IntegerField, (int,)),
+    (models.FloatField, (int, float)),
+]
+
+# Maximum number of IDs to send in a single filter parameter of a request
+SCOPE_BATCH_SIZE = 150
+
+# Size of the chunks (in bytes) to read when streaming responses or files
+STREAM_CHUNK_SIZE = 64 * 1024
+
+# Supported extensions for snapshot files and functions to open them
+SNAPSHOT_EXTENSIONS = {
+    ".json": open,
+    ".json.gz": gzip.open,
+    ".json.bz2": bz2.open,
+    ".json.xz": lzma.open,
+}
+
 logger = logging.getLogger("peering.manager.peeringdb")
 
 
+@lru_cache(maxsize=None)
+def get_http_session():
+    """
+    Returns the HTTP session shared by all requests sent to PeeringDB in the
+    current process. Connections are kept alive and pooled so that they can be
+    reused by concurrent and subsequent requests.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=1,
+        pool_maxsize=max(settings.PEERINGDB_SYNC_CONCURRENCY, 1),
+    )
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
 class PeeringDB(object):
     """
     Class used to interact with the PeeringDB API.
     """
 
-    def lookup(self, namespace, search):
+    def __init__(self):
+        self._tracked_ids = {}
+        self._checkpoint = None
+        self._field_plans = {}
+        self._validation_plans = {}
+        self._statistics_lock = threading.Lock()
+        self._reset_statistics()
+
+    def _reset_statistics(self):
+        self._statistics = {n: dict.fromkeys(STATISTICS, 0) for n in NAMESPACES}
+
+    def _add_statistics(self, model, **values):
         """
-        Sends a get request to the API given a namespace and some parameters.
+        Adds values to the statistics of the namespace of a model (or of a
+        namespace given by its name).
+        """
+        namespace = (
+            model
+            if isinstance(model, str)
+            else next(n for n, m in NAMESPACES.items() if m is model)
+        )
+        with self._statistics_lock:
+            for key, value in values.items():
+                self._statistics[namespace][key] += value
+
+    def get_statistics(self):
+        """
+        Returns the statistics of the last synchronization, per namespace.
+        """
+        return {
+            namespace: {
+                key: round(value, 3) if isinstance(value, float) else value
+                for key, value in values.items()
+            }
+            for namespace, values in self._statistics.items()
+        }
+
+    def _export_statistics(self):
+        """
+        Exports the statistics of the last synchronization as Prometheus metrics.
+        """
+        for namespace, values in self._statistics.items():
+            sync_fetch_seconds.labels(namespace).observe(values["fetch_time"])
+            sync_database_seconds.labels(namespace).observe(values["database_time"])
+            sync_bytes.labels(namespace).inc(values["bytes"])
+            for result in ("parsed", "written", "rejected"):
+                sync_rows.labels(namespace, result).inc(values[result])
+
+    def _prepare_request(self, namespace, search):
+        """
+        Returns the URL and the arguments of a get request to the API given a
+        namespace and some parameters.
         """
         # Enforce trailing slash and add namespace
         api_url = f"{settings.PEERINGDB_API.strip('/')}/{namespace}"
@@ -78,9 +212,20 @@ class PeeringDB(object):
             )
             q["auth"] = (settings.PEERINGDB_USERNAME, settings.PEERINGDB_PASSWORD)
 
-        # Make the request
         logger.debug(f"calling api: {api_url} | {search}")
-        response = requests.get(api_url, **q, proxies=settings.HTTP_PROXIES)
+        return api_url, q
+
+    def _request(self, namespace, search, stream=False):
+        """
+        Sends a get request to the API given a namespace and some parameters.
+
+        The response is returned if the request is successful, `None` is returned
+        otherwise.
+        """
+        api_url, q = self._prepare_request(namespace, search)
+        response = get_http_session().get(
+            api_url, **q, proxies=settings.HTTP_PROXIES, stream=stream
+        )
 
         try:
             response.raise_for_status()
@@ -88,12 +233,174 @@ class PeeringDB(object):
             logger.error(e)
             return None
 
-        return response.json()
+        return response
+
+    def lookup(self, namespace, search):
+        """
+        Sends a get request to the API given a namespace and some parameters and
+        returns the decoded JSON, `None` is returned if the request fails.
+
+        Responses are cached and revalidated, see `utils.functions.get_json()`.
+        """
+        api_url, q = self._prepare_request(namespace, search)
+        try:
+            return get_json(
+                api_url, session=get_http_session(), proxies=settings.HTTP_PROXIES, **q
+            )
+        except requests.exceptions.HTTPError as e:
+            logger.error(e)
+            return None
+
+    def download(self, namespace, search, path):
+        """
+        Sends a get request to the API given a namespace and some parameters and
+        writes the response body to a file.
+
+        The path to the file is returned if the request is successful, `None` is
+        returned otherwise.
+        """
+        start, size = time.monotonic(), 0
+        response = self._request(namespace, search, stream=True)
+        if response is None:
+            return None
+
+        with response, open(path, "wb") as f:
+            for chunk in response.iter_content(chunk_size=STREAM_CHUNK_SIZE):
+                f.write(chunk)
+                size += len(chunk)
+
+        self._add_statistics(namespace, fetch_time=time.monotonic() - start, bytes=size)
+        logger.debug(f"downloaded {namespace} to {path}")
+        return path
+
+    def _lookup_ids(self, namespace, parameter, values, field):
+        """
+        Returns the set of values of a field of the objects matching a filter on a
+        list of values. Requests are sent in batches to keep URLs short.
+
+        `None` is returned if one of the requests fails.
+        """
+        ids = set()
+        for batch in chunked(sorted(values), SCOPE_BATCH_SIZE):
+            search = {
+                parameter: ",".join(str(v) for v in batch),
+                "depth": 0,
+                "fields": field,
+            }
+            response = self.lookup(namespace, search)
+            if response is None:
+                return None
+            ids.update(o[field] for o in response["data"])
+        return ids
+
+    def get_sync_scope(self):
+        """
+        Returns the filters to use to only synchronize objects related to IX LANs
+        and networks used locally, as a dictionary mapping namespaces to lists of
+        searches. Namespaces without filters are synchronized fully.
+
+        IX LANs in the scope are the ones linked to IXPs and the ones where
+        affiliated autonomous systems are present. Networks in the scope are the
+        ones present on these IX LANs and the ones of all autonomous systems.
+        Objects related to IX LANs and networks which are not known locally yet are
+        retrieved fully.
+
+        `None` is returned if the scope cannot be retrieved from the API.
+        """
+        ixlan_ids = set(
+            IXP.objects.filter(peeringdb_ixlan__isnull=False).values_list(
+                "peeringdb_ixlan", flat=True
+            )
+        )
+        affiliated_ixlan_ids = self._lookup_ids(
+            "netixlan",
+            "asn__in",
+            AutonomousSystem.objects.filter(affiliated=True).values_list(
+                "asn", flat=True
+            ),
+            "ixlan_id",
+        )
+        if affiliated_ixlan_ids is None:
+            return None
+        ixlan_ids |= affiliated_ixlan_ids
+
+        ix_ids = self._lookup_ids("ixlan", "id__in", ixlan_ids, "ix_id")
+        ixlan_net_ids = self._lookup_ids(
+            "netixlan", "ixlan_id__in", ixlan_ids, "net_id"
+        )
+        net_ids = self._lookup_ids(
+            "net",
+            "asn__in",
+            AutonomousSystem.objects.values_list("asn", flat=True),
+            "id",
+        )
+        if ix_ids is None or ixlan_net_ids is None or net_ids is None:
+            return None
+        net_ids |= ixlan_net_ids
 
-    def record_last_sync(self, time, changes):
+        def searches(parameter, ids, model):
+            # Objects entering the scope must be retrieved fully, not only if they
+            # changed since the last synchronization
+            known_ids = set(model.objects.values_list("pk", flat=True))
+            return [
+                {parameter: ",".join(str(i) for i in batch)}
+                for batch in chunked(sorted(ids & known_ids), SCOPE_BATCH_SIZE)
+            ] + [
+                {parameter: ",".join(str(i) for i in batch), "since": 0}
+                for batch in chunked(sorted(ids - known_ids), SCOPE_BATCH_SIZE)
+            ]
+
+        return {
+            "ix": searches("id__in", ix_ids, InternetExchange),
+            "ixfac": searches("ix_id__in", ix_ids, InternetExchange),
+            "ixlan": searches("id__in", ixlan_ids, IXLan),
+            "ixpfx": searches("ixlan_id__in", ixlan_ids, IXLan),
+            "net": searches("id__in", net_ids, Network),
+            "netfac": searches("net_id__in", net_ids, Network),
+            "netixlan": searches("ixlan_id__in", ixlan_ids, IXLan),
+            "poc": searches("net_id__in", net_ids, Network),
+        }
+
+    def download_namespaces(self, search, directory, scope=None):
         """
-        Saves the last synchronization details (number of objects and time) for later
-        use (and logs).
+        Downloads all namespaces to files in the given directory. Downloads are run
+        concurrently, up to `PEERINGDB_SYNC_CONCURRENCY` at the same time.
+
+        If a `scope` is given, as returned by `get_sync_scope()`, one request is
+        sent for each of the searches of a namespace instead of downloading it
+        fully.
+
+        A dictionary mapping each namespace to its list of files is returned, a
+        file is `None` if it could not be downloaded.
+        """
+        if scope is None:
+            scope = {}
+
+        with ThreadPoolExecutor(
+            max_workers=max(settings.PEERINGDB_SYNC_CONCURRENCY, 1)
+        ) as executor:
+            futures = {
+                namespace: [
+                    executor.submit(
+                        self.download,
+                        namespace,
+                        {**search, **s},
+                        Path(directory) / f"{namespace}-{i}.json",
+                    )
+                    for i, s in enumerate(scope.get(namespace, [{}]))
+                ]
+                for namespace in NAMESPACES
+            }
+
+        return {
+            namespace: [future.result() for future in f]
+            for namespace, f in futures.items()
+        }
+
+    def record_last_sync(self, time, changes, statistics=None):
+        """
+        Saves the last synchronization details (number of objects, time and
+        optional statistics) for later use (and logs).
         """
         last_sync = None
         changes_number = changes["created"] + changes["updated"] + changes["deleted"]
@@ -105,6 +412,7 @@ class PeeringDB(object):
                 "created": changes["created"],
                 "updated": changes["updated"],
                 "deleted": changes["deleted"],
+                "statistics": statistics,
             }
 
             last_sync = Synchronization(**values)
@@ -139,42 +447,150 @@ class PeeringDB(object):
 
         return int(last_sync_time)
 
-    def _process_field(self, model, foreign_keys, obj, name, value):
+    def get_checkpoint(self):
+        """
+        Returns the checkpoint left by an interrupted synchronization, if any.
+        """
+        try:
+            return SynchronizationCheckpoint.objects.latest("time")
+        except SynchronizationCheckpoint.DoesNotExist:
+            pass
+
+        return None
+
+    def delete_checkpoints(self):
+        """
+        Deletes checkpoints to make sure the next synchronization starts over.
+        """
+        SynchronizationCheckpoint.objects.all().delete()
+
+    def _save_checkpoint(self, changes, namespace=None, last_id=None):
         """
-        Sets the value for a single field of an object.
+        Adds changes to the current checkpoint and saves the position of the
+        synchronization with it.
+        """
+        self._checkpoint.created += changes[0]
+        self._checkpoint.updated += changes[1]
+        self._checkpoint.deleted += changes[2]
+        if namespace is not None:
+            self._checkpoint.namespace = namespace
+        self._checkpoint.last_id = last_id
+        self._checkpoint.save()
+
+    def _compile_field(self, model, name):
+        """
+        Returns how to set a field given by the API on an object, as a tuple made of
+        the attribute name and a function to convert non-null values (or `None`).
+        `None` is returned if the field must be ignored.
         """
         # Fields not to process
-        if name in ["created", "updated", "status"] or (
-            hasattr(obj, "ignored_fields") and name in model.ignored_fields
-        ):
-            return
+        if name in IGNORED_FIELDS or name in getattr(model, "ignored_fields", []):
+            return None
 
-        stop_processing = False
         # If the field looks like one of the FK
-        for f in foreign_keys:
-            if f in name:
-                # The field is the FK ID so set it
-                if name == f"{f}_id":
-                    setattr(obj, name, value)
-                # If the field starts with a foreign key name but is not
-                # suffixed by _id, just ignore it (it can be its name or
-                # something else)
-                stop_processing = True
-
-        if stop_processing:
-            return
+        foreign_keys = [f.name for f in self._get_foreign_keys(model) if f.name in name]
+        if foreign_keys:
+            # The field is the FK ID so set it, if it starts with a foreign key name
+            # but is not suffixed by _id, just ignore it (it can be its name or
+            # something else)
+            if any(name == f"{f}_id" for f in foreign_keys):
+                return (name, None)
+            return None
 
         try:
-            # Latitude and longitude are special decimal values that must be
-            # casted to string before using them
-            if name in ["latitude", "longitude"] and value is not None:
-                value = str(value)
-
-            setattr(obj, name, value)
+            field = model._meta.get_field(name)
         except FieldDoesNotExist:
-            logger.error(
+            field = None
+        if field is None or not field.concrete:
+            logger.debug(
                 f"field: {name} not in model: {model._meta.verbose_name.lower()}"
             )
+            return None
+
+        # Latitude and longitude are special decimal values that must be casted to
+        # string before using them
+        if name in ["latitude", "longitude"]:
+            return (field.attname, str)
+
+        return (field.attname, None)
+
+    def _set_fields(self, model, obj, data):
+        """
+        Sets the values of the fields of an object using the data given by the API.
+
+        How to set each field is compiled once per model and field name.
+        """
+        plan = self._field_plans.setdefault(model, {})
+
+        for name, value in data.items():
+            try:
+                target = plan[name]
+            except KeyError:
+                target = plan[name] = self._compile_field(model, name)
+
+            if target is None:
+                continue
+
+            attname, convert = target
+            if convert is not None and value is not None:
+                value = convert(value)
+            setattr(obj, attname, value)
+
+    def _clean_fields(self, model, obj, exclude=()):
+        """
+        Validates the fields of an object, a lightweight version of `full_clean()`.
+
+        Values which are already typed by the API (booleans and numbers) are only
+        checked against field validators instead of being converted and validated
+        again. Model level and unique validations are not made.
+        """
+        try:
+            plan = self._validation_plans[model]
+        except KeyError:
+            plan = self._validation_plans[model] = [
+                (
+                    field,
+                    next(
+                        (
+                            types
+                            for field_class, types in TYPED_FIELDS
+                            if isinstance(field, field_class) and not field.choices
+                        ),
+                        (),
+                    ),
+                )
+                for field in model._meta.concrete_fields
+            ]
+
+        errors = {}
+        for field, types in plan:
+            if field.name in exclude:
+                continue
+
+            raw_value = getattr(obj, field.attname)
+            # Skip validation for empty fields with blank=True, like full_clean()
+            if field.blank and raw_value in field.empty_values:
+                continue
+
+            try:
+                if type(raw_value) in types:
+                    field.run_validators(raw_value)
+                else:
+                    setattr(obj, field.attname, field.clean(raw_value, obj))
+            except ValidationError as e:
+                errors[field.name] = e.error_list
+
+        if errors:
+            raise ValidationError(errors)
+
+    def _get_foreign_keys(self, model):
+        """
+        Returns the fields of a model which are foreign keys, including reverse
+        relations.
+        """
+        return [
+            f for f in model._meta.get_fields() if f.get_internal_type() == "ForeignKey"
+        ]
 
     def _process_object(self, model, data):
         """
@@ -201,65 +617,232 @@ class PeeringDB(object):
             action = ObjectChangeAction.CREATE
             local_object = model()
 
-        # Make a list of foreign key field names
-        fk = [
-            f.name
-            for f in model._meta.get_fields()
-            if f.get_internal_type() == "ForeignKey"
-        ]
-
         # Set the value for each field
-        for field_name, field_value in data.items():
-            self._process_field(model, fk, local_object, field_name, field_value)
+        self._set_fields(model, local_object, data)
 
         return local_object, action
 
-    def _fix_related_objects(self):
+    def _fix_related_objects(self, netixlan_ids, ixlan_ids):
         """
         Fixes main connections and IXPs objects linking them with PeeringDB's if
         possible.
+
+        Only objects that can be affected by changes made to the given network IX
+        LANs and IX LANs, or that are not linked yet, are looked at. All objects are
+        looked at if IDs are `None`. Links are computed with a single query per
+        model and only objects with a different link are updated.
         """
-        for c in Connection.objects.all():
-            c.link_to_peeringdb()
-        for i in IXP.objects.all():
-            i.link_to_peeringdb()
 
-    def synchronize_objects(self, last_sync, namespace, model):
+        def host(address):
+            return address.ip if hasattr(address, "ip") else address
+
+        connections = list(
+            Connection.objects.filter(
+                Q(ipv6_address__isnull=False) | Q(ipv4_address__isnull=False)
+            ).only(
+                "ipv6_address",
+                "ipv4_address",
+                "peeringdb_netixlan",
+                "internet_exchange_point",
+            )
+        )
+
+        # Index PeeringDB records which have IP addresses used by connections
+        netixlans, ambiguous = {}, set()
+        for netixlan in NetworkIXLan.objects.filter(
+            Q(
+                ipaddr6__in=[
+                    str(host(c.ipv6_address)) for c in connections if c.ipv6_address
+                ]
+            )
+            | Q(
+                ipaddr4__in=[
+                    str(host(c.ipv4_address)) for c in connections if c.ipv4_address
+                ]
+            )
+        ).only("ipaddr6", "ipaddr4"):
+            key = (host(netixlan.ipaddr6), host(netixlan.ipaddr4))
+            if key in netixlans:
+                ambiguous.add(key)
+            netixlans[key] = netixlan.pk
+
+        linked_connections, affected_ixps = [], set()
+        for connection in connections:
+            key = (host(connection.ipv6_address), host(connection.ipv4_address))
+            netixlan_id = netixlans.get(key)
+            if (
+                netixlan_ids is not None
+                and connection.peeringdb_netixlan_id is not None
+                and connection.peeringdb_netixlan_id not in netixlan_ids
+                and netixlan_id not in netixlan_ids
+            ):
+                continue
+
+            affected_ixps.add(connection.internet_exchange_point_id)
+            if (
+                netixlan_id is not None
+                and key not in ambiguous
+                and netixlan_id != connection.peeringdb_netixlan_id
+            ):
+                connection.peeringdb_netixlan_id = netixlan_id
+                linked_connections.append(connection)
+                logger.debug(
+                    f"linked connection {connection} (pk: {connection.pk}) to peeringdb"
+                )
+
+        if linked_connections:
+            Connection.objects.bulk_update(linked_connections, ["peeringdb_netixlan"])
+            invalidate_model(Connection)
+
+        # IXPs are linked if all their connections point towards the same IX LAN
+        ixlans_by_ixp = defaultdict(set)
+        for ixp_id, ixlan_id in Connection.objects.filter(
+            internet_exchange_point__isnull=False, peeringdb_netixlan__isnull=False
+        ).values_list("internet_exchange_point", "peeringdb_netixlan__ixlan"):
+            ixlans_by_ixp[ixp_id].add(ixlan_id)
+
+        linked_ixps = []
+        for ixp in IXP.objects.only("peeringdb_ixlan"):
+            if (
+                ixlan_ids is not None
+                and ixp.peeringdb_ixlan_id is not None
+                and ixp.peeringdb_ixlan_id not in ixlan_ids
+                and ixp.pk not in affected_ixps
+            ):
+                continue
+
+            ixlans = ixlans_by_ixp.get(ixp.pk, set())
+            if len(ixlans) == 1 and ixp.peeringdb_ixlan_id not in ixlans:
+                ixp.peeringdb_ixlan_id = ixlans.pop()
+                linked_ixps.append(ixp)
+                logger.debug(f"linked ixp {ixp} (pk: {ixp.pk}) to peeringdb")
+
+        if linked_ixps:
+            IXP.objects.bulk_update(linked_ixps, ["peeringdb_ixlan"])
+            invalidate_model(IXP)
+
+    def _check_foreign_keys(self, model, objects):
+        """
+        Returns the objects for which all foreign keys point to existing rows.
+
+        Instead of letting `full_clean()` run one query per foreign key and per
+        object, a single query is made for each foreign key of the model. Rejected
+        objects are left out of the statistics, see `_bulk_process_chunk()`.
         """
-        Synchronizes all the objects of a namespace of the PeeringDB to the
-        local database. This function is meant to be run regularly to update
-        the local database with the latest changes.
+        valid = objects
+        for field in [f for f in model._meta.concrete_fields if f.many_to_one]:
+            ids = {getattr(o, field.attname) for o in valid}
+            ids.discard(None)
+            existing = set(
+                field.related_model.objects.filter(pk__in=ids).values_list(
+                    "pk", flat=True
+                )
+            )
 
-        If the object already exists locally it will be updated and no new
-        entry will be created.
+            checked = []
+            for o in valid:
+                value = getattr(o, field.attname)
+                if value is None or value in existing:
+                    checked.append(o)
+                else:
+                    logger.error(
+                        f"error validating id: {o.pk} for model: {model._meta.verbose_name.lower()}\n{field.name} #{value} does not exist"
+                    )
+            valid = checked
 
-        If the object is marked as deleted in the PeeringDB, it will be deleted
-        locally as well.
+        return valid
 
-        This function returns the number of objects that have been successfully
-        synchronized to the local database.
+    def _bulk_process_chunk(self, model, chunk, existing_ids):
         """
-        created, updated, deleted = 0, 0, 0
+        Synchronizes a chunk of objects using bulk queries.
+
+        Objects are validated without hitting the database, foreign keys are checked
+        with one query per field and objects are then written with a single query
+        for each kind of change (create, update and delete).
+        """
+        fk = [f.name for f in model._meta.concrete_fields if f.many_to_one]
+        to_create, to_update, to_delete = [], [], []
+        fields_to_update = set()
+
+        # Rejected objects are counted once the chunk is written, it is processed
+        # again one object at a time if it cannot be
+        rejected = 0
+
+        for data in chunk:
+            if "deleted" == data["status"]:
+                # Only remove objects that we actually know about
+                if data["id"] in existing_ids:
+                    to_delete.append(data["id"])
+                continue
+
+            local_object = model()
+            self._set_fields(model, local_object, data)
 
-        # Get all network changes since the last sync
-        search = {"since": last_sync, "depth": 0}
-        result = self.lookup(namespace, search)
+            try:
+                # Foreign keys are checked for the whole chunk at once and unique
+                # constraints are left to the database
+                self._clean_fields(model, local_object, exclude=fk)
+            except ValidationError as e:
+                logger.error(
+                    f"error validating id: {local_object.id} for model: {model._meta.verbose_name.lower()}\n{e}"
+                )
+                rejected += 1
+                continue
 
-        if not result:
-            return (created, updated, deleted)
+            if local_object.pk in existing_ids:
+                to_update.append(local_object)
+                fields_to_update.update(data.keys())
+            else:
+                to_create.append(local_object)
+
+        checked = len(to_create) + len(to_update)
+        to_create = self._check_foreign_keys(model, to_create)
+        to_update = self._check_foreign_keys(model, to_update)
+        rejected += checked - len(to_create) - len(to_update)
+
+        # Only update fields given by PeeringDB, leave others untouched
+        update_fields = [
+            f.name
+            for f in model._meta.concrete_fields
+            if not f.primary_key and f.attname in fields_to_update
+        ]
+
+        if to_delete:
+            model.objects.filter(pk__in=to_delete).delete()
+            existing_ids.difference_update(to_delete)
+        if to_update and update_fields:
+            model.objects.bulk_update(to_update, update_fields)
+        if to_create:
+            model.objects.bulk_create(to_create)
+            existing_ids.update(o.pk for o in to_create)
+        self._add_statistics(model, rejected=rejected)
+
+        logger.debug(
+            f"synchronized {len(to_create)} created, {len(to_update)} updated, {len(to_delete)} deleted {model._meta.verbose_name_plural.lower()} from peeringdb"
+        )
 
-        for data in result["data"]:
+        return (len(to_create), len(to_update), len(to_delete))
+
+    def _process_chunk(self, model, chunk):
+        """
+        Synchronizes a chunk of objects one by one.
+        """
+        created, updated, deleted = 0, 0, 0
+
+        for data in chunk:
             try:
                 local_object, action = self._process_object(model, data)
 
                 if action != ObjectChangeAction.DELETE:
                     # Save the local object
-                    local_object.full_clean()
+                    self._clean_fields(model, local_object)
+                    local_object.validate_unique()
                     local_object.save()
             except ValidationError as e:
                 logger.error(
                     f"error validating id: {local_object.id} for model: {model._meta.verbose_name.lower()}\n{e}"
                 )
+                self._add_statistics(model, rejected=1)
                 continue
 
             # Update counters
@@ -278,48 +861,340 @@ class PeeringDB(object):
 
         return (created, updated, deleted)
 
-    def update_local_database(self, last_sync):
+    def synchronize_namespace(self, model, objects, bulk=False):
+        """
+        Synchronizes the given PeeringDB objects, an iterable of dictionaries as
+        found in the `data` array of API responses, to the local database.
+
+        This function returns the number of objects that have been successfully
+        synchronized to the local database.
+        """
+        created, updated, deleted = 0, 0, 0
+        tracked_ids = self._tracked_ids.get(model)
+        # Commit each chunk along with the position of the synchronization
+        commit_chunks = (
+            self._checkpoint is not None and settings.PEERINGDB_SYNC_COMMIT == "chunk"
+        )
+
+        if bulk:
+            existing_ids = set(model.objects.values_list("pk", flat=True))
+
+        for chunk in chunked(objects, settings.PEERINGDB_SYNC_CHUNK_SIZE):
+            start = time.monotonic()
+            if tracked_ids is not None:
+                tracked_ids.update(data["id"] for data in chunk)
+
+            with transaction.atomic() if commit_chunks else nullcontext():
+                if bulk:
+                    try:
+                        with transaction.atomic():
+                            changes = self._bulk_process_chunk(
+                                model, chunk, existing_ids
+                            )
+                    except IntegrityError as e:
+                        logger.warning(
+                            f"unable to bulk synchronize {model._meta.verbose_name_plural.lower()}, falling back to one by one processing\n{e}"
+                        )
+                        changes = self._process_chunk(model, chunk)
+                        existing_ids = set(model.objects.values_list("pk", flat=True))
+                else:
+                    changes = self._process_chunk(model, chunk)
+                if commit_chunks:
+                    self._save_checkpoint(changes, last_id=chunk[-1]["id"])
+
+            created += changes[0]
+            updated += changes[1]
+            deleted += changes[2]
+            self._add_statistics(
+                model,
+                parsed=len(chunk),
+                written=sum(changes),
+                database_time=time.monotonic() - start,
+            )
+
+        if bulk:
+            # Bulk queries do not trigger cache invalidation
+            invalidate_model(model)
+
+        return (created, updated, deleted)
+
+    def _update_local_database(self, time_of_sync, get_objects, bulk, checkpoint=None):
+        """
+        Synchronizes all namespaces, in order, using the objects returned by calling
+        `get_objects` with each namespace.
+
+        If a `checkpoint` is given and the `PEERINGDB_SYNC_COMMIT` setting is set,
+        changes are committed after each namespace or chunk of objects and the
+        checkpoint is saved along with them. A checkpoint which is already saved is
+        used to resume an interrupted synchronization.
+        """
+        namespaces = list(NAMESPACES)
+        if checkpoint is not None and (
+            checkpoint.pk or settings.PEERINGDB_SYNC_COMMIT in ("namespace", "chunk")
+        ):
+            self._checkpoint = checkpoint
+        commit_namespaces = (
+            self._checkpoint is not None and settings.PEERINGDB_SYNC_COMMIT != "chunk"
+        )
+        if checkpoint is None:
+            checkpoint = SynchronizationCheckpoint(time=time_of_sync, since=0)
+
+        if checkpoint.pk:
+            logger.info(
+                f"resuming synchronization from {checkpoint.namespace or 'end'}"
+                f"{f' after #{checkpoint.last_id}' if checkpoint.last_id else ''}"
+            )
+            start = (
+                namespaces.index(checkpoint.namespace)
+                if checkpoint.namespace in namespaces
+                else len(namespaces)
+            )
+            # Objects synchronized before the interruption are unknown
+            self._tracked_ids = {}
+        else:
+            start = 0
+            checkpoint.namespace = namespaces[0]
+            # Keep track of objects that can change links with PeeringDB records
+            self._tracked_ids = {NetworkIXLan: set(), IXLan: set()}
+
+        # Without checkpoint, make a single transaction, avoid too much database
+        # commits (poor speed) and fail the whole synchronization if something goes
+        # wrong
+        try:
+            with transaction.atomic() if self._checkpoint is None else nullcontext():
+                # Try to sync objects
+                for i, namespace in enumerate(namespaces[start:], start=start):
+                    objects = iter(get_objects(namespace))
+                    last_id = checkpoint.last_id
+                    if (
+                        namespace == checkpoint.namespace
+                        and last_id
+                        and any(o["id"] == last_id for o in get_objects(namespace))
+                    ):
+                        # Skip objects committed before the interruption
+                        for o in objects:
+                            if o["id"] == last_id:
+                                break
+
+                    with transaction.atomic() if commit_namespaces else nullcontext():
+                        changes = self.synchronize_namespace(
+                            NAMESPACES[namespace], objects, bulk=bulk
+                        )
+                        if self._checkpoint is None:
+                            checkpoint.created += changes[0]
+                            checkpoint.updated += changes[1]
+                            checkpoint.deleted += changes[2]
+                        else:
+                            self._save_checkpoint(
+                                changes if commit_namespaces else (0, 0, 0),
+                                namespace=namespaces[i + 1]
+                                if i + 1 < len(namespaces)
+                                else "",
+                            )
+
+                with transaction.atomic():
+                    self._fix_related_objects(
+                        self._tracked_ids.get(NetworkIXLan),
+                        self._tracked_ids.get(IXLan),
+                    )
+
+                    objects_changes = {
+                        "created": checkpoint.created,
+                        "updated": checkpoint.updated,
+                        "deleted": checkpoint.deleted,
+                    }
+
+                    if checkpoint.pk:
+                        checkpoint.delete()
+
+                    self._export_statistics()
+
+                    # Save the last sync time
+                    return self.record_last_sync(
+                        time_of_sync, objects_changes, self.get_statistics()
+                    )
+        finally:
+            self._checkpoint = None
+
+    def update_local_database(self, last_sync, bulk=None, resume=True):
         """
         Updates the local database by synchronizing all PeeringDB API's namespaces
         that we are caring about.
+
+        If `bulk` is not set, the `PEERINGDB_SYNC_BULK` setting is used to decide if
+        objects must be written in batches.
+
+        If a previous synchronization was interrupted after committing some of its
+        changes, it is resumed from its checkpoint and `last_sync` is ignored, unless
+        `resume` is set to `False`.
+
+        If the `PEERINGDB_SYNC_SCOPED` setting is enabled, only objects within the
+        scope returned by `get_sync_scope()` are synchronized.
         """
-        # Set time of sync
-        time_of_sync = timezone.now()
-        list_of_changes = []
+        if bulk is None:
+            bulk = settings.PEERINGDB_SYNC_BULK
 
-        # Make a single transaction, avoid too much database commits (poor
-        # speed) and fail the whole synchronization if something goes wrong
-        with transaction.atomic():
-            # Try to sync objects
-            for namespace, object_type in NAMESPACES.items():
-                changes = self.synchronize_objects(last_sync, namespace, object_type)
-                list_of_changes.append(changes)
+        self._reset_statistics()
+        checkpoint = self.get_checkpoint()
+        if checkpoint and not resume:
+            self.delete_checkpoints()
+            checkpoint = None
 
-            self._fix_related_objects()
+        scope = None
+        if settings.PEERINGDB_SYNC_SCOPED:
+            scope = self.get_sync_scope()
+            if scope is None:
+                logger.error("unable to retrieve the synchronization scope")
+                return None
 
-        objects_changes = {
-            "created": sum(created for created, _, _ in list_of_changes),
-            "updated": sum(updated for _, updated, _ in list_of_changes),
-            "deleted": sum(deleted for _, _, deleted in list_of_changes),
-        }
+        if checkpoint:
+            # Fetch the same changes as the interrupted synchronization
+            last_sync, time_of_sync = checkpoint.since, checkpoint.time
+        else:
+            # Set time of sync
+            time_of_sync = timezone.now()
+            checkpoint = SynchronizationCheckpoint(time=time_of_sync, since=last_sync)
 
-        # Save the last sync time
-        return self.record_last_sync(time_of_sync, objects_changes)
+        # Download all namespaces concurrently to temporary files, then apply them
+        # one by one following the namespaces order
+        with tempfile.TemporaryDirectory() as directory:
+            paths = self.download_namespaces(
+                {"since": last_sync, "depth": 0}, directory, scope=scope
+            )
+            return self._update_local_database(
+                time_of_sync,
+                lambda namespace: chain.from_iterable(
+                    self.read_snapshot_file(p) for p in paths[namespace] if p
+                ),
+                bulk,
+                checkpoint=checkpoint,
+            )
+
+    def _find_snapshot_file(self, directory, namespace):
+        """
+        Returns the path to the snapshot file of a namespace, `None` if there is
+        none in the directory.
+        """
+        for extension in SNAPSHOT_EXTENSIONS:
+            path = Path(directory) / f"{namespace}{extension}"
+            if path.is_file():
+                return path
+        return None
+
+    def read_snapshot_file(self, path):
+        """
+        Yields the objects found in a snapshot file, a JSON file (optionally
+        compressed) with the same format as the one returned by the API.
+        """
+        path = Path(path)
+        try:
+            open_file = next(
+                o for e, o in SNAPSHOT_EXTENSIONS.items() if path.name.endswith(e)
+            )
+        except StopIteration:
+            raise ValueError(f"Unsupported snapshot file: {path}")
+
+        logger.debug(f"reading snapshot file: {path}")
+        with open_file(path, "rb") as f:
+            yield from iterate_json_array(
+                iter(lambda: f.read(STREAM_CHUNK_SIZE), b""), "data"
+            )
+
+    def import_local_snapshot(self, directory, bulk=True):
+        """
+        Updates the local database with objects found in snapshot files instead of
+        using the API. The directory must contain one file per namespace named after
+        it (e.g. `net.json`), files can be compressed with gzip, bzip2 or xz (e.g.
+        `net.json.gz`). Namespaces without a file are ignored.
+
+        The time of the synchronization is set to the modification time of the
+        oldest file, so that the next synchronization using the API will retrieve
+        changes made since the snapshot.
+        """
+        self._reset_statistics()
+        paths = {}
+        for namespace in NAMESPACES:
+            path = self._find_snapshot_file(directory, namespace)
+            if path:
+                paths[namespace] = path
+            else:
+                logger.warning(f"no snapshot file for {namespace} in {directory}")
+
+        if not paths:
+            return None
+
+        time_of_sync = datetime.fromtimestamp(
+            min(p.stat().st_mtime for p in paths.values()), tz=timezone.utc
+        )
+        return self._update_local_database(
+            time_of_sync,
+            lambda namespace: self.read_snapshot_file(paths[namespace])
+            if namespace in paths
+            else [],
+            bulk,
+        )
 
     def clear_local_database(self):
         """
         Deletes all data related to the local database. This can be used to get a
         fresh start.
+
+        All tables are emptied with a single `TRUNCATE` statement. As it cannot be
+        used on tables referenced by other ones, foreign keys pointing to PeeringDB
+        records (from connections and IXPs) are dropped before and created again
+        after it, all in the same transaction.
+
+        The time taken, in seconds, is returned.
         """
-        # Unlink main objects from PeeringDB's before emptying the local database
-        Connection.objects.filter(peeringdb_netixlan__isnull=False).update(
-            peeringdb_netixlan=None
-        )
-        IXP.objects.filter(peeringdb_ixlan__isnull=False).update(peeringdb_ixlan=None)
+        start = time.monotonic()
+        models_to_clear = [
+            *NAMESPACES.values(),
+            Synchronization,
+            SynchronizationCheckpoint,
+        ]
+        references = [
+            r.remote_field
+            for m in models_to_clear
+            for r in m._meta.related_objects
+            if r.related_model not in models_to_clear
+        ]
 
-        # The use of reversed is important to avoid fk issues
-        for model in reversed(list(NAMESPACES.values())):
-            model.objects.all()._raw_delete(using=DEFAULT_DB_ALIAS)
-            invalidate_model(model)
-        Synchronization.objects.all()._raw_delete(using=DEFAULT_DB_ALIAS)
-        invalidate_model(Synchronization)
+        with transaction.atomic():
+            # Unlink main objects from PeeringDB's before emptying the local database
+            for field in references:
+                field.model.objects.filter(**{f"{field.name}__isnull": False}).update(
+                    **{field.name: None}
+                )
+
+            with connections[DEFAULT_DB_ALIAS].schema_editor() as editor:
+                # Pending checks of deferred constraints prevent tables from being
+                # altered
+                editor.execute("SET CONSTRAINTS ALL IMMEDIATE")
+                for field in references:
+                    for name in editor._constraint_names(
+                        field.model, [field.column], foreign_key=True
+                    ):
+                        editor.execute(editor._delete_fk_sql(field.model, name))
+
+                editor.execute(
+                    "TRUNCATE TABLE {} RESTART IDENTITY".format(
+                        ", ".join(
+                            editor.quote_name(m._meta.db_table) for m in models_to_clear
+                        )
+                    )
+                )
+
+                for field in references:
+                    editor.execute(
+                        editor._create_fk_sql(
+                            field.model, field, "_fk_%(to_table)s_%(to_column)s"
+                        )
+                    )
+                editor.execute("SET CONSTRAINTS ALL DEFERRED")
+
+        # Emptied tables and unlinked objects are all cached, invalidate at once
+        invalidate_all()
+
+        elapsed = time.monotonic() - start
+        logger.info(f"cleared local database in {elapsed:.2f} seconds")
+        return elapsed
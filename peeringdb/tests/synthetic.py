@@ -0,0 +1,245 @@
+import json
+import threading
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from ipaddress import IPv4Network, IPv6Network
+from pathlib import Path
+from urllib.parse import parse_qs, urlparse
+
+from peeringdb.sync import NAMESPACES
+
+FIXTURES = Path(__file__).parent / "fixtures"
+
+# Number of objects of each namespace for one network IX LAN, roughly following the
+# proportions found in PeeringDB
+RATIOS = {
+    "org": 0.55,
+    "fac": 0.1,
+    "net": 0.55,
+    "ix": 0.02,
+    "ixfac": 0.05,
+    "netfac": 0.8,
+    "poc": 0.7,
+}
+
+# Namespaces which no other objects depend on, they can be deleted safely
+LEAF_NAMESPACES = ["ixfac", "ixpfx", "netfac", "netixlan", "poc"]
+
+
+def timestamp(time):
+    return datetime.fromtimestamp(time, tz=timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+class SyntheticPeeringDB(object):
+    """
+    Generates synthetic but referentially valid PeeringDB data for all namespaces.
+
+    The scale is given as the number of network IX LANs, the number of objects of
+    other namespaces is derived from it. Objects are built from the test fixtures
+    so that all their fields hold valid values.
+    """
+
+    def __init__(self, netixlans=1000, time=1262304000):
+        self.objects = {namespace: {} for namespace in NAMESPACES}
+        self.time = time
+        self.templates = {
+            namespace: json.loads((FIXTURES / f"{namespace}.json").read_text())["data"][
+                0
+            ]
+            for namespace in NAMESPACES
+        }
+
+        def count(namespace):
+            return max(1, round(netixlans * RATIOS[namespace]))
+
+        orgs, facs, nets, ixs = (count(n) for n in ("org", "fac", "net", "ix"))
+
+        for i in range(1, orgs + 1):
+            self._add("org", i, name=f"Organization {i}")
+        for i in range(1, facs + 1):
+            self._add("fac", i, name=f"Facility {i}", org_id=i % orgs + 1)
+        for i in range(1, nets + 1):
+            self._add(
+                "net",
+                i,
+                name=f"Network {i}",
+                asn=64511 + i,
+                org_id=i % orgs + 1,
+                irr_as_set=f"AS-NET{i}",
+            )
+        for i in range(1, ixs + 1):
+            self._add("ix", i, name=f"IX {i}", org_id=i % orgs + 1)
+            self._add("ixlan", i, ix_id=i, arp_sponge=None)
+            self._add(
+                "ixpfx",
+                2 * i - 1,
+                ixlan_id=i,
+                protocol="IPv4",
+                prefix=str(self._prefix4(i)),
+            )
+            self._add(
+                "ixpfx",
+                2 * i,
+                ixlan_id=i,
+                protocol="IPv6",
+                prefix=str(self._prefix6(i)),
+            )
+
+        # Facilities of an IX (or a network) are consecutive ones, so that pairs
+        # are unique
+        for i in range(min(count("ixfac"), ixs * facs)):
+            ix_id = i % ixs + 1
+            self._add("ixfac", i + 1, ix_id=ix_id, fac_id=(ix_id + i // ixs) % facs + 1)
+        for i in range(min(count("netfac"), nets * facs)):
+            net_id = i % nets + 1
+            self._add(
+                "netfac",
+                i + 1,
+                net_id=net_id,
+                fac_id=(net_id + i // nets) % facs + 1,
+                local_asn=64511 + net_id,
+            )
+        for i in range(count("poc")):
+            self._add("poc", i + 1, net_id=i % nets + 1, name=f"Contact {i + 1}")
+
+        # Each IX LAN gets network IX LANs numbered from the start of its prefixes
+        for i in range(netixlans):
+            ixlan_id, host = i % ixs + 1, i // ixs + 1
+            net_id = i % nets + 1
+            self._add(
+                "netixlan",
+                i + 1,
+                net_id=net_id,
+                ix_id=ixlan_id,
+                ixlan_id=ixlan_id,
+                asn=64511 + net_id,
+                ipaddr4=str(self._prefix4(ixlan_id)[host]),
+                ipaddr6=str(self._prefix6(ixlan_id)[host]),
+            )
+
+    def _prefix4(self, i):
+        return IPv4Network((0x0A000000 + ((i - 1) << 10), 22))
+
+    def _prefix6(self, i):
+        return IPv6Network(((0x20010DB8 << 96) + (i << 64), 64))
+
+    def _add(self, namespace, id, **values):
+        self.objects[namespace][id] = dict(
+            self.templates[namespace],
+            **values,
+            id=id,
+            status="ok",
+            updated=timestamp(self.time),
+        )
+
+    def count(self, status="ok"):
+        """
+        Returns the number of objects with the given status.
+        """
+        return sum(
+            1
+            for objects in self.objects.values()
+            for obj in objects.values()
+            if obj["status"] == status
+        )
+
+    def update(self, fraction, time):
+        """
+        Changes a fraction of the objects of each namespace at the given time.
+        Returns the number of changed objects.
+        """
+        changed = 0
+        for namespace, objects in self.objects.items():
+            step = max(1, round(1 / fraction))
+            for obj in list(objects.values())[::step]:
+                if obj["status"] != "ok":
+                    continue
+                obj["updated"] = timestamp(time)
+                if "notes" in obj:
+                    obj["notes"] = f"Updated at {time}"
+                changed += 1
+        return changed
+
+    def delete(self, fraction, time, namespaces=LEAF_NAMESPACES):
+        """
+        Marks a fraction of the objects of the given namespaces as deleted at the
+        given time. Only namespaces other objects do not depend on can be used.
+        Returns the number of deleted objects.
+        """
+        deleted = 0
+        for namespace in namespaces:
+            step = max(1, round(1 / fraction))
+            for obj in list(self.objects[namespace].values())[::step]:
+                if obj["status"] != "ok":
+                    continue
+                obj.update(status="deleted", updated=timestamp(time))
+                deleted += 1
+        return deleted
+
+    def query(self, namespace, params):
+        """
+        Returns the objects of a namespace like the PeeringDB API would. Deleted
+        objects are only returned with a `since` parameter, filters ending with
+        `__in` and the `fields` parameter are supported.
+        """
+        since = int(params.get("since", 0))
+        since = timestamp(since) if since > 0 else None
+        filters = {
+            key[: -len("__in")]: {int(v) for v in value.split(",")}
+            for key, value in params.items()
+            if key.endswith("__in")
+        }
+        fields = params["fields"].split(",") if "fields" in params else None
+
+        data = []
+        for obj in self.objects[namespace].values():
+            if since is None and obj["status"] != "ok":
+                continue
+            if since is not None and obj["updated"] < since:
+                continue
+            if any(obj.get(key) not in values for key, values in filters.items()):
+                continue
+            data.append({f: obj[f] for f in fields} if fields else obj)
+        return data
+
+
+class SyntheticPeeringDBServer(object):
+    """
+    Local HTTP server standing in for the PeeringDB API, serving data generated by
+    a `SyntheticPeeringDB` object. The API URL to use is given by `url`.
+    """
+
+    def __init__(self, peeringdb):
+        self.peeringdb = peeringdb
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(handler):
+                url = urlparse(handler.path)
+                namespace = url.path.rstrip("/").split("/")[-1]
+                if namespace not in NAMESPACES:
+                    handler.send_error(404)
+                    return
+
+                params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+                body = json.dumps(
+                    {"data": self.peeringdb.query(namespace, params), "meta": {}}
+                ).encode()
+                handler.send_response(200)
+                handler.send_header("Content-Type", "application/json")
+                handler.send_header("Content-Length", str(len(body)))
+                handler.end_headers()
+                handler.wfile.write(body)
+
+            def log_message(handler, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}/api"
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *args):
+        self.server.shutdown()
+        self.server.server_close()
@@ -0,0 +1,119 @@
+import os
+import sys
+import time
+import tracemalloc
+from unittest import skipUnless
+
+from django.conf import settings
+from django.db import connection
+from django.test import TestCase, override_settings
+
+from peeringdb.sync import NAMESPACES, PeeringDB
+from peeringdb.tests.synthetic import SyntheticPeeringDB, SyntheticPeeringDBServer
+
+
+def run_synchronization(since):
+    """
+    Runs a synchronization and returns it along with its measurements.
+    """
+    queries = 0
+
+    def count_queries(execute, sql, params, many, context):
+        nonlocal queries
+        queries += 1
+        return execute(sql, params, many, context)
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        with connection.execute_wrapper(count_queries):
+            synchronization = PeeringDB().update_local_database(since)
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    rows = synchronization.created + synchronization.updated + synchronization.deleted
+    return synchronization, {
+        "rows": rows,
+        "seconds": elapsed,
+        "rows_per_second": rows / elapsed if elapsed else 0,
+        "peak_memory": peak,
+        "queries": queries,
+    }
+
+
+def run_scenarios(netixlans):
+    """
+    Runs a first, a delta and a delete-heavy synchronization against a local API
+    serving synthetic data. Returns the results of each synchronization.
+    """
+    peeringdb = SyntheticPeeringDB(netixlans=netixlans)
+    results = {}
+
+    with SyntheticPeeringDBServer(peeringdb) as server, override_settings(
+        PEERINGDB_API=server.url
+    ):
+        results["first"] = run_synchronization(0)
+        expected = {"first": (peeringdb.count(), 0, 0)}
+
+        # Synthetic times are used for since values to be predictable
+        changed = peeringdb.update(0.05, peeringdb.time + 100)
+        results["delta"] = run_synchronization(peeringdb.time + 100)
+        expected["delta"] = (0, changed, 0)
+
+        deleted = peeringdb.delete(0.5, peeringdb.time + 200)
+        results["delete"] = run_synchronization(peeringdb.time + 200)
+        expected["delete"] = (0, 0, deleted)
+
+    return results, expected
+
+
+class SyntheticSynchronizationTestCase(TestCase):
+    def test_synchronization_scenarios(self):
+        results, expected = run_scenarios(50)
+
+        for name, (synchronization, _) in results.items():
+            self.assertEqual(
+                expected[name],
+                (
+                    synchronization.created,
+                    synchronization.updated,
+                    synchronization.deleted,
+                ),
+                name,
+            )
+        for namespace, model in NAMESPACES.items():
+            self.assertTrue(model.objects.exists(), namespace)
+
+
+@skipUnless(
+    os.environ.get("PEERINGDB_BENCHMARK"),
+    "set PEERINGDB_BENCHMARK to a number of network IX LANs to run benchmarks",
+)
+class SynchronizationBenchmark(TestCase):
+    """
+    Benchmarks PeeringDB synchronizations, to be run with:
+
+        PEERINGDB_BENCHMARK=100000 python manage.py test peeringdb.tests.test_benchmark
+
+    Peak memory is measured with `tracemalloc` which slows down synchronizations,
+    rates must only be compared between runs of the benchmark.
+    """
+
+    def test_benchmark(self):
+        netixlans = int(os.environ["PEERINGDB_BENCHMARK"])
+        results, _ = run_scenarios(netixlans)
+
+        sys.stderr.write(
+            f"\nPeeringDB synchronization of {netixlans} network IX LANs "
+            f"(bulk: {settings.PEERINGDB_SYNC_BULK}, "
+            f"chunk size: {settings.PEERINGDB_SYNC_CHUNK_SIZE})\n"
+        )
+        for name, (_, measures) in results.items():
+            sys.stderr.write(
+                f"  {name:<6} {measures['rows']:>8} rows in "
+                f"{measures['seconds']:>8.2f}s {measures['rows_per_second']:>10.1f} "
+                f"rows/s, peak memory {measures['peak_memory'] / 2**20:>8.1f} MiB, "
+                f"{measures['queries']:>8} queries\n"
+            )
@@ -1,8 +1,25 @@
+import gzip
+import lzma
+import shutil
+import tempfile
+from io import StringIO
+from pathlib import Path
 from unittest.mock import patch
 
-from django.test import TestCase
+from django.core.exceptions import ValidationError
+from django.core.management import CommandError, call_command
+from django.db import connection as db_connection
+from django.test import TestCase, override_settings
 from django.utils import timezone
 
+from net.models import Connection
+from peering.models import AutonomousSystem, InternetExchange
+from peeringdb.models import (
+    Facility,
+    Network,
+    NetworkIXLan,
+    SynchronizationCheckpoint,
+)
 from peeringdb.sync import NAMESPACES, PeeringDB
 from utils.testing import MockedResponse
 
@@ -51,15 +68,285 @@ class PeeringDBSyncTestCase(TestCase):
         api.record_last_sync(time_of_sync, {"created": 1, "updated": 0, "deleted": 0})
         self.assertEqual(api.get_last_sync_time(), int(time_of_sync.timestamp()))
 
-    @patch("peeringdb.sync.requests.get", side_effect=mocked_synchronization)
+    @patch("peeringdb.sync.requests.Session.get", side_effect=mocked_synchronization)
     def test_update_local_database(self, *_):
         sync_result = PeeringDB().update_local_database(0)
         self.assertEqual(19, sync_result.created)
         self.assertEqual(0, sync_result.updated)
         self.assertEqual(0, sync_result.deleted)
 
+    @patch("peeringdb.sync.requests.Session.get", side_effect=mocked_synchronization)
+    def test_update_local_database_statistics(self, *_):
+        sync_result = PeeringDB().update_local_database(0)
+        statistics = sync_result.statistics
+        self.assertEqual(set(NAMESPACES), set(statistics))
+        self.assertEqual(5, statistics["org"]["parsed"])
+        self.assertEqual(5, statistics["org"]["written"])
+        self.assertEqual(0, statistics["org"]["rejected"])
+        self.assertEqual(
+            Path("peeringdb/tests/fixtures/org.json").stat().st_size,
+            statistics["org"]["bytes"],
+        )
+        self.assertEqual(
+            sync_result.created, sum(s["written"] for s in statistics.values())
+        )
+
+    def test_synchronize_namespace_bulk_rejected(self):
+        base = {"status": "ok", "created": "2010-07-29T00:00:00Z"}
+        objects = [
+            {**base, "id": 1, "name": "Org"},
+            # Rejected by validation
+            {**base, "id": 2, "name": "x" * 256},
+            # Rejected by the database, the chunk is processed again one by one
+            {**base, "id": 3, "name": "Org"},
+        ]
+
+        api = PeeringDB()
+        organization = NAMESPACES["org"]
+        self.assertEqual(
+            (1, 0, 0), api.synchronize_namespace(organization, objects, bulk=True)
+        )
+        statistics = api.get_statistics()["org"]
+        self.assertEqual(3, statistics["parsed"])
+        self.assertEqual(1, statistics["written"])
+        self.assertEqual(2, statistics["rejected"])
+
+    @patch("peeringdb.sync.requests.Session.get", side_effect=mocked_synchronization)
+    def test_update_local_database_bulk(self, *_):
+        sync_result = PeeringDB().update_local_database(0, bulk=True)
+        self.assertEqual(19, sync_result.created)
+        self.assertEqual(0, sync_result.updated)
+        self.assertEqual(0, sync_result.deleted)
+
+        # Second run must only update known objects
+        sync_result = PeeringDB().update_local_database(0, bulk=True)
+        self.assertEqual(0, sync_result.created)
+        self.assertEqual(19, sync_result.updated)
+        self.assertEqual(0, sync_result.deleted)
+
+    @patch("peeringdb.sync.requests.Session.get", side_effect=mocked_synchronization)
+    def test_update_local_database_links_objects(self, *_):
+        ixp = InternetExchange.objects.create(name="Test", slug="test")
+        connection = Connection.objects.create(
+            internet_exchange_point=ixp,
+            ipv4_address="188.93.170.9/24",
+            ipv6_address="2001:7f8:4c::a2a:1/64",
+        )
+        other = Connection.objects.create(ipv4_address="192.0.2.1/24")
+
+        PeeringDB().update_local_database(0)
+
+        connection.refresh_from_db()
+        other.refresh_from_db()
+        ixp.refresh_from_db()
+        self.assertEqual(11709, connection.peeringdb_netixlan_id)
+        self.assertIsNone(other.peeringdb_netixlan)
+        self.assertEqual(297, ixp.peeringdb_ixlan_id)
+
+    @patch("peeringdb.sync.requests.Session.get", side_effect=mocked_synchronization)
+    def test_get_sync_scope(self, *_):
+        AutonomousSystem.objects.create(asn=2602, name="Test", affiliated=True)
+
+        scope = PeeringDB().get_sync_scope()
+        self.assertEqual([{"id__in": "297", "since": 0}], scope["ixlan"])
+        self.assertEqual([{"ixlan_id__in": "297", "since": 0}], scope["netixlan"])
+        self.assertEqual([{"net_id__in": "4840,17293", "since": 0}], scope["poc"])
+        self.assertNotIn("org", scope)
+
+        # Known objects are only retrieved if they changed
+        PeeringDB().update_local_database(0)
+        scope = PeeringDB().get_sync_scope()
+        self.assertEqual([{"id__in": "297"}], scope["ixlan"])
+        self.assertEqual([{"net_id__in": "4840,17293"}], scope["poc"])
+
+    @override_settings(PEERINGDB_SYNC_SCOPED=True)
+    @patch("peeringdb.sync.requests.Session.get", side_effect=mocked_synchronization)
+    def test_update_local_database_scoped(self, mocked_get):
+        AutonomousSystem.objects.create(asn=2602, name="Test", affiliated=True)
+
+        sync_result = PeeringDB().update_local_database(1)
+        self.assertEqual(19, sync_result.created)
+
+        params = {
+            c.args[0].split("/")[-1]: c.kwargs["params"]
+            for c in mocked_get.call_args_list
+            if "fields" not in c.kwargs["params"]
+        }
+        self.assertEqual(1, params["org"]["since"])
+        self.assertEqual("4840,17293", params["netfac"]["net_id__in"])
+        self.assertEqual(0, params["netfac"]["since"])
+
+    def test_set_fields(self):
+        api = PeeringDB()
+        netixlan = NetworkIXLan()
+        api._set_fields(
+            NetworkIXLan,
+            netixlan,
+            {
+                "id": 1,
+                "net_id": 2,
+                "ix_id": 3,
+                "ixlan_id": 4,
+                "name": "Ignored",
+                "status": "ok",
+                "unknown": "value",
+            },
+        )
+        self.assertEqual(1, netixlan.id)
+        self.assertEqual(2, netixlan.net_id)
+        self.assertEqual(4, netixlan.ixlan_id)
+        self.assertFalse(hasattr(netixlan, "ix_id"))
+        self.assertFalse(hasattr(netixlan, "unknown"))
+        # Field mappings are compiled once
+        self.assertIsNone(api._field_plans[NetworkIXLan]["name"])
+        self.assertEqual(("net_id", None), api._field_plans[NetworkIXLan]["net_id"])
+
+        facility = Facility()
+        api._set_fields(Facility, facility, {"latitude": 1.5, "longitude": None})
+        self.assertEqual("1.5", facility.latitude)
+        self.assertIsNone(facility.longitude)
+
+    def test_clean_fields(self):
+        api = PeeringDB()
+        network = Network(id=1, asn=64500, name="Test", info_ipv6=True)
+        api._clean_fields(Network, network, exclude=["org"])
+
+        network.asn = 0
+        network.info_ipv6 = "not a boolean"
+        with self.assertRaises(ValidationError) as cm:
+            api._clean_fields(Network, network, exclude=["org"])
+        self.assertIn("asn", cm.exception.message_dict)
+        self.assertIn("info_ipv6", cm.exception.message_dict)
+
+    def _interrupt_synchronization(self, namespace, after=0):
+        """
+        Runs a synchronization raising an error after `after` objects of the given
+        namespace are processed.
+        """
+
+        def interrupted(objects):
+            for i, o in enumerate(objects):
+                if i == after:
+                    raise RuntimeError("interrupted")
+                yield o
+
+        api = PeeringDB()
+        synchronize_namespace = api.synchronize_namespace
+        api.synchronize_namespace = lambda model, objects, bulk=False: (
+            synchronize_namespace(
+                model,
+                interrupted(objects) if model is NAMESPACES[namespace] else objects,
+                bulk=bulk,
+            )
+        )
+        with self.assertRaises(RuntimeError):
+            api.update_local_database(0)
+
+    @override_settings(PEERINGDB_SYNC_COMMIT="namespace")
+    @patch("peeringdb.sync.requests.Session.get", side_effect=mocked_synchronization)
+    def test_update_local_database_resume_namespace(self, *_):
+        self._interrupt_synchronization("netixlan")
+
+        # Namespaces before the interrupted one are committed
+        checkpoint = PeeringDB().get_checkpoint()
+        self.assertEqual("netixlan", checkpoint.namespace)
+        self.assertIsNone(checkpoint.last_id)
+        self.assertEqual(17, checkpoint.created)
+        self.assertEqual(0, NetworkIXLan.objects.count())
+
+        sync_result = PeeringDB().update_local_database(0)
+        self.assertEqual(19, sync_result.created)
+        self.assertEqual(checkpoint.time, sync_result.time)
+        self.assertEqual(1, NetworkIXLan.objects.count())
+        self.assertFalse(SynchronizationCheckpoint.objects.exists())
+
+    @override_settings(PEERINGDB_SYNC_COMMIT="chunk", PEERINGDB_SYNC_CHUNK_SIZE=1)
+    @patch("peeringdb.sync.requests.Session.get", side_effect=mocked_synchronization)
+    def test_update_local_database_resume_chunk(self, *_):
+        self._interrupt_synchronization("ixfac", after=1)
+
+        # Objects are not ordered by ID, resuming must not skip any of them
+        checkpoint = PeeringDB().get_checkpoint()
+        self.assertEqual("ixfac", checkpoint.namespace)
+        self.assertEqual(2002, checkpoint.last_id)
+        self.assertEqual(11, checkpoint.created)
+
+        sync_result = PeeringDB().update_local_database(0)
+        self.assertEqual(19, sync_result.created)
+        self.assertEqual(0, sync_result.updated)
+        self.assertFalse(SynchronizationCheckpoint.objects.exists())
+
+    @override_settings(PEERINGDB_SYNC_COMMIT="namespace")
+    @patch("peeringdb.sync.requests.Session.get", side_effect=mocked_synchronization)
+    def test_update_local_database_restart(self, *_):
+        self._interrupt_synchronization("netixlan")
+
+        sync_result = PeeringDB().update_local_database(0, resume=False)
+        self.assertEqual(2, sync_result.created)
+        self.assertEqual(17, sync_result.updated)
+        self.assertFalse(SynchronizationCheckpoint.objects.exists())
+
+    def test_import_local_snapshot(self):
+        with tempfile.TemporaryDirectory() as directory:
+            # Nothing to import
+            self.assertIsNone(PeeringDB().import_local_snapshot(directory))
+            with self.assertRaises(CommandError):
+                call_command("peeringdb_sync", snapshot=directory, stdout=StringIO())
+
+            # Mix plain and compressed files
+            for i, namespace in enumerate(NAMESPACES):
+                fixture = Path(f"peeringdb/tests/fixtures/{namespace}.json")
+                if i % 3 == 0:
+                    shutil.copy(fixture, Path(directory) / f"{namespace}.json")
+                else:
+                    extension, open_file = (
+                        (".json.gz", gzip.open)
+                        if i % 3 == 1
+                        else (".json.xz", lzma.open)
+                    )
+                    with open_file(
+                        Path(directory) / f"{namespace}{extension}", "wb"
+                    ) as f:
+                        f.write(fixture.read_bytes())
+
+            sync_result = PeeringDB().import_local_snapshot(directory)
+            self.assertEqual(19, sync_result.created)
+            self.assertEqual(0, sync_result.updated)
+            self.assertEqual(0, sync_result.deleted)
+
     def test_clear_local_database(self):
         try:
             PeeringDB().clear_local_database()
         except Exception:
             self.fail("Unexpected exception raised.")
+
+    @patch("peeringdb.sync.requests.Session.get", side_effect=mocked_synchronization)
+    def test_clear_local_database_keeps_linked_objects(self, *_):
+        ixp = InternetExchange.objects.create(name="Test", slug="test")
+        connection = Connection.objects.create(
+            internet_exchange_point=ixp,
+            ipv4_address="188.93.170.9/24",
+            ipv6_address="2001:7f8:4c::a2a:1/64",
+        )
+        PeeringDB().update_local_database(0)
+        connection.refresh_from_db()
+        self.assertIsNotNone(connection.peeringdb_netixlan)
+
+        self.assertGreaterEqual(PeeringDB().clear_local_database(), 0)
+        for model in NAMESPACES.values():
+            self.assertFalse(model.objects.exists())
+        self.assertIsNone(PeeringDB().get_last_synchronization())
+
+        # Linked objects are kept and foreign keys are restored
+        connection.refresh_from_db()
+        ixp.refresh_from_db()
+        self.assertIsNone(connection.peeringdb_netixlan)
+        self.assertIsNone(ixp.peeringdb_ixlan)
+        with db_connection.cursor() as cursor:
+            constraints = db_connection.introspection.get_constraints(
+                cursor, Connection._meta.db_table
+            )
+        self.assertIn(
+            ("peeringdb_networkixlan", "id"),
+            [c["foreign_key"] for c in constraints.values()],
+        )
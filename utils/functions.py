@@ -1,13 +1,19 @@
+import codecs
 import hashlib
 import hmac
 import json
+from itertools import islice
 
+import requests
+from cacheops import CacheMiss, cache
+from django.conf import settings
 from django.contrib import messages
 from django.core.serializers import serialize
 from django.db.models import Count, OuterRef, Subquery
 from django.db.models.functions import Coalesce
 from django.utils.html import escape
 from django.utils.safestring import mark_safe
+from redis.exceptions import RedisError
 from taggit.managers import _TaggableManager
 
 from utils.templatetags.helpers import title_with_uppers
@@ -286,3 +292,163 @@ def merge_hash(a, b, recursive=True, list_merge="replace"):
         a[key] = b_value
 
     return a
+
+
+def chunked(iterable, size):
+    """
+    Yields lists of at most `size` elements taken from the given iterable. The
+    iterable is consumed lazily so it can be a generator of any length.
+    """
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def iterate_json_array(chunks, key):
+    """
+    Yields, one by one, the items of the array stored under `key` in a top-level
+    JSON object.
+
+    The JSON text is read from `chunks`, an iterable of bytes or strings, so that
+    the whole document never has to be held in memory. Only one item (and the
+    chunk it is found in) is kept at a time.
+    """
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder("utf-8")()
+    chunks = iter(chunks)
+    buffer, position, exhausted = "", 0, False
+
+    def read_more():
+        nonlocal buffer, position, exhausted
+        try:
+            chunk = next(chunks)
+        except StopIteration:
+            exhausted = True
+            chunk = utf8.decode(b"", final=True)
+        else:
+            if isinstance(chunk, bytes):
+                chunk = utf8.decode(chunk)
+        buffer = buffer[position:] + chunk
+        position = 0
+        return not exhausted
+
+    def peek():
+        nonlocal position
+        while True:
+            while position < len(buffer) and buffer[position] in " \t\n\r":
+                position += 1
+            if position < len(buffer):
+                return buffer[position]
+            if not read_more():
+                return None
+
+    def expect(character):
+        nonlocal position
+        if peek() != character:
+            raise ValueError(f"Expecting '{character}' at position {position}")
+        position += 1
+
+    def read_value():
+        nonlocal position
+        peek()
+        while True:
+            try:
+                value, end = decoder.raw_decode(buffer, position)
+                # A value not followed by a delimiter (e.g. a number) may be
+                # truncated, it can only be trusted once more data is read
+                if exhausted or (end < len(buffer) and buffer[end] in ",:]} \t\n\r"):
+                    position = end
+                    return value
+            except json.JSONDecodeError:
+                if exhausted:
+                    raise
+            read_more()
+
+    expect("{")
+    while True:
+        character = peek()
+        if character is None or character == "}":
+            return
+        if character == ",":
+            position += 1
+            continue
+
+        name = read_value()
+        expect(":")
+        if name != key:
+            # Not the array we are looking for, skip its value
+            read_value()
+            continue
+
+        expect("[")
+        while True:
+            character = peek()
+            if character == "]":
+                position += 1
+                break
+            if character == ",":
+                position += 1
+                continue
+            if character is None:
+                raise ValueError("Unexpected end of JSON array")
+            yield read_value()
+
+
+def get_json(url, session=None, **kwargs):
+    """
+    Sends a GET request and returns the decoded JSON body of the response. Keyword
+    arguments are passed to `requests`, errors are raised as `HTTPError`.
+
+    Validators (`ETag` and `Last-Modified` headers) and decoded bodies of responses
+    are kept in the cache for `HTTP_CACHE_TIMEOUT` seconds. They are used to send
+    conditional requests, if the server replies that the resource has not been
+    modified, the cached body is returned without being decoded again.
+    """
+    get = (session or requests).get
+    if not settings.HTTP_CACHE_TIMEOUT:
+        response = get(url, **kwargs)
+        response.raise_for_status()
+        return response.json()
+
+    key = (
+        "http:"
+        + hashlib.sha256(
+            json.dumps(
+                [url, kwargs.get("params"), kwargs.get("headers"), kwargs.get("auth")],
+                sort_keys=True,
+                default=str,
+            ).encode()
+        ).hexdigest()
+    )
+    try:
+        cached = cache.get(key)
+    except (CacheMiss, RedisError):
+        cached = None
+
+    headers = dict(kwargs.pop("headers", None) or {})
+    if cached:
+        if cached["etag"]:
+            headers["If-None-Match"] = cached["etag"]
+        if cached["last_modified"]:
+            headers["If-Modified-Since"] = cached["last_modified"]
+
+    response = get(url, headers=headers, **kwargs)
+    if cached and response.status_code == 304:
+        return cached["data"]
+
+    response.raise_for_status()
+    data = response.json()
+
+    etag = response.headers.get("ETag")
+    last_modified = response.headers.get("Last-Modified")
+    if etag or last_modified:
+        cache.set(
+            key,
+            {"etag": etag, "last_modified": last_modified, "data": data},
+            settings.HTTP_CACHE_TIMEOUT,
+        )
+
+    return data
@@ -11,6 +11,9 @@ from django.utils import timezone
 from packaging import version
 
 from extras.models import JobResult
+from peering.enums import BGPSessionStateResolution
+from peering.models import BGPSessionStateRecord
+from utils.functions import get_json
 from utils.models import ObjectChange
 
 
@@ -98,6 +101,63 @@ class Command(BaseCommand):
                 f"    Skipping: No retention period specified (JOBRESULT_RETENTION = {settings.JOBRESULT_RETENTION})"
             )
 
+        # Downsample BGP session state history
+        if options["verbosity"]:
+            self.stdout.write("[*] Downsampling BGP session state history")
+        for label, resolution, retention, setting in (
+            (
+                "raw",
+                BGPSessionStateResolution.RAW,
+                settings.BGP_SESSION_HISTORY_RETENTION,
+                "BGP_SESSION_HISTORY_RETENTION",
+            ),
+            (
+                "hourly",
+                BGPSessionStateResolution.HOURLY,
+                settings.BGP_SESSION_HISTORY_HOURLY_RETENTION,
+                "BGP_SESSION_HISTORY_HOURLY_RETENTION",
+            ),
+        ):
+            if not retention:
+                if options["verbosity"]:
+                    self.stdout.write(
+                        f"    Skipping {label} records: No retention period specified ({setting} = {retention})"
+                    )
+                continue
+            cutoff = timezone.now() - timedelta(days=retention)
+            if options["verbosity"] >= 2:
+                self.stdout.write(
+                    f"    Retention period for {label} records: {retention} day{pluralize(retention)}"
+                )
+            merged = BGPSessionStateRecord.objects.downsample(resolution, cutoff)
+            if options["verbosity"]:
+                self.stdout.write(
+                    f"    Merged {merged} {label} record{pluralize(merged)}.",
+                    self.style.SUCCESS,
+                )
+
+        if settings.BGP_SESSION_HISTORY_DAILY_RETENTION:
+            cutoff = timezone.now() - timedelta(
+                days=settings.BGP_SESSION_HISTORY_DAILY_RETENTION
+            )
+            expired_records = BGPSessionStateRecord.objects.filter(
+                resolution=BGPSessionStateResolution.DAILY, time__lt=cutoff
+            )
+            if options["verbosity"]:
+                self.stdout.write(
+                    "    Deleting expired daily records... ",
+                    self.style.WARNING,
+                    ending="",
+                )
+                self.stdout.flush()
+            expired_records._raw_delete(using=DEFAULT_DB_ALIAS)
+            if options["verbosity"]:
+                self.stdout.write("Done.", self.style.SUCCESS)
+        elif options["verbosity"]:
+            self.stdout.write(
+                f"    Skipping daily records: No retention period specified (BGP_SESSION_HISTORY_DAILY_RETENTION = {settings.BGP_SESSION_HISTORY_DAILY_RETENTION})"
+            )
+
         # Check for new releases (if enabled)
         if options["verbosity"]:
             self.stdout.write("[*] Checking for latest release")
@@ -106,15 +166,15 @@ class Command(BaseCommand):
             try:
                 if options["verbosity"] >= 2:
                     self.stdout.write(f"    Fetching {settings.RELEASE_CHECK_URL}")
-                response = requests.get(
-                    url=settings.RELEASE_CHECK_URL,
+                # Unchanged releases are not downloaded nor decoded again
+                response = get_json(
+                    settings.RELEASE_CHECK_URL,
                     headers=headers,
                     proxies=settings.HTTP_PROXIES,
                 )
-                response.raise_for_status()
 
                 releases = []
-                for release in response.json():
+                for release in response:
                     if (
                         "tag_name" not in release
                         or release.get("devrelease")
@@ -127,7 +187,7 @@ class Command(BaseCommand):
                 latest_release = max(releases)
                 if options["verbosity"] >= 2:
                     self.stdout.write(
-                        f"    Found {len(response.json())} releases; {len(releases)} usable"
+                        f"    Found {len(response)} releases; {len(releases)} usable"
                     )
                 if options["verbosity"]:
                     self.stdout.write(
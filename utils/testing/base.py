@@ -19,9 +19,15 @@ from .functions import extract_form_failures
 
 class MockedResponse(object):
     def __init__(
-        self, status_code=status.HTTP_200_OK, ok=True, fixture=None, content=None
+        self,
+        status_code=status.HTTP_200_OK,
+        ok=True,
+        fixture=None,
+        content=None,
+        headers=None,
     ):
         self.status_code = status_code
+        self.headers = headers or {}
         if fixture:
             self.content = self.load_fixture(fixture)
         elif content:
@@ -34,9 +40,23 @@ class MockedResponse(object):
         with open(path, "r") as f:
             return f.read()
 
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        pass
+
     def json(self):
         return json.loads(self.content)
 
+    def iter_content(self, chunk_size=1, decode_unicode=False):
+        content = self.content if decode_unicode else self.content.encode()
+        for i in range(0, len(content), chunk_size):
+            yield content[i : i + chunk_size]
+
     def raise_for_status(self):
         if (
             status.HTTP_400_BAD_REQUEST
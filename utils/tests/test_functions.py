@@ -0,0 +1,67 @@
+import json
+import uuid
+from unittest.mock import patch
+
+from django.test import TestCase, override_settings
+
+from utils.functions import chunked, get_json, iterate_json_array
+from utils.testing import MockedResponse
+
+
+class FunctionsTestCase(TestCase):
+    def test_chunked(self):
+        self.assertEqual([], list(chunked([], 2)))
+        self.assertEqual([[1, 2], [3, 4], [5]], list(chunked(range(1, 6), 2)))
+        self.assertEqual([[1, 2, 3]], list(chunked((i for i in (1, 2, 3)), 5)))
+
+    def test_iterate_json_array(self):
+        document = {
+            "meta": {"data": [0]},
+            "data": [{"id": i, "name": "é" * i, "value": 12.5 * i} for i in range(10)],
+        }
+        content = json.dumps(document, indent=2).encode()
+
+        # Whatever the size of the chunks, the array must be parsed entirely
+        for size in (1, 2, 7, 64, len(content)):
+            chunks = (content[i : i + size] for i in range(0, len(content), size))
+            self.assertEqual(document["data"], list(iterate_json_array(chunks, "data")))
+
+        self.assertEqual([], list(iterate_json_array([b'{"data": []}'], "data")))
+        self.assertEqual([], list(iterate_json_array([b'{"meta": {}}'], "data")))
+        self.assertEqual(
+            [1, 23], list(iterate_json_array(['{"data": [1, 2', "3]}"], "data"))
+        )
+
+        with self.assertRaises(ValueError):
+            list(iterate_json_array([b'{"data": [1, 2'], "data"))
+        with self.assertRaises(ValueError):
+            list(iterate_json_array([b"[]"], "data"))
+
+    @patch("utils.functions.requests.get")
+    def test_get_json(self, mocked_get):
+        # Make sure the URL is not cached by a previous run
+        url = f"https://example.com/{uuid.uuid4()}"
+        content = [{"tag_name": "v1.0.0"}]
+        mocked_get.return_value = MockedResponse(
+            content=content, headers={"ETag": '"abc"'}
+        )
+        self.assertEqual(content, get_json(url, headers={"Accept": "json"}))
+        self.assertEqual({"Accept": "json"}, mocked_get.call_args.kwargs["headers"])
+
+        # Not modified, the cached body is returned with no decoding
+        mocked_get.return_value = MockedResponse(status_code=304)
+        self.assertEqual(content, get_json(url, headers={"Accept": "json"}))
+        self.assertEqual(
+            {"Accept": "json", "If-None-Match": '"abc"'},
+            mocked_get.call_args.kwargs["headers"],
+        )
+
+        # Other parameters are cached separately
+        mocked_get.return_value = MockedResponse(content={"page": 2})
+        self.assertEqual({"page": 2}, get_json(url, params={"page": 2}))
+        self.assertNotIn("If-None-Match", mocked_get.call_args.kwargs["headers"])
+
+        with override_settings(HTTP_CACHE_TIMEOUT=0):
+            mocked_get.return_value = MockedResponse(content=content)
+            self.assertEqual(content, get_json(url, headers={"Accept": "json"}))
+            self.assertEqual({"Accept": "json"}, mocked_get.call_args.kwargs["headers"])